@@ -0,0 +1,5 @@
+import os
+
+# benchmarks repeat the same texts, measure the model rather than the cache
+os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+os.environ.pop("EMBEDDING_CACHE_DIR", None)
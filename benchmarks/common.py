@@ -0,0 +1,45 @@
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+SAMPLE_WORDS = (
+    "true crime history comedy news interview science technology football "
+    "politics culture music health startup founders murder mystery weekly "
+    "episode guest conversation deep dive season finale bonus"
+).split()
+
+
+def sample_texts(n: int, min_words: int = 3, max_words: int = 40) -> list[str]:
+    """deterministic pseudo episode titles/descriptions of varying length"""
+    texts = []
+    for i in range(n):
+        length = min_words + (i * 7919) % (max_words - min_words + 1)
+        texts.append(
+            " ".join(
+                SAMPLE_WORDS[(i + j * 31) % len(SAMPLE_WORDS)] for j in range(length)
+            )
+        )
+    return texts
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, latencies: list[float], elapsed: float, items: int) -> str:
+    return (
+        f"{name:<28} p50={percentile(latencies, 50) * 1000:8.2f}ms "
+        f"p99={percentile(latencies, 99) * 1000:8.2f}ms "
+        f"mean={statistics.fmean(latencies) * 1000:8.2f}ms "
+        f"throughput={items / elapsed:10.1f}/s"
+    )
+
+
+async def timed(fn: Callable[[], Awaitable[object]], latencies: list[float]) -> None:
+    start = time.perf_counter()
+    await fn()
+    latencies.append(time.perf_counter() - start)
@@ -0,0 +1,103 @@
+"""Episodes/sec of DataStore.upsert: per-episode encode vs length-sorted chunks.
+
+The vector database is replaced by a store that drops everything, so only the
+embedding side of the ingest is measured.
+
+    python -m benchmarks.datastore_upsert --sizes 100 1000 10000
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from podcasts_backend.repository.vector_database.datastore import DataStore
+from podcasts_backend.schemas.schemas import (
+    Episode,
+    EpisodeMetadata,
+    EpisodeVector,
+    Query,
+    QueryResult,
+)
+from podcasts_backend.services.embeddings import get_embeddings
+from podcasts_backend.services.executors import executors
+
+from .common import sample_texts
+
+
+class NullDataStore(DataStore):
+    async def _upsert(
+        self, episodes: list[Episode], embeddings: np.ndarray
+    ) -> list[int]:
+        return [episode.id for episode in episodes]
+
+    async def _query(
+        self,
+        queries: list[Query],
+        embeddings: np.ndarray,
+        include_vectors: bool = False,
+    ) -> list[QueryResult]:
+        return []
+
+    async def delete(
+        self, ids: list[str] | None = None, delete_all: bool | None = None
+    ) -> bool:
+        return True
+
+
+async def per_episode_upsert(store: NullDataStore, episodes: list[Episode]) -> None:
+    """the previous implementation: one encode call per episode"""
+    vectors = [
+        EpisodeVector(**episode.dict(), embedding=get_embeddings([episode.text])[0])
+        for episode in episodes
+    ]
+    await store._upsert(episodes, np.array([vector.embedding for vector in vectors]))
+
+
+def make_episodes(n: int) -> list[Episode]:
+    return [
+        Episode(
+            id=i,
+            metadata=EpisodeMetadata(podcast_id=i % 97, category=None, language="en"),
+            text=text,
+        )
+        for i, text in enumerate(sample_texts(n))
+    ]
+
+
+def report(size: int, label: str, elapsed: float) -> None:
+    print(f"{size:>6} episodes  {label:<14} {size / elapsed:10.1f} episodes/s")
+
+
+async def bench(sizes: list[int], chunk_size: int, skip_baseline_above: int) -> None:
+    store = NullDataStore()
+    for size in sizes:
+        episodes = make_episodes(size)
+        if size <= skip_baseline_above:
+            start = time.perf_counter()
+            await per_episode_upsert(store, episodes)
+            elapsed = time.perf_counter() - start
+            report(size, "per-episode", elapsed)
+        start = time.perf_counter()
+        await store.upsert(episodes, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - start
+        report(size, f"chunked({chunk_size})", elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument(
+        "--skip-baseline-above",
+        type=int,
+        default=10000,
+        help="don't run the slow per-episode path for larger batches",
+    )
+    args = parser.parse_args()
+    asyncio.run(bench(args.sizes, args.chunk_size, args.skip_baseline_above))
+    executors.shutdown()
+
+
+if __name__ == "__main__":
+    main()
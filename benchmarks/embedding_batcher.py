@@ -0,0 +1,85 @@
+"""Compare the micro-batching embedding scheduler with one encode per request.
+
+    python -m benchmarks.embedding_batcher --requests 512 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+import numpy as np
+
+from podcasts_backend.services.embeddings import (
+    EmbeddingBatcher,
+    embed_texts,
+    get_embeddings,
+)
+from podcasts_backend.services.executors import executors
+
+from .common import sample_texts, summarize, timed
+
+
+async def run_direct(requests: list[list[str]], concurrency: int) -> None:
+    """today's path: every caller runs its own encode on the event loop"""
+
+    async def embed(texts: list[str]) -> np.ndarray:
+        return get_embeddings(texts)
+
+    await run("one encode per request", embed, requests, concurrency)
+
+
+async def run_batched(
+    requests: list[list[str]], concurrency: int, max_batch_size: int, max_wait_ms: float
+) -> None:
+    batcher = EmbeddingBatcher(embed_texts, max_batch_size, max_wait_ms)
+    await embed_texts(requests[0])  # start and warm up the embedding pool
+    await run("micro-batched", batcher.embed, requests, concurrency)
+    print(f"{'':<28} {batcher.stats()}")
+    await batcher.close()
+    executors.shutdown()
+
+
+async def run(
+    name: str,
+    embed: Callable[[list[str]], Awaitable[np.ndarray]],
+    requests: list[list[str]],
+    concurrency: int,
+) -> None:
+    latencies: list[float] = []
+    queue = list(requests)
+
+    async def worker() -> None:
+        while queue:
+            texts = queue.pop()
+            await timed(lambda: embed(texts), latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    print(summarize(name, latencies, elapsed, len(requests)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--texts-per-request", type=int, default=1)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.requests * args.texts_per_request)
+    requests = [
+        texts[i : i + args.texts_per_request]
+        for i in range(0, len(texts), args.texts_per_request)
+    ]
+    get_embeddings(texts[:8])  # warm up the model
+
+    asyncio.run(run_direct(requests, args.concurrency))
+    asyncio.run(
+        run_batched(requests, args.concurrency, args.max_batch_size, args.max_wait_ms)
+    )
+
+
+if __name__ == "__main__":
+    main()
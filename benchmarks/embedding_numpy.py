@@ -0,0 +1,102 @@
+"""Cost per 1,000 vectors of list[float] + pydantic vs the float32 ndarray path.
+
+Covers everything between the encoder output and the insert columns handed to
+pymilvus, without the model or a Milvus server.
+
+    python -m benchmarks.embedding_numpy --vectors 1000 --repeat 20
+"""
+import argparse
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+from podcasts_backend.schemas.schemas import Episode, EpisodeMetadata, EpisodeVector
+
+from .common import sample_texts
+
+DIM = 768
+
+
+def list_path(episodes: list[Episode], embeddings: np.ndarray) -> list[list[Any]]:
+    """previous path: tolist, one validated EpisodeVector per episode, columns"""
+    vectors = [
+        EpisodeVector(**episode.dict(), embedding=embedding)
+        for episode, embedding in zip(episodes, embeddings.tolist())
+    ]
+    return [
+        [vector.id for vector in vectors],
+        [vector.text for vector in vectors],
+        [vector.embedding for vector in vectors],
+        [vector.metadata.podcast_id for vector in vectors],
+        [vector.metadata.category for vector in vectors],
+        [vector.metadata.language for vector in vectors],
+    ]
+
+
+def numpy_path(episodes: list[Episode], embeddings: np.ndarray) -> list[list[Any]]:
+    """current path, as in MilvusDataStore._get_columns_insert"""
+    return [
+        [episode.id for episode in episodes],
+        [episode.text for episode in episodes],
+        list(embeddings),
+        [episode.metadata.podcast_id for episode in episodes],
+        [episode.metadata.category for episode in episodes],
+        [episode.metadata.language for episode in episodes],
+    ]
+
+
+def measure(
+    fn: Callable[[list[Episode], np.ndarray], list[list[Any]]],
+    episodes: list[Episode],
+    embeddings: np.ndarray,
+    repeat: int,
+) -> tuple[float, int]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(episodes, embeddings)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    fn(episodes, embeddings)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    embeddings = np.random.default_rng(0).random((args.vectors, DIM), np.float32)
+    episodes = [
+        Episode(
+            id=i,
+            metadata=EpisodeMetadata(podcast_id=i, category="News", language="en"),
+            text=text,
+        )
+        for i, text in enumerate(sample_texts(args.vectors))
+    ]
+
+    per_1k = 1000 / args.vectors
+    results = {}
+    for name, fn in (("list[float] + pydantic", list_path), ("ndarray", numpy_path)):
+        elapsed, peak = measure(fn, episodes, embeddings, args.repeat)
+        results[name] = (elapsed, peak)
+        print(
+            f"{name:<24} {elapsed * per_1k * 1000:9.2f} ms "
+            f"{peak * per_1k / 2**20:9.2f} MiB peak per 1,000 vectors"
+        )
+    (old_time, old_peak), (new_time, new_peak) = results.values()
+    print(
+        f"{'saved':<24} {(old_time - new_time) * per_1k * 1000:9.2f} ms "
+        f"{(old_peak - new_peak) * per_1k / 2**20:9.2f} MiB per 1,000 vectors"
+    )
+
+
+if __name__ == "__main__":
+    main()
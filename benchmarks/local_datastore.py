@@ -0,0 +1,116 @@
+"""Recall and latency of LocalDataStore search, exact (flat) vs HNSW.
+
+Synthetic clustered vectors are inserted into a temporary store; the flat index
+is the ground truth for recall@k. HNSW needs hnswlib installed.
+
+    python -m benchmarks.local_datastore --vectors 100000 --queries 200 --top-k 20
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from podcasts_backend.repository.vector_database.providers.local import (
+    LocalDataStore,
+    hnswlib,
+)
+from podcasts_backend.schemas.schemas import (
+    Episode,
+    EpisodeMetadata,
+    EpisodeMetadataFilter,
+    Query,
+)
+from podcasts_backend.services.executors import executors
+
+from .common import percentile
+
+DIM = 768
+LANGUAGES = ["en", "de", "es", "fr"]
+
+
+def clustered(rng: np.random.Generator, n: int, centers: np.ndarray) -> np.ndarray:
+    labels = rng.integers(len(centers), size=n)
+    noise = rng.normal(scale=0.3, size=(n, DIM)).astype(np.float32)
+    return np.ascontiguousarray(centers[labels] + noise, dtype=np.float32)
+
+
+def build(path: str, index: str, embeddings: np.ndarray, batch: int) -> float:
+    store = LocalDataStore(path, dim=DIM, index=index)
+    start = time.perf_counter()
+    for offset in range(0, len(embeddings), batch):
+        chunk = embeddings[offset : offset + batch]
+        episodes = [
+            Episode(
+                id=offset + i,
+                metadata=EpisodeMetadata(
+                    podcast_id=(offset + i) % 1000,
+                    category="News",
+                    language=LANGUAGES[(offset + i) % len(LANGUAGES)],
+                ),
+                text="",
+            )
+            for i in range(len(chunk))
+        ]
+        store._insert(episodes, chunk)
+    return time.perf_counter() - start
+
+
+def search(
+    store: LocalDataStore, queries: list[Query], embeddings: np.ndarray
+) -> tuple[list[set[int]], list[float]]:
+    hits, latencies = [], []
+    for query, embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        (result,) = store._search([query], embedding[None, :], False)
+        latencies.append(time.perf_counter() - start)
+        hits.append({hit.id for hit in result.results})
+    return hits, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(256, DIM)).astype(np.float32)
+    embeddings = clustered(rng, args.vectors, centers)
+    query_embeddings = clustered(rng, args.queries, centers)
+
+    indexes = ["flat"] + (["hnsw"] if hnswlib is not None else [])
+    if hnswlib is None:
+        print("hnswlib is not installed, only measuring exact search")
+
+    for label, query_filter in (
+        ("unfiltered", None),
+        ("language=en", EpisodeMetadataFilter(language="en")),
+        ("podcast_id=7", EpisodeMetadataFilter(podcast_id=7)),
+    ):
+        queries = [
+            Query(query="", filter=query_filter, top_k=args.top_k)
+            for _ in range(args.queries)
+        ]
+        truth: list[set[int]] = []
+        for index in indexes:
+            with tempfile.TemporaryDirectory() as path:
+                build_time = build(path, index, embeddings, args.batch)
+                store = LocalDataStore(path, dim=DIM, index=index)
+                hits, latencies = search(store, queries, query_embeddings)
+            if index == "flat":
+                truth = hits
+            recall = np.mean([len(h & t) / max(1, len(t)) for h, t in zip(hits, truth)])
+            print(
+                f"{label:<14} {index:<5} build={build_time:7.2f}s "
+                f"p50={percentile(latencies, 50) * 1000:8.2f}ms "
+                f"p99={percentile(latencies, 99) * 1000:8.2f}ms "
+                f"recall@{args.top_k}={recall:.3f}"
+            )
+    executors.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Filtered search latency: one flat collection vs one partition per language.
+
+Loads the same synthetic episodes (skewed language mix, random vectors) into two
+scratch collections through MilvusDataStore, one with partition_by_language,
+then times language-filtered and unfiltered searches on both. Needs a running
+Milvus (MILVUS_HOST/MILVUS_PORT) with room for the collections twice over.
+
+    python -m benchmarks.milvus_partitions --vectors 2000000 --queries 200
+"""
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+
+import numpy as np
+
+from podcasts_backend.repository.vector_database.providers.milvus import (
+    MilvusDataStore,
+)
+from podcasts_backend.schemas.schemas import (
+    Episode,
+    EpisodeMetadata,
+    EpisodeMetadataFilter,
+    Query,
+)
+from podcasts_backend.services.executors import executors
+
+from .common import percentile
+
+DIM = 768
+# share of episodes per language, roughly the podcast index mix
+LANGUAGES = {"en": 0.6, "es": 0.1, "de": 0.08, "fr": 0.07, "pt": 0.05}
+OTHER_LANGUAGES = [f"x{i}" for i in range(20)]
+CATEGORIES = ["News", "Comedy", "Society", "Education", "Sports", "Technology"]
+
+
+def languages(rng: np.random.Generator, n: int) -> list[str]:
+    names = list(LANGUAGES) + OTHER_LANGUAGES
+    rest = (1 - sum(LANGUAGES.values())) / len(OTHER_LANGUAGES)
+    weights = list(LANGUAGES.values()) + [rest] * len(OTHER_LANGUAGES)
+    return list(rng.choice(names, size=n, p=weights))
+
+
+async def load(store: MilvusDataStore, n: int, batch: int, seed: int) -> float:
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for offset in range(0, n, batch):
+        size = min(batch, n - offset)
+        episode_languages = languages(rng, size)
+        episodes = [
+            Episode(
+                id=offset + i,
+                metadata=EpisodeMetadata(
+                    podcast_id=(offset + i) % 50_000,
+                    category=CATEGORIES[(offset + i) % len(CATEGORIES)],
+                    language=episode_languages[i],
+                ),
+                text="",
+            )
+            for i in range(size)
+        ]
+        await store._upsert(episodes, rng.random((size, DIM), np.float32))
+    await asyncio.to_thread(store.col.flush)
+    return time.perf_counter() - start
+
+
+async def search(
+    store: MilvusDataStore, queries: list[Query], embeddings: np.ndarray
+) -> list[float]:
+    for query, embedding in zip(queries[:5], embeddings):  # warm up
+        await store._query([query], embedding[None, :])
+    latencies = []
+    for query, embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        await store._query([query], embedding[None, :])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=2_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    embeddings = np.random.default_rng(1).random((args.queries, DIM), np.float32)
+    cases = [("unfiltered", None)] + [
+        (f"language={language}", EpisodeMetadataFilter(language=language))
+        for language in ("en", "de", "x0")
+    ]
+    for partitioned in (False, True):
+        store = MilvusDataStore(
+            override=True,
+            collection="bench_" + uuid4().hex,
+            partition_by_language=partitioned,
+        )
+        try:
+            load_seconds = await load(store, args.vectors, args.batch, seed=0)
+            await asyncio.to_thread(store.load)
+            label = "partitioned" if partitioned else "flat"
+            print(f"{label}: loaded {args.vectors} vectors in {load_seconds:.1f}s")
+            for name, query_filter in cases:
+                queries = [
+                    Query(query="", filter=query_filter, top_k=args.top_k)
+                    for _ in range(args.queries)
+                ]
+                latencies = await search(store, queries, embeddings)
+                print(
+                    f"  {name:<14} p50={percentile(latencies, 50) * 1000:8.2f}ms "
+                    f"p99={percentile(latencies, 99) * 1000:8.2f}ms"
+                )
+        finally:
+            await asyncio.to_thread(store.col.release)
+            await asyncio.to_thread(store.col.drop)
+            store.close()
+    executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""Collection memory and search latency with and without the text column.
+
+Loads the same synthetic episodes (texts of a few KB, random vectors) into two
+scratch collections through MilvusDataStore: one with store_text that also
+returns the text from every search, as searches did before, and one slim
+collection returning only pk, score and filter fields. Reports loaded segment
+memory and search p50/p99. Needs a running Milvus (MILVUS_HOST/MILVUS_PORT).
+
+    python -m benchmarks.milvus_payload --vectors 200000 --queries 200
+"""
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+
+import numpy as np
+from pymilvus import utility
+
+from podcasts_backend.repository.vector_database.providers.milvus import (
+    MilvusDataStore,
+)
+from podcasts_backend.schemas.schemas import Episode, EpisodeMetadata, Query
+from podcasts_backend.services.executors import executors
+
+from .common import percentile, sample_texts
+
+DIM = 768
+
+
+async def load(store: MilvusDataStore, texts: list[str], n: int, batch: int) -> None:
+    rng = np.random.default_rng(0)
+    for offset in range(0, n, batch):
+        size = min(batch, n - offset)
+        episodes = [
+            Episode(
+                id=offset + i,
+                metadata=EpisodeMetadata(
+                    podcast_id=(offset + i) % 50_000, category="News", language="en"
+                ),
+                text=texts[(offset + i) % len(texts)],
+            )
+            for i in range(size)
+        ]
+        await store._upsert(episodes, rng.random((size, DIM), np.float32))
+    await asyncio.to_thread(store.col.flush)
+    await asyncio.to_thread(store.load)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=5_000)
+    args = parser.parse_args()
+
+    # descriptions of 1-8 KB, the text column is VARCHAR(10000)
+    texts = [(text + " ") * (20 + i % 150) for i, text in enumerate(sample_texts(997))]
+    texts = [text[:10_000] for text in texts]
+    embeddings = np.random.default_rng(1).random((args.queries, DIM), np.float32)
+    queries = [Query(query="", top_k=args.top_k) for _ in range(args.queries)]
+
+    for store_text in (True, False):
+        name = "bench_" + uuid4().hex
+        store = MilvusDataStore(override=True, collection=name, store_text=store_text)
+        if store_text:
+            # what searches requested before the slim payload
+            store.output_fields = ["text", *store.output_fields]
+        try:
+            await load(store, texts, args.vectors, args.batch)
+            segments = utility.get_query_segment_info(name, using=store.alias)
+            memory = sum(segment.mem_size for segment in segments)
+            for query, embedding in zip(queries[:5], embeddings):  # warm up
+                await store._query([query], embedding[None, :])
+            latencies = []
+            for query, embedding in zip(queries, embeddings):
+                start = time.perf_counter()
+                await store._query([query], embedding[None, :])
+                latencies.append(time.perf_counter() - start)
+            label = "with text" if store_text else "slim"
+            print(
+                f"{label:<10} memory={memory / 2**20:9.1f}MiB "
+                f"p50={percentile(latencies, 50) * 1000:8.2f}ms "
+                f"p99={percentile(latencies, 99) * 1000:8.2f}ms"
+            )
+        finally:
+            await asyncio.to_thread(store.col.release)
+            await asyncio.to_thread(store.col.drop)
+            store.close()
+    executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+"""Hydrated semantic search latency: Milvus + Postgres lookups vs pgvector.
+
+Takes up to --episodes real episodes from DATABASE_URL, gives them random
+vectors and loads the same vectors and metadata into a scratch Milvus collection
+and a scratch pgvector table. Then times what the search endpoint does per
+query: a Milvus search followed by the per-hit episode and podcast lookups, the
+same search followed by one bulk lookup of all hits, and a single pgvector query
+joining the episode tables. Needs Postgres with the pgvector extension and a
+running Milvus.
+
+    python -m benchmarks.pgvector_search --episodes 100000 --queries 200
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from uuid import uuid4
+
+import numpy as np
+from sqlmodel import Session, col, select
+
+from podcasts_backend.models.models import EpisodeTable, PodcastTable
+from podcasts_backend.repository.db.postgres import get_podcast_repository
+from podcasts_backend.repository.podcast_repository import Repository
+from podcasts_backend.repository.vector_database.providers.milvus import (
+    MilvusDataStore,
+)
+from podcasts_backend.repository.vector_database.providers.pgvector import (
+    PgVectorDataStore,
+)
+from podcasts_backend.schemas.schemas import (
+    Episode,
+    EpisodeMetadata,
+    EpisodeMetadataFilter,
+    Query,
+)
+from podcasts_backend.services.embeddings import EMBEDDING_DIM
+from podcasts_backend.services.executors import executors, run_blocking
+
+from .common import percentile
+
+
+def sample_episodes(repository: Repository, limit: int) -> list[Episode]:
+    with Session(repository.db_session) as session:
+        rows = session.exec(
+            select(
+                EpisodeTable.episode_id,
+                EpisodeTable.podcast_id,
+                EpisodeTable.datePublished,
+                EpisodeTable.duration,
+                PodcastTable.category1,
+                PodcastTable.language,
+            )
+            .join(PodcastTable)
+            .order_by(col(EpisodeTable.episode_id))
+            .limit(limit)
+        ).all()
+    return [
+        Episode(
+            id=episode_id,
+            metadata=EpisodeMetadata(
+                podcast_id=podcast_id,
+                category=category,
+                language=language,
+                datePublished=date_published,
+                duration=duration,
+            ),
+            text="",
+        )
+        for episode_id, podcast_id, date_published, duration, category, language in rows
+    ]
+
+
+async def milvus_then_postgres(
+    store: MilvusDataStore,
+    repository: Repository,
+    query: Query,
+    embedding: np.ndarray,
+) -> int:
+    """the search endpoint before pgvector: one search, two lookups per hit"""
+    result = (await store._query([query], embedding[None, :]))[0]
+    for episode in result.results:
+        await run_blocking(repository.get_podcast_from_episode_id, episode.id)
+        await run_blocking(repository.get_episode, episode.id)
+    return len(result.results)
+
+
+async def milvus_then_bulk(
+    store: MilvusDataStore,
+    repository: Repository,
+    query: Query,
+    embedding: np.ndarray,
+) -> int:
+    """one search, then all hits hydrated in one query"""
+    result = (await store._query([query], embedding[None, :]))[0]
+    rows = await run_blocking(
+        repository.get_episodes_with_podcasts,
+        [episode.id for episode in result.results],
+    )
+    return len(rows)
+
+
+async def pgvector_joined(
+    store: PgVectorDataStore, query: Query, embedding: np.ndarray
+) -> int:
+    return len(await run_blocking(store._search_episodes, query, embedding))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--episodes", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=5_000)
+    parser.add_argument("--index", default="hnsw", choices=["hnsw", "ivfflat"])
+    args = parser.parse_args()
+
+    repository = get_podcast_repository()
+    episodes = sample_episodes(repository, args.episodes)
+    if not episodes:
+        print("No episodes in DATABASE_URL to benchmark with")
+        return
+    vectors = np.random.default_rng(0).random(
+        (len(episodes), EMBEDDING_DIM), np.float32
+    )
+    embeddings = np.random.default_rng(1).random(
+        (args.queries, EMBEDDING_DIM), np.float32
+    )
+    language = Counter(e.metadata.language for e in episodes).most_common(1)[0][0]
+    cases = [
+        ("unfiltered", None),
+        (f"language={language}", EpisodeMetadataFilter(language=language)),
+    ]
+
+    name = "bench_" + uuid4().hex
+    milvus = MilvusDataStore(override=True, collection=name)
+    pgvector = PgVectorDataStore(table=name, index="none")
+    try:
+        for store in (milvus, pgvector):
+            start = time.perf_counter()
+            for offset in range(0, len(episodes), args.batch):
+                await store._upsert(
+                    episodes[offset : offset + args.batch],
+                    vectors[offset : offset + args.batch],
+                )
+            if store is milvus:
+                await asyncio.to_thread(milvus.col.flush)
+                await asyncio.to_thread(milvus.load)
+            else:
+                # built once the rows are in, like IVFFlat needs it
+                pgvector.index = args.index
+                await asyncio.to_thread(pgvector.create_index)
+            seconds = time.perf_counter() - start
+            print(f"{type(store).__name__}: {len(episodes)} vectors in {seconds:.1f}s")
+
+        for label, query_filter in cases:
+            queries = [
+                Query(query="", filter=query_filter, top_k=args.top_k)
+                for _ in range(args.queries)
+            ]
+            for path, search in (
+                (
+                    "milvus+postgres",
+                    lambda q, e: milvus_then_postgres(milvus, repository, q, e),
+                ),
+                (
+                    "milvus+bulk",
+                    lambda q, e: milvus_then_bulk(milvus, repository, q, e),
+                ),
+                ("pgvector", lambda q, e: pgvector_joined(pgvector, q, e)),
+            ):
+                for query, embedding in zip(queries[:5], embeddings):  # warm up
+                    await search(query, embedding)
+                latencies, hits = [], 0
+                for query, embedding in zip(queries, embeddings):
+                    start = time.perf_counter()
+                    hits += await search(query, embedding)
+                    latencies.append(time.perf_counter() - start)
+                print(
+                    f"{label:<16} {path:<16} "
+                    f"p50={percentile(latencies, 50) * 1000:8.2f}ms "
+                    f"p99={percentile(latencies, 99) * 1000:8.2f}ms "
+                    f"hits/query={hits / len(queries):5.1f}"
+                )
+    finally:
+        await asyncio.to_thread(milvus.col.release)
+        await asyncio.to_thread(milvus.col.drop)
+        milvus.close()
+        await asyncio.to_thread(pgvector.table.drop, pgvector.engine)
+        pgvector.close()
+        executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
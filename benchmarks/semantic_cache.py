@@ -0,0 +1,130 @@
+"""Offline evaluation of the semantic cache threshold: hit rate vs result overlap.
+
+Replays a stream of queries (one per line in --queries, e.g. exported from the
+request logs, in arrival order; a built-in list of rephrasings otherwise).
+Every query is embedded with the real model and searched in the configured
+vector store (VECTOR_DATASTORE, "local" needs no server). For each threshold
+the cache is simulated as holding all earlier queries: a query hits when an
+earlier one is within the threshold, and is served the closest one's results.
+Reports the hit rate and how many of the true top-k those served results
+contain (overlap@k: mean, 10th percentile and the worst pair).
+
+    python -m benchmarks.semantic_cache --queries queries.txt --top-k 20 \\
+        --thresholds 0.05 0.1 0.2 0.3
+"""
+import argparse
+import asyncio
+
+import numpy as np
+
+from podcasts_backend.repository.db.postgres import create_vector_db
+from podcasts_backend.schemas.schemas import Query
+from podcasts_backend.services.embeddings import encode
+from podcasts_backend.services.executors import executors
+
+from .common import percentile
+
+REPHRASINGS = [
+    "true crime podcasts",
+    "podcasts about true crime",
+    "true crime stories",
+    "unsolved murder cases",
+    "unsolved murders",
+    "history of the roman empire",
+    "ancient rome history",
+    "roman history podcast",
+    "startup founders interviews",
+    "interviews with startup founders",
+    "how founders built their companies",
+    "football tactics analysis",
+    "soccer tactics",
+    "premier league analysis",
+    "daily news briefing",
+    "morning news summary",
+    "stand up comedy",
+    "comedians talking",
+    "funny podcasts",
+    "meditation and mindfulness",
+    "guided meditation",
+    "learn spanish",
+    "spanish lessons for beginners",
+    "personal finance tips",
+    "how to invest money",
+    "machine learning research",
+    "artificial intelligence news",
+]
+
+
+async def search_all(texts: list[str], top_k: int) -> tuple[np.ndarray, list[set[int]]]:
+    """embeddings of the texts and the ids of their true top_k"""
+    embeddings = encode(texts)
+    vector_db = create_vector_db()
+    vector_db.load()
+    try:
+        results = await vector_db._query(
+            [Query(query=text, top_k=top_k) for text in texts], embeddings
+        )
+    finally:
+        vector_db.close()
+    return embeddings, [{hit.id for hit in result.results} for result in results]
+
+
+def evaluate(
+    texts: list[str],
+    embeddings: np.ndarray,
+    results: list[set[int]],
+    top_k: int,
+    threshold: float,
+) -> None:
+    norms = np.einsum("ij,ij->i", embeddings, embeddings)
+    distances = norms[:, None] - 2 * embeddings @ embeddings.T + norms[None, :]
+    overlaps, worst = [], None
+    for i in range(1, len(texts)):
+        # the cache holds the earlier queries only
+        nearest = int(np.argmin(distances[i, :i]))
+        if distances[i, nearest] > threshold:
+            continue
+        overlap = len(results[i] & results[nearest]) / top_k
+        overlaps.append(overlap)
+        if worst is None or overlap < worst[0]:
+            worst = (overlap, texts[i], texts[nearest])
+    hit_rate = len(overlaps) / max(len(texts) - 1, 1)
+    line = f"threshold={threshold:<6g} hit_rate={hit_rate:6.1%}"
+    if overlaps:
+        line += (
+            f" overlap@{top_k} mean={np.mean(overlaps):.3f}"
+            f" p10={percentile(overlaps, 10):.3f}"
+        )
+    print(line)
+    if worst is not None:
+        print(f"    worst {worst[0]:.2f}: {worst[1]!r} served {worst[2]!r}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--queries", help="file with one query per line")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument(
+        "--thresholds",
+        type=float,
+        nargs="+",
+        default=[0.02, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5],
+    )
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries) as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = REPHRASINGS
+    embeddings, results = await search_all(texts, args.top_k)
+    print(f"{len(texts)} queries, overlap with the true top {args.top_k}")
+    for threshold in args.thresholds:
+        evaluate(texts, embeddings, results, args.top_k, threshold)
+    executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
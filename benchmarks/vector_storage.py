@@ -0,0 +1,190 @@
+"""Memory, recall and latency of the compressed vector storage modes.
+
+Generates clustered unit vectors shaped like sentence embeddings, computes the
+exact top-k with numpy, then loads them into a LocalDataStore per storage mode
+(float32, float16, sq8 with and without reranking) and reports bytes per
+vector, resident memory, recall@k and search p50/p99. With --milvus the same
+vectors also go into scratch collections with HNSW, IVF_SQ8 and IVF_PQ indexes,
+with and without reranking, reporting the loaded segment memory (needs a
+running Milvus).
+
+    python -m benchmarks.vector_storage --vectors 100000 --queries 200 --milvus
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from uuid import uuid4
+
+import numpy as np
+
+from podcasts_backend.repository.vector_database.datastore import DataStore
+from podcasts_backend.repository.vector_database.providers.local import (
+    LocalDataStore,
+)
+from podcasts_backend.schemas.schemas import (
+    Episode,
+    EpisodeMetadata,
+    Query,
+    QueryResult,
+)
+from podcasts_backend.services.executors import executors
+
+from .common import percentile
+
+DIM = 768
+
+
+def clustered(rng: np.random.Generator, n: int, centers: np.ndarray) -> np.ndarray:
+    """unit vectors around random cluster centers"""
+    vectors = centers[rng.integers(len(centers), size=n)]
+    vectors = vectors + 0.6 * rng.standard_normal((n, centers.shape[1]))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    distances = -2 * queries @ corpus.T + np.einsum("ij,ij->i", corpus, corpus)
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return top
+
+
+async def load(store: DataStore, vectors: np.ndarray, batch: int) -> None:
+    for start in range(0, len(vectors), batch):
+        end = min(start + batch, len(vectors))
+        episodes = [
+            Episode(
+                id=i,
+                metadata=EpisodeMetadata(podcast_id=i, category=None, language=None),
+                text="",
+            )
+            for i in range(start, end)
+        ]
+        await store._upsert(episodes, vectors[start:end])
+
+
+async def measure(
+    store: DataStore, queries: np.ndarray, truth: np.ndarray, k: int
+) -> dict[str, float]:
+    async def search(embedding: np.ndarray) -> QueryResult:
+        return (await store._query([Query(query="", top_k=k)], embedding[None, :]))[0]
+
+    for embedding in queries[:5]:  # warm up
+        await search(embedding)
+    latencies, recalls = [], []
+    for embedding, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = await search(embedding)
+        latencies.append(time.perf_counter() - start)
+        found = {hit.id for hit in result.results}
+        recalls.append(len(found & set(expected.tolist())) / k)
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def report(name: str, bytes_per_vector: float, memory: int, result: dict) -> None:
+    print(
+        f"{name:<22} {bytes_per_vector:8.0f}B/vector "
+        f"memory={memory / 2**20:8.1f}MiB recall={result['recall']:.3f} "
+        f"p50={result['p50_ms']:7.2f}ms p99={result['p99_ms']:7.2f}ms"
+    )
+
+
+async def local_modes(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    args: argparse.Namespace,
+) -> None:
+    for storage, rerank_factor in (
+        ("float32", 1),
+        ("float16", 1),
+        ("sq8", 1),
+        ("sq8", 4),
+    ):
+        with tempfile.TemporaryDirectory() as path:
+            store = LocalDataStore(
+                path, dim=DIM, storage=storage, rerank_factor=rerank_factor
+            )
+            await load(store, vectors, args.batch)
+            result = await measure(store, queries, truth, args.top_k)
+            stats = store.stats()
+            name = f"local {storage}" + (
+                f" rerank x{rerank_factor}" if rerank_factor > 1 else ""
+            )
+            report(name, stats["bytes_per_vector"], stats["memory_bytes"], result)
+
+
+async def milvus_modes(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    args: argparse.Namespace,
+) -> None:
+    from pymilvus import utility
+
+    from podcasts_backend.repository.vector_database.providers.milvus import (
+        DEFAULT_INDEX_PARAMS,
+        MilvusDataStore,
+    )
+
+    for index_type, rerank_factor in (
+        ("HNSW", 1),
+        ("IVF_SQ8", 1),
+        ("IVF_SQ8", 4),
+        ("IVF_PQ", 1),
+        ("IVF_PQ", 4),
+    ):
+        name = "bench_" + uuid4().hex
+        store = MilvusDataStore(
+            override=True,
+            collection=name,
+            index_params=DEFAULT_INDEX_PARAMS[index_type],
+            rerank_factor=rerank_factor,
+            load=False,
+        )
+        try:
+            await load(store, vectors, args.batch)
+            await asyncio.to_thread(store.col.flush)
+            await asyncio.to_thread(store.load)
+            result = await measure(store, queries, truth, args.top_k)
+            segments = utility.get_query_segment_info(name, using=store.alias)
+            memory = sum(segment.mem_size for segment in segments)
+            label = f"milvus {index_type}" + (
+                f" rerank x{rerank_factor}" if rerank_factor > 1 else ""
+            )
+            report(label, memory / len(vectors), memory, result)
+        finally:
+            await asyncio.to_thread(store.col.release)
+            await asyncio.to_thread(store.col.drop)
+            store.close()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--milvus", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, DIM)) / np.sqrt(DIM)
+    vectors = clustered(rng, args.vectors, centers)
+    queries = clustered(rng, args.queries, centers)
+    truth = exact_top_k(vectors, queries, args.top_k)
+    print(f"{args.vectors} vectors, {args.queries} queries, recall@{args.top_k}")
+
+    await local_modes(vectors, queries, truth, args)
+    if args.milvus:
+        await milvus_modes(vectors, queries, truth, args)
+    executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,20 +1,46 @@
-from fastapi import FastAPI
+import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
-from .repository.db.postgres import init_db
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 
 # from .repository.db.postgres import init_db, podcast_repository
 # from .repository.mock_data_upload import upload_data
-from .routers import auth, favorite_podcasts, podcasts
+from .resources import ResourceNotReadyError, registry
+from .routers import auth, favorite_podcasts, monitoring, podcasts
+from .services.embeddings import embedding_batcher
+from .services.executors import executors
 
-app = FastAPI()
+# run a dummy encode and load the Milvus collection before reporting ready
+WARM_UP = (os.environ.get("WARM_UP") or "true").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    executors.start()
+    # resources start in the background, /readyz reports when they are done
+    await registry.start(warm_up=WARM_UP)
+    yield
+    await embedding_batcher.close()
+    await registry.close()
+    executors.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # repository = Repository(db_session=engine, vector_db_session=milvus_db)
 
 app.include_router(podcasts.router)
 app.include_router(auth.router)
 app.include_router(favorite_podcasts.router)
+app.include_router(monitoring.router)
 
 
-@app.on_event("startup")
-async def startup_event() -> None:
-    init_db()
+@app.exception_handler(ResourceNotReadyError)
+async def resource_not_ready_handler(
+    request: Request, exc: ResourceNotReadyError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)}
+    )
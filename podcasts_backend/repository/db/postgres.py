@@ -1,21 +1,74 @@
 import os
 
+from sqlalchemy.engine import Engine
 from sqlmodel import SQLModel, create_engine
 
+from ...resources import registry
+from ...services.executors import run_blocking
+from ...services.search_cache import invalidate_search_caches
 from ..favorite_podcasts import FavoritePodcastsRepository
 from ..podcast_repository import Repository
+from ..vector_database.datastore import DataStore
+from ..vector_database.providers.local import LocalDataStore
 from ..vector_database.providers.milvus import MilvusDataStore
+from ..vector_database.providers.pgvector import PgVectorDataStore
 
 DATABASE_URL = os.getenv("DATABASE_URL") or ""
-assert DATABASE_URL != "", "DATABASE_URL environment variable must be set"
+# "milvus", "pgvector" to keep the vectors in Postgres, or "local" for the
+# in-process store that needs no vector database at all
+VECTOR_DATASTORE = os.getenv("VECTOR_DATASTORE") or "milvus"
 
-engine = create_engine(DATABASE_URL, echo=True)
 
+def create_db_engine() -> Engine:
+    assert DATABASE_URL != "", "DATABASE_URL environment variable must be set"
+    engine = create_engine(DATABASE_URL, echo=True)
+    init_db(engine)
+    return engine
 
-milvus_db = MilvusDataStore()
-podcast_repository = Repository(db_session=engine, vector_db_session=milvus_db)
-favorite_podcasts_repository = FavoritePodcastsRepository(db_session=engine)
 
+def create_vector_db() -> DataStore:
+    if VECTOR_DATASTORE == "local":
+        return LocalDataStore()
+    if VECTOR_DATASTORE == "pgvector":
+        return PgVectorDataStore()
+    if VECTOR_DATASTORE != "milvus":
+        raise ValueError(f"Unknown vector datastore {VECTOR_DATASTORE}")
+    # loading the collection is left to the warm-up, or to the first search
+    return MilvusDataStore(load=False)
 
-def init_db() -> None:
+
+async def load_vector_db(vector_db: DataStore) -> None:
+    await run_blocking(vector_db.load)
+
+
+registry.register("database", create_db_engine, close=lambda engine: engine.dispose())
+registry.register(
+    "vector_db",
+    create_vector_db,
+    warm_up=load_vector_db,
+    close=lambda vector_db: vector_db.close(),
+)
+
+
+def get_engine() -> Engine:
+    return registry.get("database")  # type: ignore
+
+
+def get_vector_db() -> DataStore:
+    return registry.get("vector_db")  # type: ignore
+
+
+def get_podcast_repository() -> Repository:
+    return Repository(
+        db_session=get_engine(),
+        vector_db_session=get_vector_db(),
+        on_episodes_added=invalidate_search_caches,
+    )
+
+
+def get_favorite_podcasts_repository() -> FavoritePodcastsRepository:
+    return FavoritePodcastsRepository(db_session=get_engine())
+
+
+def init_db(engine: Engine) -> None:
     SQLModel.metadata.create_all(engine)
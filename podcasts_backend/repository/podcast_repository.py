@@ -1,3 +1,5 @@
+from collections.abc import Awaitable, Callable
+
 from sqlalchemy import func
 from sqlalchemy.engine import Engine
 from sqlmodel import Session, col, select
@@ -10,14 +12,44 @@ from podcasts_backend.models.models import (
 )
 from podcasts_backend.repository.vector_database.datastore import DataStore
 from podcasts_backend.schemas.schemas import Episode, EpisodeMetadata
+from podcasts_backend.services.executors import run_blocking
+
+
+def episode_vector(episode: EpisodeTable, podcast: PodcastTable) -> Episode:
+    """the episode as stored in the vector database, its text is what gets embedded"""
+    if episode.title is None and episode.description is None:
+        embedding_text = f"{podcast.title} {podcast.description}"
+    else:
+        embedding_text = f"{episode.title} {episode.description}"
+    return Episode(
+        id=episode.episode_id,  # type: ignore
+        metadata=EpisodeMetadata(
+            podcast_id=episode.podcast_id,
+            category=podcast.category1,
+            language=podcast.language,
+            datePublished=episode.datePublished,
+            duration=episode.duration,
+        ),
+        text=embedding_text,
+    )
 
 
 class Repository:
-    def __init__(self, db_session: Engine, vector_db_session: DataStore) -> None:
+    def __init__(
+        self,
+        db_session: Engine,
+        vector_db_session: DataStore,
+        on_episodes_added: Callable[[], Awaitable[None]] | None = None,
+    ) -> None:
         self.db_session = db_session
         self.vector_db_session = vector_db_session
+        # called once added episodes are searchable, e.g. to invalidate caches
+        self.on_episodes_added = on_episodes_added
 
     async def add_podcast(self, obj: Podcast) -> PodcastTable:
+        return await run_blocking(self._add_podcast, obj)
+
+    def _add_podcast(self, obj: Podcast) -> PodcastTable:
         with Session(self.db_session) as session:
             podcast = PodcastTable.from_orm(obj, update={"episodes": []})
             session.add(podcast)
@@ -27,6 +59,9 @@ class Repository:
             return podcast
 
     async def add_many_podcasts(self, objs: list[Podcast]) -> list[PodcastTable]:
+        return await run_blocking(self._add_many_podcasts, objs)
+
+    def _add_many_podcasts(self, objs: list[Podcast]) -> list[PodcastTable]:
         with Session(self.db_session) as session:
             already_in_db = session.exec(select(PodcastTable.podcast_id)).all()
             podcasts = [
@@ -55,6 +90,13 @@ class Repository:
         Returns:
             EpisodeTable: Added episode.
         """
+        episode, episode_vector = await run_blocking(self._add_episode, obj)
+        await self.vector_db_session.upsert([episode_vector])
+        if self.on_episodes_added is not None:
+            await self.on_episodes_added()
+        return episode
+
+    def _add_episode(self, obj: EpisodeModel) -> tuple[EpisodeTable, Episode]:
         with Session(self.db_session) as session:
             podcast = session.get(PodcastTable, obj.podcast_id)
             if not podcast:
@@ -64,20 +106,7 @@ class Repository:
             session.commit()
             session.refresh(episode)
 
-            if episode.title is None and episode.description is None:
-                embedding_text = f"{podcast.title} {podcast.description}"
-            embedding_text = f"{episode.title} {episode.description}"
-            episode_vector = Episode(
-                id=episode.episode_id,  # type: ignore
-                metadata=EpisodeMetadata(
-                    podcast_id=episode.podcast_id,
-                    category=podcast.category1,
-                    language=podcast.language,
-                ),
-                text=embedding_text,
-            )
-            await self.vector_db_session.upsert([episode_vector])
-            return episode
+            return episode, episode_vector(episode, podcast)
 
     async def add_many_episodes(self, objs: list[EpisodeModel]) -> list[EpisodeTable]:
         """add many episodes to database and vector database, raise ValueError if
@@ -93,6 +122,20 @@ class Repository:
         Returns:
             list[EpisodeTable]: list of added episodes
         """
+        episodes, episode_vectors = await run_blocking(self._add_many_episodes, objs)
+
+        upserts = await self.vector_db_session.upsert(episode_vectors)
+        if len(upserts) != len(episode_vectors) and len(episode_vectors) != len(
+            episodes
+        ):
+            raise ValueError("Failed to add all episodes")
+        if self.on_episodes_added is not None:
+            await self.on_episodes_added()
+        return episodes
+
+    def _add_many_episodes(
+        self, objs: list[EpisodeModel]
+    ) -> tuple[list[EpisodeTable], list[Episode]]:
         with Session(self.db_session) as session:
             episodes = []
             for obj in objs:
@@ -116,23 +159,9 @@ class Repository:
             for episode in episodes:
                 session.refresh(episode)
                 podcast = session.get(PodcastTable, episode.podcast_id)
-                episode_vector = Episode(
-                    id=episode.episode_id,  # type: ignore
-                    metadata=EpisodeMetadata(
-                        podcast_id=episode.podcast_id,
-                        category=podcast.category1,  # type: ignore
-                        language=podcast.language,  # type: ignore
-                    ),
-                    text=episode.title,
-                )
-                episode_vectors.append(episode_vector)
-
-            upserts = await self.vector_db_session.upsert(episode_vectors)
-            if len(upserts) != len(episode_vectors) and len(episode_vectors) != len(
-                episodes
-            ):
-                raise ValueError("Failed to add all episodes")
-        return episodes
+                # the same text as add_episode and the backfill embed
+                episode_vectors.append(episode_vector(episode, podcast))  # type: ignore
+            return episodes, episode_vectors
 
     def list_podcasts(self, limit: int, offset: int) -> list[PodcastTable]:
         with Session(self.db_session) as session:
@@ -148,6 +177,35 @@ class Repository:
             ).all()
             return podcast_ids
 
+    def list_episode_vectors(self, after: int, limit: int) -> list[Episode]:
+        """episodes with an id above after, by id, ready to embed (keyset paging)
+
+        Args:
+            after (int): last episode id of the previous page, -1 for the first
+            limit (int): page size
+
+        Returns:
+            list[Episode]: episodes with their vector metadata and text
+        """
+        with Session(self.db_session) as session:
+            rows = session.exec(
+                select(EpisodeTable, PodcastTable)
+                .join(PodcastTable)
+                .where(col(EpisodeTable.episode_id) > after)
+                .order_by(col(EpisodeTable.episode_id))
+                .limit(limit)
+            ).all()
+            return [episode_vector(episode, podcast) for episode, podcast in rows]
+
+    def get_episodes_count(self, after: int = -1) -> int:
+        with Session(self.db_session) as session:
+            count = session.exec(
+                select(func.count(col(EpisodeTable.episode_id))).where(
+                    col(EpisodeTable.episode_id) > after
+                )
+            ).one()
+            return count
+
     def get_podcasts_count(self) -> int:
         with Session(self.db_session) as session:
             count = session.exec(select(func.count(PodcastTable.podcast_id))).one()  # type: ignore
@@ -182,6 +240,29 @@ class Repository:
                 raise ValueError("Episode not found")
             return episode.podcast
 
+    def get_episodes_with_podcasts(
+        self, episode_ids: list[int]
+    ) -> list[tuple[EpisodeTable, PodcastTable]]:
+        """episodes with their podcast, in one query, in the order of episode_ids
+
+        Args:
+            episode_ids (list[int]): episode ids, e.g. vector search hits by score
+
+        Returns:
+            list[tuple[EpisodeTable, PodcastTable]]: (episode, podcast) of every id
+            found, ids missing from the database are skipped
+        """
+        if not episode_ids:
+            return []
+        with Session(self.db_session) as session:
+            rows = session.exec(
+                select(EpisodeTable, PodcastTable)
+                .join(PodcastTable)
+                .where(col(EpisodeTable.episode_id).in_(set(episode_ids)))
+            ).all()
+        by_id = {episode.episode_id: (episode, podcast) for episode, podcast in rows}
+        return [by_id[id] for id in episode_ids if id in by_id]
+
     def get_latest_updated_podcast(self) -> PodcastTable:
         with Session(self.db_session) as session:
             latest_podcast = session.exec(
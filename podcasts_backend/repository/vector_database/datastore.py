@@ -1,71 +1,242 @@
+import os
 from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from typing import Any
 
+import numpy as np
+
+from ...models.models import EpisodeTable, PodcastTable
 from ...schemas.schemas import (
     Episode,
-    EpisodeVector,
+    EpisodeGroup,
+    EpisodeMetadataFilter,
+    EpisodeWithScore,
+    GroupedQueryResult,
     Query,
     QueryResult,
-    QueryWithEmbedding,
 )
-from ...services.embeddings import get_embeddings
+from ...services.embeddings import (
+    EMBEDDING_CHUNK_SIZE,
+    embed_length_sorted,
+    embedding_batcher,
+)
+
+# searches a grouped query may take, and the most hits one of them fetches
+GROUPED_SEARCH_ROUNDS = int(os.environ.get("GROUPED_SEARCH_ROUNDS") or 4)
+GROUPED_SEARCH_MAX_FETCH = int(os.environ.get("GROUPED_SEARCH_MAX_FETCH") or 4096)
+if GROUPED_SEARCH_ROUNDS < 1:
+    raise ValueError("GROUPED_SEARCH_ROUNDS must be at least 1")
+
+# an episode and its podcast, with the score of the vector search hit
+SearchHit = tuple[EpisodeTable, PodcastTable, float]
+# looks up the episodes and podcasts of hits, dropping the ones no longer stored
+Hydrate = Callable[[list[EpisodeWithScore]], Awaitable[list[SearchHit]]]
 
 
 class DataStore(ABC):
+    # whether a search returning fewer than top_k hits means no other vector
+    # matches its filter; not for indexes that filter approximate results
+    exhaustive_search = False
+
+    def load(self) -> None:
+        """
+        Prepares the datastore for searches (e.g. loads the collection into memory).
+        Blocking, called from the warm-up. Does nothing by default.
+        """
+
+    def close(self) -> None:
+        """
+        Releases connections and threads held by the datastore. Blocking.
+        """
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Provider specific counters for the metrics endpoint.
+        """
+        return {}
+
     async def upsert(
-        self, episodes: list[Episode], delete_all: bool = False
+        self,
+        episodes: list[Episode],
+        delete_all: bool = False,
+        chunk_size: int = EMBEDDING_CHUNK_SIZE,
+        embeddings: np.ndarray | None = None,
+        replace: bool = True,
     ) -> list[int]:
         """
         Takes in a list of episodes and inserts them into the database.
         First deletes all the existing vectors with the episode id (if necessary,
-        depends on the vector db), then inserts the new ones.
+        depends on the vector db), then inserts the new ones. With replace=False
+        the ids are known not to be stored (e.g. a copy into a new collection)
+        and nothing is deleted.
+        Episodes are embedded in length-sorted chunks of chunk_size texts, unless
+        their embeddings are passed in, one row per episode.
         Return a list of episode ids.
         """
         # Delete any existing vectors for documents with the input document ids
-        await self.delete(
-            ids=[episode.id for episode in episodes if episode.id],  # type: ignore
-            delete_all=delete_all,
-        )
+        if delete_all:
+            await self.delete(delete_all=True)
+        elif replace:
+            await self._delete_existing(
+                [episode.id for episode in episodes if episode.id]
+            )
 
-        # calculate embeddings for the episodes
-        episodes_embeddings = [
-            EpisodeVector(**episode.dict(), embedding=get_embeddings([episode.text])[0])
-            for episode in episodes
-        ]
+        if embeddings is None:
+            # calculate embeddings for the episodes, a chunk per forward pass
+            embeddings = await embed_length_sorted(
+                [episode.text for episode in episodes], chunk_size
+            )
 
-        return await self._upsert(episodes_embeddings)
+        return await self._upsert(episodes, embeddings)
+
+    async def _delete_existing(self, ids: list[int]) -> None:
+        """
+        Removes the vectors of ids that are about to be re-inserted.
+        Deletes every id by default; providers that can tell which ids exist, or
+        that replace on insert, only touch what is actually stored.
+        """
+        await self.delete(ids=ids)  # type: ignore
 
     @abstractmethod
-    async def _upsert(self, episodes: list[EpisodeVector]) -> list[int]:
+    async def _upsert(
+        self, episodes: list[Episode], embeddings: np.ndarray
+    ) -> list[int]:
         """
-        Takes in a list of episodes and inserts them into the database.
+        Takes in a list of episodes and a float32 matrix with their embeddings, one
+        row per episode, and inserts them into the database.
         Return a list of episode ids.
         """
 
         raise NotImplementedError
 
-    async def query(self, queries: list[Query]) -> list[QueryResult]:
+    async def query(
+        self,
+        queries: list[Query],
+        include_vectors: bool = False,
+        embeddings: np.ndarray | None = None,
+    ) -> list[QueryResult]:
         """
         Takes in a list of queries and filters and returns a list of query results with
         matching episodes and scores.
+        With include_vectors, every result also carries its stored embedding.
+        The queries are embedded unless their embeddings are passed in, one row
+        per query.
         """
-        # get a list of of just the queries from the Query list
-        query_texts = [query.query for query in queries]
-        query_embeddings = get_embeddings(query_texts)
-        # hydrate the queries with embeddings
-        queries_with_embeddings = [
-            QueryWithEmbedding(**query.dict(), embedding=embedding)
-            for query, embedding in zip(queries, query_embeddings)
-        ]
-        return await self._query(queries_with_embeddings)
+        if embeddings is None:
+            # get a list of of just the queries from the Query list
+            query_texts = [query.query for query in queries]
+            embeddings = await embedding_batcher.embed(query_texts)
+        return await self._query(queries, embeddings, include_vectors)
 
     @abstractmethod
-    async def _query(self, queries: list[QueryWithEmbedding]) -> list[QueryResult]:
+    async def _query(
+        self,
+        queries: list[Query],
+        embeddings: np.ndarray,
+        include_vectors: bool = False,
+    ) -> list[QueryResult]:
         """
-        Takes in a list of queries with embeddings and filters and returns a list of
-        query results with matching episodes and scores.
+        Takes in a list of queries with filters and a float32 matrix with their
+        embeddings, one row per query, and returns a list of query results with
+        matching episodes and scores (EpisodeVectorWithScore with include_vectors).
         """
         raise NotImplementedError
 
+    async def search_episodes(
+        self, query: Query, hydrate: Hydrate, embedding: np.ndarray | None = None
+    ) -> list[SearchHit]:
+        """
+        Takes in a query and returns its nearest episodes with their podcasts, by
+        increasing score. Searches, then passes the hits to hydrate; providers
+        storing vectors next to the episode tables can do both in one query.
+        The query is embedded unless its embedding is passed in.
+        """
+        if embedding is None:
+            embedding = (await embedding_batcher.embed([query.query]))[0]
+        result = (await self._query([query], embedding[None, :]))[0]
+        return await hydrate(result.results)
+
+    async def query_grouped(
+        self, query: Query, group_size: int, embedding: np.ndarray | None = None
+    ) -> GroupedQueryResult:
+        """
+        Takes in a query and returns its top_k best podcasts, each with up to
+        group_size of its best matching episodes.
+        The query is embedded unless its embedding is passed in.
+        """
+        if embedding is None:
+            embedding = (await embedding_batcher.embed([query.query]))[0]
+        return await self._query_grouped(query, embedding, group_size)
+
+    async def _query_grouped(
+        self, query: Query, embedding: np.ndarray, group_size: int
+    ) -> GroupedQueryResult:
+        """
+        Grouped search by over-fetching: searches for top_k * group_size hits and
+        groups them by podcast. Until top_k podcasts are found, searches again for
+        twice as many hits, excluding the podcasts whose groups are full, so the
+        hits of a prolific podcast are not fetched over and over. The podcasts
+        found are the best ones, any other has no hit better than the last one
+        fetched. Groups still short of group_size are then filled with one search
+        per podcast, all in one batch, unless an exhaustive search came back
+        short and so returned every match. Providers with a native group-by
+        search can override this.
+        """
+        base_filter = query.filter or EpisodeMetadataFilter()
+        excluded = list(base_filter.exclude_podcast_ids or [])
+        groups: dict[int, list[EpisodeWithScore]] = {}
+        full: list[int] = []
+        fetch = min(query.top_k * group_size, GROUPED_SEARCH_MAX_FETCH)
+        for _ in range(GROUPED_SEARCH_ROUNDS):
+            round_filter = base_filter.copy(
+                update={"exclude_podcast_ids": excluded + full or None}
+            )
+            round_query = query.copy(update={"filter": round_filter, "top_k": fetch})
+            hits = (await self._query([round_query], embedding[None, :]))[0].results
+            # groups that are not full come back with the same hits, and more
+            groups = {podcast_id: groups[podcast_id] for podcast_id in full}
+            for hit in hits:
+                members = groups.setdefault(hit.metadata.podcast_id, [])
+                if len(members) < group_size:
+                    members.append(hit)
+            full += [
+                podcast_id
+                for podcast_id, members in groups.items()
+                if len(members) == group_size and podcast_id not in full
+            ]
+            best = sorted(groups, key=lambda podcast_id: groups[podcast_id][0].score)
+            best = best[: query.top_k]
+            # fewer hits than asked for: every match of the filter was seen
+            exhausted = self.exhaustive_search and len(hits) < fetch
+            if exhausted or len(best) == query.top_k:
+                break
+            fetch = min(2 * fetch, GROUPED_SEARCH_MAX_FETCH)
+
+        partial = [podcast_id for podcast_id in best if podcast_id not in full]
+        if partial and not exhausted:
+            fill_queries = [
+                query.copy(
+                    update={
+                        "filter": base_filter.copy(update={"podcast_id": podcast_id}),
+                        "top_k": group_size,
+                    }
+                )
+                for podcast_id in partial
+            ]
+            filled = await self._query(
+                fill_queries, np.repeat(embedding[None, :], len(partial), axis=0)
+            )
+            for podcast_id, result in zip(partial, filled):
+                groups[podcast_id] = result.results
+
+        return GroupedQueryResult(
+            query=query.query,
+            groups=[
+                EpisodeGroup(podcast_id=podcast_id, results=groups[podcast_id])
+                for podcast_id in best
+            ],
+        )
+
     @abstractmethod
     async def delete(
         self,
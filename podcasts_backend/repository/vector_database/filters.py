@@ -0,0 +1,183 @@
+import json
+import operator
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy.sql.elements import ColumnElement
+
+from ...schemas.schemas import EpisodeMetadataFilter, NumericRange
+
+# metadata fields stored next to the vectors, with the type of their values
+FILTER_FIELDS: dict[str, type] = {
+    "podcast_id": int,
+    "category": str,
+    "language": str,
+    "datePublished": int,
+    "duration": int,
+}
+
+
+@dataclass(frozen=True)
+class Eq:
+    field: str
+    value: Any
+
+
+@dataclass(frozen=True)
+class In:
+    field: str
+    values: tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class NotIn:
+    field: str
+    values: tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class Range:
+    field: str
+    gte: int | None = None
+    gt: int | None = None
+    lte: int | None = None
+    lt: int | None = None
+
+
+Condition = Eq | In | NotIn | Range
+
+
+def conditions(filter: EpisodeMetadataFilter) -> list[Condition]:
+    """turn a filter into a conjunction of typed conditions
+
+    Args:
+        filter (EpisodeMetadataFilter): filter of a query
+
+    Returns:
+        list[Condition]: conditions that must all hold
+    """
+    result: list[Condition] = []
+    for field, values in (
+        ("podcast_id", filter.podcast_ids),
+        ("category", filter.categories),
+        ("language", filter.languages),
+    ):
+        value = getattr(filter, field)
+        if value is not None:
+            result.append(Eq(field, value))
+        if values is not None:
+            result.append(In(field, tuple(dict.fromkeys(values))))
+    if filter.exclude_podcast_ids is not None:
+        excluded = tuple(dict.fromkeys(filter.exclude_podcast_ids))
+        result.append(NotIn("podcast_id", excluded))
+    for field in ("datePublished", "duration"):
+        bounds: NumericRange | None = getattr(filter, field)
+        if bounds is not None:
+            result.append(Range(field, bounds.gte, bounds.gt, bounds.lte, bounds.lt))
+    return result
+
+
+def allowed_values(conditions: list[Condition], field: str) -> set[Any] | None:
+    """values a field can take under the conditions, None if unrestricted"""
+    allowed: set[Any] | None = None
+    for condition in conditions:
+        if condition.field != field or not isinstance(condition, Eq | In):
+            continue
+        values = (
+            {condition.value} if isinstance(condition, Eq) else set(condition.values)
+        )
+        allowed = values if allowed is None else allowed & values
+    return allowed
+
+
+def literal(field: str, value: Any) -> str:
+    """typed literal of a value, strings quoted and escaped
+
+    Raises:
+        ValueError: value does not fit the type of the field
+    """
+    if FILTER_FIELDS[field] is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{field} takes integers, got {value!r}")
+        return str(value)
+    if not isinstance(value, str):
+        raise ValueError(f"{field} takes strings, got {value!r}")
+    # a JSON string literal is a valid Milvus one: quotes and backslashes escaped
+    return json.dumps(value, ensure_ascii=False)
+
+
+def to_milvus_expression(
+    conditions: list[Condition], fields: set[str] | None = None
+) -> str | None:
+    """compile conditions to a Milvus boolean expression
+
+    Args:
+        conditions (list[Condition]): conditions that must all hold
+        fields (set[str] | None, optional): fields of the collection, to reject
+            filters on fields an older collection does not have.
+
+    Raises:
+        ValueError: a condition uses a field the collection does not have
+
+    Returns:
+        str | None: the expression, None without conditions
+    """
+    parts = []
+    for condition in conditions:
+        field = condition.field
+        if fields is not None and field not in fields:
+            raise ValueError(f"The vector collection has no {field} field to filter")
+        if isinstance(condition, Eq):
+            parts.append(f"({field} == {literal(field, condition.value)})")
+        elif isinstance(condition, In):
+            values = ", ".join(literal(field, value) for value in condition.values)
+            parts.append(f"({field} in [{values}])")
+        elif isinstance(condition, NotIn):
+            values = ", ".join(literal(field, value) for value in condition.values)
+            parts.append(f"({field} not in [{values}])")
+        else:
+            # Milvus stores unknown values as 0, which must not match a range
+            parts.append(f"({field} > 0)")
+            for op, bound in (
+                (">=", condition.gte),
+                (">", condition.gt),
+                ("<=", condition.lte),
+                ("<", condition.lt),
+            ):
+                if bound is not None:
+                    parts.append(f"({field} {op} {literal(field, bound)})")
+    return " and ".join(parts) or None
+
+
+def to_sql_clauses(
+    conditions: list[Condition], columns: Mapping[str, ColumnElement]
+) -> list[ColumnElement]:
+    """compile conditions to SQLAlchemy clauses, values are bound parameters
+
+    Args:
+        conditions (list[Condition]): conditions that must all hold
+        columns (Mapping[str, ColumnElement]): column of every filter field
+
+    Returns:
+        list[ColumnElement]: clauses to pass to `where`
+    """
+    clauses = []
+    for condition in conditions:
+        column = columns[condition.field]
+        if isinstance(condition, Eq):
+            clauses.append(column == condition.value)
+        elif isinstance(condition, In):
+            clauses.append(column.in_(condition.values))
+        elif isinstance(condition, NotIn):
+            clauses.append(column.notin_(condition.values))
+        else:
+            for compare, bound in (
+                (operator.ge, condition.gte),
+                (operator.gt, condition.gt),
+                (operator.le, condition.lte),
+                (operator.lt, condition.lt),
+            ):
+                if bound is not None:
+                    clauses.append(compare(column, bound))
+    return clauses
@@ -0,0 +1,683 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from podcasts_backend.schemas.schemas import (
+    Episode,
+    EpisodeMetadata,
+    EpisodeMetadataFilter,
+    EpisodeVectorWithScore,
+    EpisodeWithScore,
+    Query,
+    QueryResult,
+)
+from podcasts_backend.services.embeddings import EMBEDDING_DIM
+from podcasts_backend.services.executors import run_blocking
+
+from ..datastore import DataStore
+from ..filters import FILTER_FIELDS, Eq, NotIn, Range, conditions
+
+try:
+    import hnswlib
+except ImportError:  # optional, only needed for LOCAL_VECTOR_INDEX=hnsw
+    hnswlib = None
+
+LOCAL_VECTOR_DIR = os.environ.get("LOCAL_VECTOR_DIR") or "vector_data"
+# "flat" for exact search only, "hnsw" to add a graph index (needs hnswlib)
+LOCAL_VECTOR_INDEX = os.environ.get("LOCAL_VECTOR_INDEX") or "flat"
+# vectors searched over: "float32", "float16" (half the memory) or "sq8" (8 bit
+# codes, a quarter of the memory, float32 vectors stay on disk for reranking)
+LOCAL_VECTOR_STORAGE = os.environ.get("LOCAL_VECTOR_STORAGE") or "float32"
+# sq8 candidates per requested hit re-scored on the float32 vectors, 1 for none
+LOCAL_RERANK_FACTOR = int(os.environ.get("LOCAL_RERANK_FACTOR") or 4)
+HNSW_M = int(os.environ.get("LOCAL_HNSW_M") or 16)
+HNSW_EF_CONSTRUCTION = int(os.environ.get("LOCAL_HNSW_EF_CONSTRUCTION") or 200)
+HNSW_EF = int(os.environ.get("LOCAL_HNSW_EF") or 64)
+# filters matching fewer rows than this are searched exactly, not on the graph
+EXACT_SEARCH_THRESHOLD = int(os.environ.get("LOCAL_EXACT_SEARCH_THRESHOLD") or 20000)
+# graph hits fetched per requested hit, to survive post-filtering
+HNSW_OVERFETCH = 4
+
+TOP_K = 20
+INITIAL_CAPACITY = 1024
+# rows converted to float32 at once by an exact search over compressed vectors,
+# small enough to stay in cache
+SCAN_CHUNK_ROWS = 2048
+VECTOR_DTYPES = {"float32": np.float32, "float16": np.float16, "sq8": np.uint8}
+NO_VALUE = -1
+# append-only log of (row, text), replayed in order on open
+TEXTS_FILE = "texts.jsonl"
+# metadata column of every filter field; strings are stored as vocabulary codes
+COLUMN_TYPES = {
+    "podcast_id": np.int64,
+    "category": np.int32,
+    "language": np.int32,
+    "datePublished": np.int64,
+    "duration": np.int64,
+}
+STRING_FIELDS = {field for field, kind in FILTER_FIELDS.items() if kind is str}
+
+
+class LocalDataStore(DataStore):
+    """In-process vector store, for development, CI and small deployments.
+
+    Vectors live in a memory-mapped float32 matrix with an id -> row index and
+    metadata kept as numpy columns, so filters are vectorized masks. Search is
+    exact L2 (the same squared distance Milvus reports) using one matrix product
+    per group of queries and `argpartition`. With `index="hnsw"` an hnswlib graph
+    is kept next to the matrix for large collections; selective filters still
+    use exact search. Deleted rows are tombstoned and compacted once they make up
+    half of the matrix. Everything is persisted to `path`: vectors and metadata
+    columns are memory-mapped files written in place and texts go to an
+    append-only log, so a write costs the size of the batch, not of the store.
+    The graph is saved on `close()` and rebuilt on open if that didn't happen.
+
+    With `storage="float16"` the matrix holds half precision vectors. With
+    `storage="sq8"` searches scan 8 bit codes (per dimension range, widened as
+    vectors arrive) and re-score the best `rerank_factor * top_k` candidates on
+    the float32 vectors, which stay on disk and are only paged in for those.
+    """
+
+    # graph searches short of hits through a filter are redone exactly
+    exhaustive_search = True
+
+    def __init__(
+        self,
+        path: str | Path = LOCAL_VECTOR_DIR,
+        dim: int = EMBEDDING_DIM,
+        index: str = LOCAL_VECTOR_INDEX,
+        storage: str = LOCAL_VECTOR_STORAGE,
+        rerank_factor: int = LOCAL_RERANK_FACTOR,
+    ) -> None:
+        if index not in ("flat", "hnsw"):
+            raise ValueError(f"Unknown local vector index {index}")
+        if index == "hnsw" and hnswlib is None:
+            raise ValueError("LOCAL_VECTOR_INDEX=hnsw requires hnswlib")
+        if storage not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown local vector storage {storage}")
+        if index == "hnsw" and storage != "float32":
+            # hnswlib keeps a float32 copy of every vector in the graph
+            raise ValueError("LOCAL_VECTOR_INDEX=hnsw needs float32 storage")
+        self.path = Path(path)
+        self.dim = dim
+        self.index = index
+        self.storage = storage
+        self.rerank_factor = rerank_factor
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._open()
+
+    # ------------------------------------------------------------------ storage
+
+    def _open(self) -> None:
+        payload_path = self.path / "payload.json"
+        if payload_path.exists():
+            payload = json.loads(payload_path.read_text())
+            if payload["dim"] != self.dim:
+                raise ValueError(
+                    f"{self.path} holds {payload['dim']} dimensional vectors, "
+                    f"expected {self.dim}"
+                )
+            if payload.get("storage", "float32") != self.storage:
+                raise ValueError(
+                    f"{self.path} holds {payload.get('storage', 'float32')} "
+                    f"vectors, expected {self.storage}"
+                )
+            self.rows: int = payload["rows"]
+            self._vocab: list[str] = payload["vocab"]
+            self._set_range(payload.get("low"), payload.get("high"))
+            self._graph_saved: bool = payload.get("graph_saved", True)
+            self._allocate(max(INITIAL_CAPACITY, self.rows))
+            if "texts" in payload:
+                self._upgrade(payload["texts"])
+            self._texts = self._read_texts()
+        else:
+            self.rows = 0
+            self._texts = []
+            self._vocab = []
+            self._set_range(None, None)
+            self._graph_saved = True
+            self._allocate(INITIAL_CAPACITY)
+
+        self._codes = {value: code for code, value in enumerate(self._vocab)}
+        self._row_by_id = {
+            int(self._ids[row]): row for row in np.flatnonzero(self._alive[: self.rows])
+        }
+        self._update_norms(0, self.rows)
+        if self.index == "hnsw" and not self._graph_saved:
+            # the graph on disk misses the writes since it was last saved
+            (self.path / "hnsw.bin").unlink(missing_ok=True)
+        self._graph = self._load_graph() if self.index == "hnsw" else None
+
+    def _upgrade(self, texts: list[str | None]) -> None:
+        """move a store written with columns.npz and the texts in payload.json to
+        the memory-mapped columns and the text log"""
+        stored = np.load(self.path / "columns.npz")
+        self._ids[: self.rows] = stored["ids"]
+        self._alive[: self.rows] = stored["alive"]
+        for field, column in self._columns.items():
+            # fields added after the store was written stay unknown
+            if field in stored:
+                column[: self.rows] = stored[field]
+        self._rewrite_texts(texts)
+        self._persist()
+        (self.path / "columns.npz").unlink()
+
+    def _read_texts(self) -> list[str | None]:
+        texts: list[str | None] = [None] * self.rows
+        texts_path = self.path / TEXTS_FILE
+        if not texts_path.exists():
+            return texts
+        data = texts_path.read_bytes()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # an append cut short, later ones have to start on a new line
+            with open(texts_path, "r+b") as f:
+                f.truncate(complete)
+        for line in data[:complete].splitlines():
+            row, text = json.loads(line)
+            # rows past self.rows were appended by a write that didn't complete
+            if row < self.rows:
+                texts[row] = text
+        return texts
+
+    def _append_texts(self, rows: Any) -> None:
+        lines = [json.dumps([int(row), self._texts[row]]) + "\n" for row in rows]
+        with open(self.path / TEXTS_FILE, "a") as f:
+            f.writelines(lines)
+
+    def _rewrite_texts(self, texts: list[str | None]) -> None:
+        self._texts = texts
+        with open(self.path / "texts.tmp.jsonl", "w") as f:
+            f.writelines(
+                json.dumps([row, text]) + "\n"
+                for row, text in enumerate(texts)
+                if text is not None
+            )
+        os.replace(self.path / "texts.tmp.jsonl", self.path / TEXTS_FILE)
+
+    def _files(self) -> dict[str, type]:
+        """vector files of the storage mode, with their dtype"""
+        if self.storage == "float16":
+            return {"vectors.f16": np.float16}
+        if self.storage == "sq8":
+            return {"vectors.f32": np.float32, "codes.u8": np.uint8}
+        return {"vectors.f32": np.float32}
+
+    def _column_files(self) -> list[str]:
+        """memory-mapped metadata files: ids, tombstones and one per column"""
+        return ["ids.col", "alive.col", *(f"{field}.col" for field in COLUMN_TYPES)]
+
+    def _map(self, name: str, dtype: type, shape: tuple[int, ...], fill: Any) -> Any:
+        """memory-map a file, growing it to shape with rows set to fill"""
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(self.path / name, "ab") as f:
+            old_size = f.tell()
+            if old_size < size:
+                f.truncate(size)
+        mapped = np.memmap(self.path / name, dtype=dtype, mode="r+", shape=shape)
+        if fill and old_size < size:
+            mapped.reshape(-1)[old_size // np.dtype(dtype).itemsize :] = fill
+        return mapped
+
+    def _allocate(self, capacity: int) -> None:
+        """(re)map the vector and metadata files and grow the norms to capacity"""
+        matrices = [
+            self._map(name, dtype, (capacity, self.dim), 0)
+            for name, dtype in self._files().items()
+        ]
+        # _vectors always has the full precision (or float16) vectors, _codes the
+        # 8 bit codes searched over in sq8 mode
+        self._vectors = matrices[0]
+        self._codes_matrix = matrices[1] if self.storage == "sq8" else None
+
+        norms = np.zeros(capacity, dtype=np.float32)
+        if getattr(self, "_norms", None) is not None:
+            norms[: len(self._norms)] = self._norms[:capacity]
+        self._norms = norms
+        self._ids = self._map("ids.col", np.int64, (capacity,), NO_VALUE)
+        self._alive = self._map("alive.col", np.bool_, (capacity,), False)
+        # a column added after the store was written starts out unknown
+        self._columns: dict[str, np.ndarray] = {
+            field: self._map(f"{field}.col", dtype, (capacity,), NO_VALUE)
+            for field, dtype in COLUMN_TYPES.items()
+        }
+        self.capacity = capacity
+
+    def _set_range(self, low: list[float] | None, high: list[float] | None) -> None:
+        """per dimension range of the sq8 codes, None until vectors are stored"""
+        if low is None or high is None:
+            self._low = self._high = self._scale = None
+            return
+        self._low = np.asarray(low, dtype=np.float32)
+        self._high = np.asarray(high, dtype=np.float32)
+        self._scale = (self._high - self._low) / 255
+
+    def _widen_range(self, embeddings: np.ndarray) -> bool:
+        """widen the sq8 range to cover embeddings, with headroom so later inserts
+        rarely widen it again. Returns whether it changed."""
+        low, high = embeddings.min(axis=0), embeddings.max(axis=0)
+        if self._low is not None and self._high is not None:
+            if (low >= self._low).all() and (high <= self._high).all():
+                return False
+            low, high = np.minimum(low, self._low), np.maximum(high, self._high)
+        headroom = 0.1 * (high - low) + 1e-6
+        self._set_range((low - headroom).tolist(), (high + headroom).tolist())
+        return True
+
+    def _encode(self, start: int, end: int) -> None:
+        """write the sq8 codes of rows start:end from their float32 vectors"""
+        for chunk in range(start, end, SCAN_CHUNK_ROWS):
+            rows = slice(chunk, min(chunk + SCAN_CHUNK_ROWS, end))
+            codes = np.rint((self._vectors[rows] - self._low) / self._scale)
+            self._codes_matrix[rows] = codes.clip(0, 255)  # type: ignore
+
+    def _decode(self, rows: slice | np.ndarray) -> np.ndarray:
+        """float32 copy of the vectors searches scan (decoded codes in sq8 mode);
+        a view for float32 storage and a slice"""
+        if self._codes_matrix is not None:
+            return self._codes_matrix[rows] * self._scale + self._low
+        return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    def _update_norms(self, start: int, end: int) -> None:
+        for chunk in range(start, end, SCAN_CHUNK_ROWS):
+            rows = slice(chunk, min(chunk + SCAN_CHUNK_ROWS, end))
+            vectors = self._decode(rows)
+            self._norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+
+    def _reset_columns(self) -> None:
+        """unmap the columns, so their files can be removed"""
+        self._ids = self._alive = self._norms = None  # type: ignore
+        self._columns = {}
+
+    def _load_graph(self) -> Any:
+        graph = hnswlib.Index(space="l2", dim=self.dim)
+        graph_path = self.path / "hnsw.bin"
+        if graph_path.exists():
+            graph.load_index(str(graph_path), max_elements=self.capacity)
+        else:
+            graph.init_index(
+                max_elements=self.capacity,
+                ef_construction=HNSW_EF_CONSTRUCTION,
+                M=HNSW_M,
+            )
+            alive = np.flatnonzero(self._alive[: self.rows])
+            if alive.size:
+                graph.add_items(self._vectors[alive], alive)
+        graph.set_ef(HNSW_EF)
+        return graph
+
+    def _persist(self) -> None:
+        """flush the mapped files, then commit the row count with the payload;
+        rows written past it by an interrupted write are ignored on open"""
+        for mapped in (
+            self._vectors,
+            self._codes_matrix,
+            self._ids,
+            self._alive,
+            *self._columns.values(),
+        ):
+            if mapped is not None:
+                mapped.flush()
+        (self.path / "payload.tmp.json").write_text(
+            json.dumps(
+                {
+                    "dim": self.dim,
+                    "storage": self.storage,
+                    "rows": self.rows,
+                    "vocab": self._vocab,
+                    "low": None if self._low is None else self._low.tolist(),
+                    "high": None if self._high is None else self._high.tolist(),
+                    "graph_saved": self._graph_saved,
+                }
+            )
+        )
+        os.replace(self.path / "payload.tmp.json", self.path / "payload.json")
+
+    def close(self) -> None:
+        """saves the graph, which writes don't (it is rewritten whole)"""
+        with self._lock:
+            if self._graph is not None and not self._graph_saved:
+                self._graph.save_index(str(self.path / "hnsw.bin"))
+                self._graph_saved = True
+                self._persist()
+
+    def _code(self, value: str | None, create: bool = False) -> int | None:
+        """integer code of a category/language, None if never stored"""
+        if value is None:
+            return NO_VALUE
+        code = self._codes.get(value)
+        if code is None and create:
+            code = len(self._vocab)
+            self._vocab.append(value)
+            self._codes[value] = code
+        return code
+
+    # ------------------------------------------------------------------- writes
+
+    async def _delete_existing(self, ids: list[int]) -> None:
+        # _insert replaces stored ids itself, under the same lock
+        pass
+
+    async def _upsert(
+        self, episodes: list[Episode], embeddings: np.ndarray
+    ) -> list[int]:
+        await run_blocking(self._insert, episodes, embeddings)
+        return [episode.id for episode in episodes]
+
+    def _insert(self, episodes: list[Episode], embeddings: np.ndarray) -> None:
+        with self._lock:
+            # ids already present (upsert without a prior delete) are replaced
+            self._delete_ids([episode.id for episode in episodes])
+            start, end = self.rows, self.rows + len(episodes)
+            if end > self.capacity:
+                self._allocate(max(self.capacity * 2, end))
+                if self._graph is not None:
+                    self._graph.resize_index(self.capacity)
+
+            self._vectors[start:end] = embeddings
+            if self._codes_matrix is not None and end > start:
+                if self._widen_range(embeddings):
+                    # codes of the stored vectors are relative to the old range
+                    self._encode(0, start)
+                    self._update_norms(0, start)
+                self._encode(start, end)
+            # norms of what searches scan, e.g. the float16 rounded vectors
+            self._update_norms(start, end)
+            self._ids[start:end] = [episode.id for episode in episodes]
+            for field, column in self._columns.items():
+                values = [getattr(episode.metadata, field) for episode in episodes]
+                if field in STRING_FIELDS:
+                    column[start:end] = [self._code(v, create=True) for v in values]
+                else:
+                    column[start:end] = [NO_VALUE if v is None else v for v in values]
+            self._alive[start:end] = True
+            self._texts.extend(episode.text for episode in episodes)
+            self._append_texts(range(start, end))
+            for row, episode in enumerate(episodes, start):
+                self._row_by_id[episode.id] = row
+            if self._graph is not None:
+                self._graph.add_items(embeddings, np.arange(start, end))
+                self._graph_saved = False
+            self.rows = end
+            self._persist()
+
+    async def delete(
+        self,
+        ids: list[str] | None = None,
+        delete_all: bool | None = None,
+    ) -> bool:
+        """
+        Removes vectors by ids, or everything in the datastore.
+        Returns whether the operation was successful.
+        """
+        await run_blocking(self._delete, ids, delete_all)
+        return True
+
+    def _delete(self, ids: list[str] | None, delete_all: bool | None) -> None:
+        with self._lock:
+            if delete_all:
+                self._vectors = self._codes_matrix = None  # type: ignore
+                self._reset_columns()
+                for name in (
+                    *self._files(),
+                    *self._column_files(),
+                    TEXTS_FILE,
+                    "columns.npz",
+                    "payload.json",
+                    "hnsw.bin",
+                ):
+                    (self.path / name).unlink(missing_ok=True)
+                self._open()
+                return
+            if ids and self._delete_ids([int(id) for id in ids]):
+                self._persist()
+
+    def _delete_ids(self, ids: list[int]) -> bool:
+        rows = [row for id in ids if (row := self._row_by_id.pop(id, None)) is not None]
+        if not rows:
+            return False
+        self._alive[rows] = False
+        for row in rows:
+            self._texts[row] = None
+            if self._graph is not None:
+                self._graph.mark_deleted(row)
+                self._graph_saved = False
+        if self.rows - len(self._row_by_id) > max(INITIAL_CAPACITY, self.rows // 2):
+            self._compact()
+        else:
+            self._append_texts(rows)
+        return True
+
+    def _compact(self) -> None:
+        """drop tombstoned rows, rewriting the matrix and rebuilding the graph"""
+        keep = np.flatnonzero(self._alive[: self.rows])
+        vectors = np.array(self._vectors[keep])
+        codes = None
+        if self._codes_matrix is not None:
+            codes = np.array(self._codes_matrix[keep])
+        ids = self._ids[keep]
+        columns = {field: column[keep] for field, column in self._columns.items()}
+        texts = [self._texts[row] for row in keep]
+
+        self._vectors = self._codes_matrix = None  # type: ignore
+        self._reset_columns()
+        for name in (*self._files(), *self._column_files()):
+            (self.path / name).unlink()
+        (self.path / "hnsw.bin").unlink(missing_ok=True)
+        self._allocate(max(INITIAL_CAPACITY, len(keep) * 2))
+
+        self.rows = len(keep)
+        self._vectors[: self.rows] = vectors
+        if codes is not None:
+            self._codes_matrix[: self.rows] = codes  # type: ignore
+        self._update_norms(0, self.rows)
+        self._ids[: self.rows] = ids
+        for field, column in columns.items():
+            self._columns[field][: self.rows] = column
+        self._alive[: self.rows] = True
+        self._rewrite_texts(texts)
+        self._row_by_id = {int(id): row for row, id in enumerate(ids)}
+        if self.index == "hnsw":
+            self._graph = self._load_graph()
+            self._graph_saved = False
+
+    # -------------------------------------------------------------------- reads
+
+    async def _query(
+        self,
+        queries: list[Query],
+        embeddings: np.ndarray,
+        include_vectors: bool = False,
+    ) -> list[QueryResult]:
+        return await run_blocking(self._search, queries, embeddings, include_vectors)
+
+    def _search(
+        self, queries: list[Query], embeddings: np.ndarray, include_vectors: bool
+    ) -> list[QueryResult]:
+        with self._lock:
+            # queries with the same filter share one mask and one matrix product
+            groups: dict[str | None, list[int]] = defaultdict(list)
+            for i, query in enumerate(queries):
+                groups[query.filter.json() if query.filter else None].append(i)
+
+            hits: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+            for members in groups.values():
+                query_filter = queries[members[0]].filter
+                mask = self._mask(query_filter)
+                matches = int(mask.sum())
+                top_k = [
+                    TOP_K if queries[i].top_k is None else queries[i].top_k
+                    for i in members
+                ]
+                use_graph = self._graph is not None and (
+                    query_filter is None or matches > EXACT_SEARCH_THRESHOLD
+                )
+                if use_graph:
+                    results = self._graph_search(
+                        embeddings[members], mask, matches, top_k
+                    )
+                else:
+                    results = self._exact_search(embeddings[members], mask, top_k)
+                for i, result in zip(members, results):
+                    hits[i] = result
+
+            return [
+                QueryResult(
+                    query=query.query,
+                    results=[
+                        self._result(row, score, include_vectors)
+                        for row, score in zip(*hits[i])
+                    ],
+                )
+                for i, query in enumerate(queries)
+            ]
+
+    def _mask(self, query_filter: EpisodeMetadataFilter | None) -> np.ndarray:
+        mask = self._alive[: self.rows].copy()
+        if query_filter is None:
+            return mask
+        for condition in conditions(query_filter):
+            column = self._columns[condition.field][: self.rows]
+            if isinstance(condition, Range):
+                # unknown values match no range, like NULL in SQL and 0 in Milvus
+                mask &= column != NO_VALUE
+                if condition.gte is not None:
+                    mask &= column >= condition.gte
+                if condition.gt is not None:
+                    mask &= column > condition.gt
+                if condition.lte is not None:
+                    mask &= column <= condition.lte
+                if condition.lt is not None:
+                    mask &= column < condition.lt
+                continue
+            values = (
+                [condition.value] if isinstance(condition, Eq) else condition.values
+            )
+            if condition.field in STRING_FIELDS:
+                # values never stored have no code and match nothing
+                values = [code for v in values if (code := self._code(v)) is not None]
+            if isinstance(condition, NotIn):
+                mask &= ~np.isin(column, values)
+            else:
+                mask &= np.isin(column, values)
+        return mask
+
+    def _exact_search(
+        self, embeddings: np.ndarray, mask: np.ndarray, top_k: list[int]
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """exact squared L2 top-k over the rows selected by mask; over the sq8
+        codes, the best candidates are re-scored on the float32 vectors"""
+        all_rows = mask.all()
+        rows = np.arange(self.rows) if all_rows else np.flatnonzero(mask)
+        if rows.size == 0:
+            return [(rows, np.empty(0, np.float32)) for _ in top_k]
+
+        # compressed vectors are decoded a chunk at a time, float32 ones are not
+        chunk_rows = rows.size if self.storage == "float32" else SCAN_CHUNK_ROWS
+        distances = np.empty((len(embeddings), rows.size), dtype=np.float32)
+        if self._codes_matrix is not None:
+            # q.x = (q * scale).codes + q.low, the codes need no decoding
+            weights, offsets = embeddings * self._scale, embeddings @ self._low
+        for start in range(0, rows.size, chunk_rows):
+            end = min(start + chunk_rows, rows.size)
+            chunk = slice(start, end) if all_rows else rows[start:end]
+            if self._codes_matrix is not None:
+                codes = self._codes_matrix[chunk].astype(np.float32)
+                products = weights @ codes.T + offsets[:, None]
+            else:
+                products = embeddings @ self._decode(chunk).T
+            distances[:, start:end] = self._norms[chunk][None, :] - 2 * products
+        distances += np.einsum("ij,ij->i", embeddings, embeddings)[:, None]
+
+        rerank = self._codes_matrix is not None and self.rerank_factor > 1
+        results = []
+        for embedding, row_distances, k in zip(embeddings, distances, top_k):
+            fetch = min(k * self.rerank_factor if rerank else k, rows.size)
+            top = np.argpartition(row_distances, fetch - 1)[:fetch]
+            top_rows, top_distances = rows[top], row_distances[top]
+            if rerank:
+                # sorted rows read the float32 file in order
+                order = np.argsort(top_rows)
+                top_rows = top_rows[order]
+                exact = self._vectors[top_rows] - embedding
+                top_distances = np.einsum("ij,ij->i", exact, exact)
+            order = np.argsort(top_distances)[: min(k, rows.size)]
+            results.append((top_rows[order], top_distances[order]))
+        return results
+
+    def _graph_search(
+        self,
+        embeddings: np.ndarray,
+        mask: np.ndarray,
+        matches: int,
+        top_k: list[int],
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """approximate search on the graph, post-filtered by mask (matches is its
+        number of rows set); falls back to exact search for queries that don't
+        get enough hits through the filter"""
+        alive = len(self._row_by_id)
+        filtered = matches < mask.size
+        fetch = min(alive, max(top_k) * (HNSW_OVERFETCH if filtered else 1))
+        if fetch == 0:
+            return [(np.empty(0, np.int64), np.empty(0, np.float32)) for _ in top_k]
+        self._graph.set_ef(max(HNSW_EF, fetch))
+        labels, distances = self._graph.knn_query(embeddings, k=fetch)
+
+        results = []
+        for i, k in enumerate(top_k):
+            keep = mask[labels[i]]
+            rows, row_distances = labels[i][keep][:k], distances[i][keep][:k]
+            if len(rows) < min(k, matches):
+                rows, row_distances = self._exact_search(
+                    embeddings[i : i + 1], mask, [k]
+                )[0]
+            results.append((rows.astype(np.int64), row_distances))
+        return results
+
+    def stats(self) -> dict[str, Any]:
+        """size of what searches keep in memory: the scanned vectors, their norms,
+        ids and metadata columns (sq8 float32 vectors are only read to rerank)"""
+        bytes_per_vector = (
+            self.dim * np.dtype(VECTOR_DTYPES[self.storage]).itemsize
+            + self._norms.itemsize
+            + self._ids.itemsize
+            + self._alive.itemsize
+            + sum(column.itemsize for column in self._columns.values())
+        )
+        return {
+            "storage": self.storage,
+            "vectors": len(self._row_by_id),
+            "rows": self.rows,
+            "bytes_per_vector": bytes_per_vector,
+            "memory_bytes": bytes_per_vector * self.rows,
+        }
+
+    def _result(
+        self, row: int, score: float, include_vectors: bool
+    ) -> EpisodeWithScore:
+        metadata: dict[str, Any] = {}
+        for field, column in self._columns.items():
+            value = int(column[row])
+            if value == NO_VALUE:
+                metadata[field] = None
+            else:
+                metadata[field] = (
+                    self._vocab[value] if field in STRING_FIELDS else value
+                )
+        fields = {
+            "id": int(self._ids[row]),
+            "score": float(score),
+            "metadata": EpisodeMetadata(**metadata),
+            "text": self._texts[row],
+        }
+        if include_vectors:
+            return EpisodeVectorWithScore(
+                **fields, embedding=self._vectors[row].tolist()
+            )
+        return EpisodeWithScore(**fields)
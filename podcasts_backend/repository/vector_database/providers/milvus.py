@@ -1,6 +1,14 @@
+import asyncio
+import json
 import os
+import re
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from typing import Any
 from uuid import uuid4
 
+import numpy as np
 from pymilvus import (
     Collection,
     CollectionSchema,
@@ -12,46 +20,247 @@ from pymilvus import (
 )
 
 from podcasts_backend.schemas.schemas import (
+    Episode,
     EpisodeMetadata,
-    EpisodeMetadataFilter,
-    EpisodeVector,
     EpisodeVectorWithScore,
+    EpisodeWithScore,
+    Query,
     QueryResult,
-    QueryWithEmbedding,
 )
+from podcasts_backend.services.executors import run_blocking
 
 from ..datastore import DataStore
-
-MILVUS_COLLECTION = os.environ.get("MILVUS_COLLECTION") or "c" + uuid4().hex
+from ..filters import FILTER_FIELDS, allowed_values, conditions, to_milvus_expression
+from .milvus_pool import MILVUS_SEARCH_TIMEOUT, MILVUS_WRITE_TIMEOUT, MilvusPool
+
+# the collection the service searches, or an alias of it
+MILVUS_COLLECTION = os.environ.get("MILVUS_COLLECTION") or "episodes"
+# alias tools.backfill points at the collections it rebuilds; an alias can't be
+# named like a collection, so it differs from the default MILVUS_COLLECTION
+MILVUS_ALIAS = os.environ.get("MILVUS_ALIAS") or "episodes_live"
 MILVUS_HOST = os.environ.get("MILVUS_HOST") or "localhost"
 MILVUS_PORT = os.environ.get("MILVUS_PORT") or 19530
 MILVUS_USER = os.environ.get("MILVUS_USER")
 MILVUS_PASSWORD = os.environ.get("MILVUS_PASSWORD")
 MILVUS_USE_SECURITY = False if MILVUS_PASSWORD is None else True
-
-UPSERT_BATCH_SIZE = 100
+# keep the episode text in new collections; searches never return it, the
+# service reads episodes from Postgres
+MILVUS_STORE_TEXT = os.environ.get("MILVUS_STORE_TEXT") == "1"
+# one partition per episode language, so language filters only search their own
+MILVUS_PARTITION_BY_LANGUAGE = os.environ.get("MILVUS_PARTITION_BY_LANGUAGE") == "1"
+
+# rows and approximate payload bytes per insert call, Milvus rejects gRPC
+# messages above 64MiB by default
+UPSERT_BATCH_SIZE = int(os.environ.get("MILVUS_UPSERT_BATCH_SIZE") or 1000)
+UPSERT_BATCH_BYTES = int(os.environ.get("MILVUS_UPSERT_BATCH_BYTES") or 16 * 2**20)
+# insert calls in flight at once during an upsert
+UPSERT_CONCURRENCY = int(os.environ.get("MILVUS_UPSERT_CONCURRENCY") or 4)
+UPSERT_RETRIES = int(os.environ.get("MILVUS_UPSERT_RETRIES") or 3)
+UPSERT_BACKOFF_SECONDS = 0.5
+# "1" or "0" to force or disable native upserts, otherwise they are used when
+# both pymilvus and the server are 2.3 or newer
+MILVUS_NATIVE_UPSERT = os.environ.get("MILVUS_NATIVE_UPSERT")
+# size of the id list in a single `pk in [...]` delete or query expression
+PK_EXPR_BYTES = int(os.environ.get("MILVUS_PK_EXPR_BYTES") or 64 * 2**10)
+# JSON profile written by podcasts_backend.tools.tune_index
+MILVUS_INDEX_PROFILE = os.environ.get("MILVUS_INDEX_PROFILE")
 OUTPUT_DIM = 768
+# index of new collections without index params or a profile: "HNSW", or
+# "IVF_SQ8" / "IVF_PQ" to keep only compressed vectors in memory
+MILVUS_INDEX_TYPE = os.environ.get("MILVUS_INDEX_TYPE") or "HNSW"
+DEFAULT_INDEX_PARAMS = {
+    "HNSW": {
+        "metric_type": "L2",
+        "index_type": "HNSW",
+        "params": {"M": 8, "efConstruction": 64},
+    },
+    # 1 byte per dimension
+    "IVF_SQ8": {
+        "metric_type": "L2",
+        "index_type": "IVF_SQ8",
+        "params": {"nlist": 1024},
+    },
+    # 1 byte per 16 dimensions
+    "IVF_PQ": {
+        "metric_type": "L2",
+        "index_type": "IVF_PQ",
+        "params": {"nlist": 1024, "m": OUTPUT_DIM // 16, "nbits": 8},
+    },
+}
+# search this many candidates per requested hit and re-score them on the full
+# precision vectors, for compressed indexes; 1 for no reranking
+MILVUS_RERANK_FACTOR = int(os.environ.get("MILVUS_RERANK_FACTOR") or 1)
+SCALAR_INDEX_FIELDS = ["podcast_id", "category", "language", "datePublished"]
 TOP_K = 20
+# query vectors per search call, well below the Milvus nq limit
+SEARCH_MAX_NQ = int(os.environ.get("MILVUS_SEARCH_MAX_NQ") or 256)
 
 SCHEMA = [
     FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True, max_length=1000),
+    # only with store_text
     FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=10000),
     FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=OUTPUT_DIM),
     FieldSchema(name="podcast_id", dtype=DataType.INT64),
     FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=100),
     FieldSchema(name="language", dtype=DataType.VARCHAR, max_length=100),
+    # 0 when unknown, Milvus 2.2 fields are not nullable
+    FieldSchema(name="datePublished", dtype=DataType.INT64),
+    FieldSchema(name="duration", dtype=DataType.INT64),
 ]
 
 
+def schema_fields(store_text: bool = MILVUS_STORE_TEXT) -> list[FieldSchema]:
+    """Get the fields of a new collection.
+    Args:
+        store_text (bool): Whether to keep the episode text next to the vector.
+    Returns:
+        list[FieldSchema]: The fields.
+    """
+    return [field for field in SCHEMA if store_text or field.name != "text"]
+
+
+# value of every scalar field of an episode, by field name
+COLUMN_VALUES: dict[str, Callable[[Episode], Any]] = {
+    "pk": lambda episode: episode.id,
+    "text": lambda episode: episode.text,
+    "podcast_id": lambda episode: episode.metadata.podcast_id,
+    "category": lambda episode: episode.metadata.category,
+    "language": lambda episode: episode.metadata.language,
+    "datePublished": lambda episode: episode.metadata.datePublished or 0,
+    "duration": lambda episode: episode.metadata.duration or 0,
+}
+
+
+def load_index_profile(path: str) -> dict[str, Any]:
+    """Read the index and search params chosen by the tuning tool.
+    Args:
+        path (str): Path of the profile JSON.
+    Returns:
+        dict: The profile, with "index_params" and "search_params".
+    """
+    with open(path) as f:
+        profile: dict[str, Any] = json.load(f)
+    print(
+        f"Loaded Milvus index profile {path}: {profile['index_params']} "
+        f"{profile['search_params']}"
+    )
+    return profile
+
+
+def search_params_for(search_params: dict[str, Any], top_k: int) -> dict[str, Any]:
+    """Adjust search params to the number of hits requested.
+    HNSW returns at most ef candidates, so ef is raised to at least top_k.
+    Args:
+        search_params (dict): Search params of the index.
+        top_k (int): Number of hits to return.
+    Returns:
+        dict: The search params to use.
+    """
+    params = search_params.get("params", {})
+    if "ef" in params and params["ef"] < top_k:
+        return {**search_params, "params": {**params, "ef": top_k}}
+    return search_params
+
+
+def supports_native_upsert(using: str) -> bool:
+    """Whether upserts can replace rows by pk, which needs Milvus >= 2.3 on the
+    server as well as in the client, unless MILVUS_NATIVE_UPSERT says otherwise.
+    Args:
+        using (str): Connection alias.
+    Returns:
+        bool: Whether to upsert instead of delete and insert.
+    """
+    if MILVUS_NATIVE_UPSERT is not None:
+        return MILVUS_NATIVE_UPSERT == "1"
+    if not hasattr(Collection, "upsert"):
+        return False
+    version = utility.get_server_version(using=using)
+    match = re.match(r"v?(\d+)\.(\d+)", version)
+    if match is None:
+        print(f"Unknown Milvus server version {version}, not using upserts")
+        return False
+    return (int(match[1]), int(match[2])) >= (2, 3)
+
+
+def aliased_collection(alias: str, using: str) -> str | None:
+    """Find the collection an alias points at.
+    Args:
+        alias (str): Alias name.
+        using (str): Connection alias.
+    Raises:
+        ValueError: alias is the name of a collection.
+    Returns:
+        str | None: The collection, None if there is no such alias.
+    """
+    collections = utility.list_collections(using=using)
+    if alias in collections:
+        raise ValueError(
+            f"{alias} is a collection, not an alias; pick another alias name "
+            "(MILVUS_ALIAS) and point MILVUS_COLLECTION at it once it exists"
+        )
+    for collection in collections:
+        if alias in utility.list_aliases(collection, using=using):
+            return collection
+    return None
+
+
+def swap_alias(alias: str, collection: str, using: str) -> None:
+    """Point an alias at a collection, creating the alias if needed.
+    Searches through the alias switch over at once, nothing is copied.
+    Args:
+        alias (str): Alias the service uses as MILVUS_COLLECTION.
+        collection (str): Collection to point it at.
+        using (str): Connection alias.
+    Raises:
+        ValueError: alias is the name of a collection.
+    """
+    if aliased_collection(alias, using) is None:
+        utility.create_alias(collection, alias, using=using)
+    else:
+        utility.alter_alias(collection, alias, using=using)
+
+
 class MilvusDataStore(DataStore):
     def __init__(
         self,
         override: bool = False,
         index_params: dict | None = None,  # type: ignore
         search_params: dict | None = None,  # type: ignore
+        load: bool = True,
+        collection: str = MILVUS_COLLECTION,
+        partition_by_language: bool = MILVUS_PARTITION_BY_LANGUAGE,
+        store_text: bool = MILVUS_STORE_TEXT,
+        rerank_factor: int = MILVUS_RERANK_FACTOR,
     ) -> None:
+        if MILVUS_INDEX_TYPE not in DEFAULT_INDEX_PARAMS:
+            raise ValueError(
+                f"Unknown MILVUS_INDEX_TYPE {MILVUS_INDEX_TYPE}, expected one of "
+                f"{', '.join(DEFAULT_INDEX_PARAMS)}"
+            )
+        self.collection_name = collection
+        self.rerank_factor = rerank_factor
+        # only applies to collections created by this store
+        self.store_text = store_text
+        self.partition_by_language = partition_by_language
+        self.partitions: set[str] = set()
+        # Params passed in win over a tuned profile, which wins over the defaults
+        profile = (
+            load_index_profile(MILVUS_INDEX_PROFILE) if MILVUS_INDEX_PROFILE else {}
+        )
         # Set the index_params to passed in or the default
-        self.index_params = index_params
+        self.index_params = index_params or profile.get("index_params")
+        # Whether to load the collection into memory right away, or leave it to
+        # load() (e.g. a background warm-up) or the first search
+        self.load_on_create = load
+        self.loaded = False
+        self._upsert_stats: dict[str, Any] = {
+            "batches": 0,
+            "rows": 0,
+            "retries": 0,
+            "failed_batches": 0,
+            "seconds": 0.0,
+            "max_batch_seconds": 0.0,
+        }
 
         # The default search params
         self.default_search_params = {
@@ -67,6 +276,13 @@ class MilvusDataStore(DataStore):
             "AUTOINDEX": {"metric_type": "L2", "params": {}},
         }
 
+        connect_kwargs = {
+            "user": MILVUS_USER,
+            "password": MILVUS_PASSWORD,
+            "host": MILVUS_HOST,
+            "port": MILVUS_PORT,
+            "secure": MILVUS_USE_SECURITY,
+        }
         try:
             i = [
                 connections.get_connection_addr(x[0])
@@ -75,18 +291,25 @@ class MilvusDataStore(DataStore):
             self.alias = connections.list_connections()[i][0]
         except ValueError:
             self.alias = uuid4().hex
-            connections.connect(
-                self.alias,
-                user=MILVUS_USER,
-                password=MILVUS_PASSWORD,
-                host=MILVUS_HOST,
-                port=MILVUS_PORT,
-                secure=MILVUS_USE_SECURITY,
-            )
+            connections.connect(self.alias, **connect_kwargs)
+
+        # Milvus >= 2.3 replaces rows by pk itself
+        self.native_upsert = supports_native_upsert(self.alias)
+
+        # searches, inserts, deletes and queries go through a pool of connections
+        self.pool = MilvusPool(self.collection_name, self.alias, connect_kwargs)
 
         self._create_collection(override)
 
         index_params = self.index_params or {}
+        # The profile's search params only fit an index of the same type, the
+        # collection may have been indexed before the profile was made
+        if (
+            search_params is None
+            and profile
+            and profile["index_params"]["index_type"] == index_params["index_type"]
+        ):
+            search_params = profile["search_params"]
 
         # Use in the passed in search params or the default for the specified index
         self.search_params = (
@@ -100,41 +323,38 @@ class MilvusDataStore(DataStore):
         """
 
         # If the collection exists and create_new is True, drop the existing collection
-        if utility.has_collection(MILVUS_COLLECTION, using=self.alias) and create_new:
-            utility.drop_collection(MILVUS_COLLECTION, using=self.alias)
+        name = self.collection_name
+        if utility.has_collection(name, using=self.alias) and create_new:
+            utility.drop_collection(name, using=self.alias)
 
         # Check if the collection doesn't exist
-        if utility.has_collection(MILVUS_COLLECTION, using=self.alias) is False:
+        if utility.has_collection(name, using=self.alias) is False:
             # If it doesn't exist use the field params from init to create a new schema
-            schema = CollectionSchema(SCHEMA)
+            schema = CollectionSchema(schema_fields(self.store_text))
             # Use the schema to create a new collection
             self.col = Collection(
-                MILVUS_COLLECTION,
+                name,
                 schema=schema,
                 consistency_level="Strong",
                 using=self.alias,
             )
         else:
             # If the collection exists, point to it
-            self.col = Collection(
-                MILVUS_COLLECTION, consistency_level="Strong", using=self.alias
-            )
+            self.col = Collection(name, consistency_level="Strong", using=self.alias)
 
+        indexes = {index.field_name: index for index in self.col.indexes}
         # If no index on the collection, create one
-        if len(self.col.indexes) == 0:
+        if "embedding" not in indexes:
             if self.index_params is not None:
                 # Create an index on the 'embedding' field with the index params found
                 # in init
                 self.col.create_index("embedding", index_params=self.index_params)
             else:
-                # If no index param supplied, to first create an HNSW index for Milvus
+                # If no index param supplied, to first create the default index
+                # (HNSW unless MILVUS_INDEX_TYPE says otherwise) for Milvus
                 try:
                     print("Attempting creation of Milvus default index")
-                    i_p = {
-                        "metric_type": "L2",
-                        "index_type": "HNSW",
-                        "params": {"M": 8, "efConstruction": 64},
-                    }
+                    i_p = DEFAULT_INDEX_PARAMS[MILVUS_INDEX_TYPE]
 
                     self.col.create_index("embedding", index_params=i_p)
                     self.index_params = i_p
@@ -149,127 +369,402 @@ class MilvusDataStore(DataStore):
                     print("Creation of Zilliz Cloud default index successful")
         # If an index already exists, grab its params
         else:
-            self.index_params = self.col.indexes[0].to_dict()["index_param"]
+            self.index_params = indexes["embedding"].to_dict()["index_param"]
+
+        # Scalar indexes speed up filter expressions on metadata fields
+        # Collections created before a field was added to SCHEMA lack it, only the
+        # fields the collection has are written and filtered on
+        self.fields = [field.name for field in self.col.schema.fields]
+        # Searches return pk, score and the filter fields, never the text
+        self.output_fields = [field for field in self.fields if field in FILTER_FIELDS]
 
+        for field in SCALAR_INDEX_FIELDS:
+            if field in self.fields and field not in indexes:
+                try:
+                    self.col.create_index(field, index_name=f"{field}_index")
+                except MilvusException as e:
+                    print(f"Could not create scalar index on {field}: {e}")
+
+        self.partitions = {partition.name for partition in self.col.partitions}
+        self.pool.reset()
+        self.loaded = False
+        if self.load_on_create:
+            self.load()
+
+    def load(self) -> None:
+        """Load the collection into memory so it can be searched."""
         self.col.load()
+        self.loaded = True
 
-    def _get_values_insert(
-        self, episode: EpisodeVector
-    ) -> list[str | int | None | list[float]]:
-        """Get the values to insert into the collection.
+    def _get_columns_insert(
+        self, episodes: list[Episode], embeddings: np.ndarray
+    ) -> list[list[Any]]:
+        """Get the column-major values to insert into the collection.
         Args:
-            episode (EpisodeVector): The episode to insert.
+            episodes (list[Episode]): The episodes to insert.
+            embeddings (np.ndarray): float32 embeddings, one row per episode.
         Returns:
-            list: The values to insert.
+            list: The values to insert, one list per field of the collection.
         """
         return [
-            episode.id,
-            episode.text,
-            episode.embedding,
-            episode.metadata.podcast_id,
-            episode.metadata.category,
-            episode.metadata.language,
+            # rows of the float32 matrix, no per-float python objects
+            list(embeddings)
+            if field == "embedding"
+            else [COLUMN_VALUES[field](episode) for episode in episodes]
+            for field in self.fields
         ]
 
-    async def _upsert(self, episodes: list[EpisodeVector]) -> list[int]:
+    async def _upsert(
+        self, episodes: list[Episode], embeddings: np.ndarray
+    ) -> list[int]:
         """Upsert a batch of data into the collection.
+        Rows are streamed in batches of at most UPSERT_BATCH_SIZE rows and
+        UPSERT_BATCH_BYTES bytes, with up to UPSERT_CONCURRENCY inserts in flight.
         Args:
-            data (list[dict]): The data to upsert.
+            episodes (list[Episode]): The episodes to upsert.
+            embeddings (np.ndarray): float32 embeddings, one row per episode.
         """
+        episode_ids = [episode.id for episode in episodes]
+        in_flight = asyncio.Semaphore(UPSERT_CONCURRENCY)
 
-        episode_ids = []
-        insert_data = [[] for i in range(len(SCHEMA))]  # type: ignore
-
-        for episode in episodes:
-            episode_ids.append(episode.id)
-            insert_row = self._get_values_insert(episode)
-            for i in range(len(insert_row)):
-                insert_data[i].append(insert_row[i])
-
-        # Slice up our insert data into batches
-        batches = [
-            insert_data[i : i + UPSERT_BATCH_SIZE]
-            for i in range(0, len(insert_data), UPSERT_BATCH_SIZE)
+        partitions = [
+            self._partition(episode.metadata.language) for episode in episodes
         ]
-        # Attempt to insert each batch into our collection
-        for batch in batches:
-            if len(batch[0]) != 0:
-                try:
-                    print(f"Upserting batch of size {len(batch[0])}")
-                    self.col.insert(batch)
-                    print("Upserted batch successfully")
-                except Exception as e:
-                    print(f"Error upserting batch: {e}")
-                    raise e
+        if self.partition_by_language:
+            # rows of the same partition next to each other, one insert per batch
+            order = sorted(range(len(episodes)), key=partitions.__getitem__)
+            episodes = [episodes[i] for i in order]
+            partitions = [partitions[i] for i in order]
+            embeddings = embeddings[order]
+            for partition in set(partitions) - self.partitions:
+                await run_blocking(self._create_partition, partition)
+
+        async def insert(start: int, end: int) -> None:
+            async with in_flight:
+                # columns are built per batch, so only the batches in flight are
+                # held twice in memory
+                await self._insert_batch(
+                    self._get_columns_insert(
+                        episodes[start:end], embeddings[start:end]
+                    ),
+                    partitions[start],
+                )
+
+        tasks = [
+            asyncio.create_task(insert(start, end))
+            for start, end in self._batches(episodes, embeddings, partitions)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
 
         # This setting performs flushes after insert. Small insert == bad to use
         # self.col.flush()
 
         return episode_ids
 
-    async def _single_query(
-        self, query: QueryWithEmbedding
-    ) -> list[EpisodeVectorWithScore]:
-        """Query the QueryWithEmbedding in Milvus.
-        Search the embedding and its filter in the collection.
+    def _batches(
+        self, episodes: list[Episode], embeddings: np.ndarray, partitions: list[str]
+    ) -> list[tuple[int, int]]:
+        """Split rows into [start, end) ranges by row count and payload size,
+        never mixing partitions in one range.
+        Args:
+            episodes (list[Episode]): The episodes to insert.
+            embeddings (np.ndarray): float32 embeddings, one row per episode.
+            partitions (list[str]): partition of every episode.
+        Returns:
+            list[tuple[int, int]]: Row ranges, each one insert call.
+        """
+        batches = []
+        start, size = 0, 0
+        for i, episode in enumerate(episodes):
+            metadata = episode.metadata
+            row_size = (
+                embeddings[i].nbytes
+                + 16  # pk, podcast_id
+                + len(episode.text.encode())
+                + len((metadata.category or "").encode())
+                + len((metadata.language or "").encode())
+            )
+            if i > start and (
+                i - start >= UPSERT_BATCH_SIZE
+                or size + row_size > UPSERT_BATCH_BYTES
+                or partitions[i] != partitions[start]
+            ):
+                batches.append((start, i))
+                start, size = i, 0
+            size += row_size
+        if start < len(episodes):
+            batches.append((start, len(episodes)))
+        return batches
+
+    async def _insert_batch(self, batch: list[list[Any]], partition: str) -> None:
+        """Insert one batch, retrying failed attempts with exponential backoff.
+        A failed attempt may still have been applied (a timeout only stops waiting
+        for it), so a plain insert is retried only after deleting the batch's pks;
+        native upserts replace them anyway.
+        Args:
+            batch (list[list[Any]]): Column-major values, one list per field.
+            partition (str): Partition to insert into.
+        """
+        rows = len(batch[0])
+        pks = batch[self.fields.index("pk")]
+        for attempt in range(UPSERT_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                if attempt and not self.native_upsert:
+                    await self.delete(ids=pks)
+                await self.pool.run(
+                    "upsert" if self.native_upsert else "insert",
+                    Collection.upsert if self.native_upsert else Collection.insert,
+                    MILVUS_WRITE_TIMEOUT,
+                    data=batch,
+                    partition_name=partition,
+                )
+            except Exception as e:
+                if attempt == UPSERT_RETRIES:
+                    self._upsert_stats["failed_batches"] += 1
+                    print(f"Error upserting batch of size {rows}: {e}")
+                    raise e
+                self._upsert_stats["retries"] += 1
+                backoff = UPSERT_BACKOFF_SECONDS * 2**attempt
+                print(f"Retrying batch of size {rows} in {backoff:.1f}s: {e}")
+                await asyncio.sleep(backoff)
+            else:
+                elapsed = time.perf_counter() - start
+                stats = self._upsert_stats
+                stats["batches"] += 1
+                stats["rows"] += rows
+                stats["seconds"] += elapsed
+                stats["max_batch_seconds"] = max(stats["max_batch_seconds"], elapsed)
+                print(f"Upserted batch of size {rows} in {elapsed * 1000:.1f}ms")
+                return
+
+    def _partition(self, language: str | None) -> str:
+        """Get the partition holding episodes of a language.
+        Args:
+            language (str | None): Episode language.
+        Returns:
+            str: Partition name, the default partition without partitioning.
+        """
+        if not self.partition_by_language or not language:
+            return "_default"
+        return "lang_" + re.sub(r"[^0-9a-z_]", "_", language.lower())
+
+    def _create_partition(self, partition: str) -> None:
+        """Create a partition unless another process did already."""
+        if not self.col.has_partition(partition):
+            self.col.create_partition(partition)
+        self.partitions.add(partition)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def stats(self) -> dict[str, Any]:
+        stats = self._upsert_stats
+        return {
+            "pool": self.pool.stats(),
+            "upsert": {
+                **stats,
+                "avg_batch_seconds": (
+                    stats["seconds"] / stats["batches"] if stats["batches"] else 0.0
+                ),
+            },
+        }
+
+    async def _search(
+        self, queries: list[Query], embeddings: np.ndarray
+    ) -> list[list[EpisodeWithScore]]:
+        """Search queries sharing the same filter in one call, for the largest
+        top_k among them; the hits of every query are cut to its own top_k.
 
         Args:
-            query (QueryWithEmbedding): The query to query for.
+            queries (list[Query]): queries with the same filter.
+            embeddings (np.ndarray): float32 embeddings, one row per query.
 
         Returns:
-            list[QueryResult]: A list of the results of the query.
+            list[list[EpisodeWithScore]]: The hits of every query, in order.
         """
-        filter = None
-        if query.filter is not None:
-            filter = self._get_filter(query.filter)
-
-        top_k = TOP_K
-        if query.top_k is not None:
-            top_k = query.top_k
-
-        results = self.col.search(
-            [query.embedding],
-            "embedding",
-            self.search_params,
-            top_k,
-            filter,
-            output_fields=["text", "podcast_id", "category", "language"],
+        filter_conditions = (
+            conditions(queries[0].filter) if queries[0].filter is not None else []
+        )
+        filter = to_milvus_expression(filter_conditions, set(self.fields))
+
+        top_ks = [TOP_K if query.top_k is None else query.top_k for query in queries]
+        top_k = max(top_ks)
+
+        # a language filter only needs to search those languages' partitions
+        partition_names = None
+        languages = allowed_values(filter_conditions, "language")
+        if self.partition_by_language and languages is not None:
+            partitions = {self._partition(language) for language in languages}
+            if not partitions <= self.partitions:
+                # another process may have created them since
+                self.partitions = await run_blocking(
+                    lambda: {partition.name for partition in self.col.partitions}
+                )
+            partition_names = sorted(partitions & self.partitions)
+            if not partition_names:
+                return [[] for _ in queries]
+
+        if not self.loaded:
+            await run_blocking(self.load)
+
+        # candidates to rerank, the compressed index only approximates distances
+        fetch = top_k * self.rerank_factor
+        results = await self.pool.run(
+            "search",
+            Collection.search,
+            MILVUS_SEARCH_TIMEOUT,
+            data=list(embeddings),
+            anns_field="embedding",
+            param=search_params_for(self.search_params, fetch),
+            limit=fetch,
+            expr=filter,
+            partition_names=partition_names,
+            output_fields=self.output_fields,
         )
 
-        query_results: list[EpisodeVectorWithScore] = []
-        for result in results[0]:
-            score = result.score
-            episode_with_score = EpisodeVectorWithScore(
-                metadata=EpisodeMetadata(
-                    podcast_id=result.entity.get("podcast_id"),
-                    category=result.entity.get("category"),
-                    language=result.entity.get("language"),
-                ),
-                text=result.entity.get("text"),
-                score=score,
-                embedding=query.embedding,
-                id=result.id,
+        hits = [
+            [
+                EpisodeWithScore(
+                    metadata=EpisodeMetadata(
+                        podcast_id=result.entity.get("podcast_id"),
+                        category=result.entity.get("category"),
+                        language=result.entity.get("language"),
+                        datePublished=result.entity.get("datePublished") or None,
+                        duration=result.entity.get("duration") or None,
+                    ),
+                    score=result.score,
+                    id=result.id,
+                )
+                for result in hits
+            ]
+            for hits in results
+        ]
+        if self.rerank_factor > 1:
+            hits = await self._rerank(hits, embeddings, top_k)
+        return [query_hits[:k] for query_hits, k in zip(hits, top_ks)]
+
+    async def _rerank(
+        self,
+        results: list[list[EpisodeWithScore]],
+        embeddings: np.ndarray,
+        top_k: int,
+    ) -> list[list[EpisodeWithScore]]:
+        """Re-score candidates on their stored full precision vectors.
+
+        Args:
+            results (list[list[EpisodeWithScore]]): Candidates of every query.
+            embeddings (np.ndarray): float32 embeddings, one row per query.
+            top_k (int): Hits to keep per query.
+
+        Returns:
+            list[list[EpisodeWithScore]]: The top_k candidates by exact distance.
+        """
+        reranked = []
+        for hits, embedding in zip(await self._with_vectors(results), embeddings):
+            if not hits:
+                reranked.append([])
+                continue
+            vectors = np.array([hit.embedding for hit in hits], dtype=np.float32)
+            vectors -= embedding
+            distances = np.einsum("ij,ij->i", vectors, vectors)
+            reranked.append(
+                [
+                    EpisodeWithScore(
+                        id=hits[i].id,
+                        metadata=hits[i].metadata,
+                        score=float(distances[i]),
+                    )
+                    for i in np.argsort(distances)[:top_k]
+                ]
             )
+        return reranked
 
-            query_results.append(episode_with_score)
+    async def _with_vectors(
+        self, results: list[list[EpisodeWithScore]]
+    ) -> list[list[EpisodeWithScore]]:
+        """Attach the stored embedding to every hit.
+        Milvus 2.2 cannot return vector fields from a search, so they are fetched
+        by primary key for the hits of all queries, one query per expression of
+        at most PK_EXPR_BYTES.
 
-        return query_results
+        Args:
+            results (list[list[EpisodeWithScore]]): Hits of every query.
 
-    async def _query(self, queries: list[QueryWithEmbedding]) -> list[QueryResult]:
-        """Query the list of QueryWithEmbeddings in Milvus.
+        Returns:
+            list[list[EpisodeWithScore]]: The same hits as EpisodeVectorWithScore.
+        """
+        ids = list({hit.id for hits in results for hit in hits})
+        embeddings: dict[int, list[float]] = {}
+        for expr in self._pk_expressions(ids):
+            rows = await self.pool.run(
+                "query",
+                Collection.query,
+                MILVUS_SEARCH_TIMEOUT,
+                expr=expr,
+                output_fields=["pk", "embedding"],
+            )
+            embeddings.update((row["pk"], row["embedding"]) for row in rows)
+        return [
+            [
+                EpisodeVectorWithScore(**hit.dict(), embedding=embeddings[hit.id])
+                for hit in hits
+            ]
+            for hits in results
+        ]
+
+    async def _query(
+        self,
+        queries: list[Query],
+        embeddings: np.ndarray,
+        include_vectors: bool = False,
+    ) -> list[QueryResult]:
+        """Query the list of Queries in Milvus.
+        Queries with the same filter are sent as one multi-vector search (in
+        chunks of SEARCH_MAX_NQ) whatever their top_k, different filters are
+        searched concurrently.
 
         Args:
-            queries (list[QueryWithEmbedding]): list of queries.
+            queries (list[Query]): list of queries.
+            embeddings (np.ndarray): float32 embeddings, one row per query.
+            include_vectors (bool): Also return the stored embedding of every hit.
 
         Returns:
             list[QueryResult]: A list of the results of the queries.
         """
-        results: list[QueryResult] = [
-            QueryResult(query=query.query, results=await self._single_query(query))
-            for query in queries
+        groups: dict[str | None, list[int]] = defaultdict(list)
+        for i, query in enumerate(queries):
+            groups[query.filter.json() if query.filter else None].append(i)
+        chunks = [
+            members[start : start + SEARCH_MAX_NQ]
+            for members in groups.values()
+            for start in range(0, len(members), SEARCH_MAX_NQ)
         ]
 
-        return results
+        searched = await asyncio.gather(
+            *(
+                self._search([queries[i] for i in chunk], embeddings[chunk])
+                for chunk in chunks
+            )
+        )
+        # demultiplex the hits back into query order
+        hits: list[list[EpisodeWithScore]] = [[] for _ in queries]
+        for chunk, chunk_hits in zip(chunks, searched):
+            for i, query_hits in zip(chunk, chunk_hits):
+                hits[i] = query_hits
+
+        if include_vectors:
+            hits = await self._with_vectors(hits)
+
+        return [
+            QueryResult(query=query.query, results=query_hits)
+            for query, query_hits in zip(queries, hits)
+        ]
 
     async def delete(
         self,
@@ -281,41 +776,81 @@ class MilvusDataStore(DataStore):
         Returns whether the operation was successful.
         """
         if delete_all:
-            # Release the collection from memory
-            self.col.release()
-            # Drop the collection
-            self.col.drop()
-            # Recreate the new collection
-            self._create_collection(True)
+            await run_blocking(self._recreate_collection)
             return True
 
-        delete_count = 0
-        chunk_size = 100
         # Check if empty ids
-        if ids is not None:
-            while len(ids) > 0:
-                ids_chunk = ids[:chunk_size]
-                ids = ids[chunk_size:]
-                # Add quotation marks around the string format id
-                ids_chunk = [f"{str(id)}" for id in ids_chunk]
-                # delete the ids
-                res = self.col.delete(f"pk in [{','.join(ids_chunk)}]")
-                delete_count += int(res.delete_count)
+        if ids:
+            for expr in self._pk_expressions(ids):
+                await self.pool.run(
+                    "delete", Collection.delete, MILVUS_WRITE_TIMEOUT, expr=expr
+                )
 
         return True
 
-    def _get_filter(self, filter: EpisodeMetadataFilter) -> str:
-        """Get the filter string for the query.
+    def _recreate_collection(self) -> None:
+        """Drop the collection and create it again, empty."""
+        # Release the collection from memory
+        self.col.release()
+        # Drop the collection
+        self.col.drop()
+        # Recreate the new collection
+        self._create_collection(True)
+
+    async def _delete_existing(self, ids: list[int]) -> None:
+        """Delete only the ids that are stored already, found with one pk query
+        per expression, so a first-time ingest writes nothing but the inserts.
+        Nothing to do with native upsert, unless episodes can change partition.
+        Args:
+            ids (list[int]): ids about to be inserted.
+        """
+        # native upsert only replaces rows within the partition it writes to
+        if (self.native_upsert and not self.partition_by_language) or not ids:
+            return
+        existing = await self.existing_ids(ids)
+        if existing:
+            await self.delete(ids=existing)  # type: ignore
+
+    async def existing_ids(self, ids: list[int]) -> list[int]:
+        """Find which ids are stored, with one pk query per expression.
+        Args:
+            ids (list[int]): ids to look for.
+        Returns:
+            list[int]: The ids found, in no particular order.
+        """
+        if not ids:
+            return []
+        if not self.loaded:
+            await run_blocking(self.load)
+        existing: list[int] = []
+        for expr in self._pk_expressions(ids):
+            rows = await self.pool.run(
+                "query",
+                Collection.query,
+                MILVUS_SEARCH_TIMEOUT,
+                expr=expr,
+                output_fields=["pk"],
+            )
+            existing.extend(row["pk"] for row in rows)
+        return existing
+
+    def _pk_expressions(self, ids: list[Any]) -> list[str]:
+        """Split ids into `pk in [...]` expressions of at most PK_EXPR_BYTES.
         Args:
-            filter (QueryFilter): The filter to use.
+            ids (list): primary keys.
         Returns:
-            str: The filter string.
+            list[str]: The expressions.
         """
-        filter_string = []
-        if filter.podcast_id is not None:
-            filter_string.append(f'(podcast_id == "{filter.podcast_id}")')
-        if filter.category is not None:
-            filter_string.append(f'(category == "{filter.category}")')
-        if filter.language is not None:
-            filter_string.append(f'(language == "{filter.language}")')
-        return " and ".join(filter_string)
+        expressions = []
+        chunk: list[str] = []
+        size = 0
+        for id in ids:
+            id = str(id)
+            if chunk and size + len(id) + 1 > PK_EXPR_BYTES:
+                expressions.append(f"pk in [{','.join(chunk)}]")
+                chunk, size = [], 0
+            chunk.append(id)
+            size += len(id) + 1
+        if chunk:
+            expressions.append(f"pk in [{','.join(chunk)}]")
+        return expressions
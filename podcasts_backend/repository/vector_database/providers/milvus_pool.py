@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, TypeVar
+from uuid import uuid4
+
+from pymilvus import Collection, connections
+
+T = TypeVar("T")
+
+# gRPC channels to Milvus, calls go to the least busy one
+MILVUS_CONNECTIONS = int(os.environ.get("MILVUS_CONNECTIONS") or 4)
+# threads running pymilvus calls, i.e. the maximum number of calls in flight
+MILVUS_WORKERS = int(os.environ.get("MILVUS_WORKERS") or 2 * MILVUS_CONNECTIONS)
+# per operation timeouts in seconds
+MILVUS_SEARCH_TIMEOUT = float(os.environ.get("MILVUS_SEARCH_TIMEOUT") or 10)
+MILVUS_WRITE_TIMEOUT = float(os.environ.get("MILVUS_WRITE_TIMEOUT") or 60)
+
+
+@dataclass
+class _OperationStats:
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    seconds: float = 0.0
+    queue_seconds: float = 0.0
+
+
+class MilvusPool:
+    """Runs blocking pymilvus calls off the event loop, over several connections.
+
+    Every alias is its own gRPC channel with its own `Collection` handle. A call
+    is sent to the alias with the fewest calls in flight and runs on a bounded
+    thread pool of its own, so Milvus traffic neither serializes on one channel
+    nor takes threads from bcrypt and database work. Each call is bounded by a
+    timeout, passed to pymilvus as the gRPC deadline and enforced on the caller.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        alias: str,
+        connect_kwargs: dict[str, Any],
+        size: int = MILVUS_CONNECTIONS,
+        workers: int = MILVUS_WORKERS,
+    ) -> None:
+        self.collection_name = collection_name
+        self.workers = workers
+        # the first alias is the datastore's own, already connected and maybe
+        # shared; the others belong to this pool alone, so closing another pool
+        # on the same alias leaves them connected
+        pool_id = uuid4().hex[:8]
+        self.aliases = [alias] + [f"{alias}-{pool_id}-{i}" for i in range(1, size)]
+        for extra in self.aliases[1:]:
+            connections.connect(extra, **connect_kwargs)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="milvus"
+        )
+        self._collections: dict[str, Collection] = {}
+        self._in_flight = dict.fromkeys(self.aliases, 0)
+        self._max_in_flight = 0
+        self._stats: dict[str, _OperationStats] = {}
+
+    def reset(self) -> None:
+        """forget collection handles, e.g. after the collection was recreated"""
+        self._collections = {}
+
+    async def run(
+        self, operation: str, fn: Callable[..., T], timeout: float, **kwargs: Any
+    ) -> T:
+        """call fn(collection, **kwargs, timeout=timeout) on the least busy alias
+
+        Args:
+            operation (str): name to report the call under, e.g. "search"
+            fn (Callable[..., T]): unbound Collection method, e.g. Collection.search
+            timeout (float): seconds before the call is abandoned, queueing included
+
+        Raises:
+            asyncio.TimeoutError: the call did not finish in time
+
+        Returns:
+            T: what fn returned
+        """
+        alias = min(self.aliases, key=self._in_flight.__getitem__)
+        stats = self._stats.setdefault(operation, _OperationStats())
+        submitted = time.perf_counter()
+        started = submitted
+
+        def call() -> T:
+            nonlocal started
+            started = time.perf_counter()
+            # time spent queueing for a worker counts against the timeout
+            remaining = timeout - (started - submitted)
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            return fn(self._collection(alias), **kwargs, timeout=remaining)
+
+        self._in_flight[alias] += 1
+        self._max_in_flight = max(self._max_in_flight, sum(self._in_flight.values()))
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, call), timeout
+            )
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            self._in_flight[alias] -= 1
+            stats.calls += 1
+            stats.seconds += time.perf_counter() - submitted
+            stats.queue_seconds += started - submitted
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # only the connections this pool made, the first one is the caller's
+        for extra in self.aliases[1:]:
+            connections.disconnect(extra)
+        self._collections = {}
+
+    def stats(self) -> dict[str, Any]:
+        in_flight = sum(self._in_flight.values())
+        return {
+            "connections": len(self.aliases),
+            "workers": self.workers,
+            "in_flight": in_flight,
+            "max_in_flight": self._max_in_flight,
+            "utilization": in_flight / self.workers,
+            "operations": {
+                operation: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "timeouts": stats.timeouts,
+                    "avg_seconds": stats.seconds / stats.calls if stats.calls else 0.0,
+                    "avg_queue_seconds": (
+                        stats.queue_seconds / stats.calls if stats.calls else 0.0
+                    ),
+                }
+                for operation, stats in self._stats.items()
+            },
+        }
+
+    def _collection(self, alias: str) -> Collection:
+        collection = self._collections.get(alias)
+        if collection is None:
+            collection = Collection(self.collection_name, using=alias)
+            self._collections[alias] = collection
+        return collection
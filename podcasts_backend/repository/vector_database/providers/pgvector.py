@@ -0,0 +1,321 @@
+import json
+import os
+from typing import Any
+
+import numpy as np
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Float,
+    Index,
+    MetaData,
+    Table,
+    Text,
+    bindparam,
+    create_engine,
+    delete,
+    text,
+)
+from sqlalchemy import select as sql_select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.types import UserDefinedType
+from sqlmodel import Session, col, select
+
+from podcasts_backend.models.models import EpisodeTable, PodcastTable
+from podcasts_backend.schemas.schemas import (
+    Episode,
+    EpisodeMetadata,
+    EpisodeVectorWithScore,
+    EpisodeWithScore,
+    Query,
+    QueryResult,
+)
+from podcasts_backend.services.embeddings import EMBEDDING_DIM, embedding_batcher
+from podcasts_backend.services.executors import run_blocking
+
+from ..datastore import DataStore, Hydrate, SearchHit
+from ..filters import FILTER_FIELDS, conditions, to_sql_clauses
+
+# the episode tables must be in the same database for hydrated searches
+PGVECTOR_DATABASE_URL = (
+    os.environ.get("PGVECTOR_DATABASE_URL") or os.environ.get("DATABASE_URL") or ""
+)
+PGVECTOR_TABLE = os.environ.get("PGVECTOR_TABLE") or "episode_embedding"
+# "hnsw", "ivfflat", or "none" for exact search
+PGVECTOR_INDEX = os.environ.get("PGVECTOR_INDEX") or "hnsw"
+PGVECTOR_HNSW_M = int(os.environ.get("PGVECTOR_HNSW_M") or 16)
+PGVECTOR_HNSW_EF_CONSTRUCTION = int(
+    os.environ.get("PGVECTOR_HNSW_EF_CONSTRUCTION") or 64
+)
+PGVECTOR_HNSW_EF_SEARCH = int(os.environ.get("PGVECTOR_HNSW_EF_SEARCH") or 40)
+PGVECTOR_IVFFLAT_LISTS = int(os.environ.get("PGVECTOR_IVFFLAT_LISTS") or 1000)
+PGVECTOR_IVFFLAT_PROBES = int(os.environ.get("PGVECTOR_IVFFLAT_PROBES") or 10)
+PGVECTOR_UPSERT_BATCH_SIZE = int(os.environ.get("PGVECTOR_UPSERT_BATCH_SIZE") or 1000)
+# metadata columns with a btree index, for filters the vector index can't serve
+INDEXED_FIELDS = ("podcast_id", "category", "language", "datePublished")
+
+
+class Vector(UserDefinedType):
+    """pgvector's VECTOR column, values go over the wire in its text form"""
+
+    cache_ok = True
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+
+    def get_col_spec(self, **kw: Any) -> str:
+        return f"VECTOR({self.dim})"
+
+    def bind_processor(self, dialect: Any) -> Any:
+        def process(value: Any) -> str | None:
+            if value is None:
+                return None
+            return "[" + ",".join(map(str, np.asarray(value).tolist())) + "]"
+
+        return process
+
+    def result_processor(self, dialect: Any, coltype: Any) -> Any:
+        def process(value: str | None) -> np.ndarray | None:
+            if value is None:
+                return None
+            # "[1,2.5,...]" is a JSON array
+            return np.array(json.loads(value), dtype=np.float32)
+
+        return process
+
+
+def embedding_table(name: str, dim: int) -> Table:
+    return Table(
+        name,
+        MetaData(),
+        Column("episode_id", BigInteger, primary_key=True, autoincrement=False),
+        *(
+            Column(field, Text if kind is str else BigInteger)
+            for field, kind in FILTER_FIELDS.items()
+        ),
+        Column("embedding", Vector(dim), nullable=False),
+        *(Index(f"ix_{name}_{field}", field) for field in INDEXED_FIELDS),
+    )
+
+
+class PgVectorDataStore(DataStore):
+    """Vectors in Postgres (pgvector extension), next to the episode tables.
+
+    One row per episode holds the embedding and the filter metadata, with an
+    HNSW or IVFFlat index on the embedding and btree indexes on the filter
+    columns. Filters compile to a WHERE clause of the nearest neighbour query,
+    so the planner picks between the vector index and the metadata indexes.
+    `search_episodes` joins the nearest rows with `EpisodeTable` and
+    `PodcastTable`, answering a semantic search with hydrated rows in a single
+    round trip. Scores are squared L2 distances, like the other providers.
+    """
+
+    def __init__(
+        self,
+        url: str = PGVECTOR_DATABASE_URL,
+        table: str = PGVECTOR_TABLE,
+        dim: int = EMBEDDING_DIM,
+        index: str = PGVECTOR_INDEX,
+    ) -> None:
+        if index not in ("hnsw", "ivfflat", "none"):
+            raise ValueError(f"Unknown pgvector index {index}")
+        assert url != "", "PGVECTOR_DATABASE_URL or DATABASE_URL must be set"
+        self.engine = create_engine(url)
+        self.dim = dim
+        self.index = index
+        # index scans filter the rows the index returns, and may return fewer
+        self.exhaustive_search = index == "none"
+        self.table = embedding_table(table, dim)
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            self.table.create(connection, checkfirst=True)
+        # IVFFlat centroids come from the rows present when the index is built,
+        # create it (again) once the table is filled
+        self.create_index()
+
+    def create_index(self) -> None:
+        """create the vector index if missing, with the configured parameters"""
+        if self.index == "none":
+            return
+        if self.index == "hnsw":
+            params = (
+                f"m = {PGVECTOR_HNSW_M}, "
+                f"ef_construction = {PGVECTOR_HNSW_EF_CONSTRUCTION}"
+            )
+        else:
+            params = f"lists = {PGVECTOR_IVFFLAT_LISTS}"
+        name = self.table.name
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{name}_embedding ON {name} "
+                    f"USING {self.index} (embedding vector_l2_ops) WITH ({params})"
+                )
+            )
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+    def stats(self) -> dict[str, Any]:
+        return {"index": self.index, "pool": self.engine.pool.status()}
+
+    async def _upsert(
+        self, episodes: list[Episode], embeddings: np.ndarray
+    ) -> list[int]:
+        await run_blocking(self._insert, episodes, embeddings)
+        return [episode.id for episode in episodes]
+
+    def _insert(self, episodes: list[Episode], embeddings: np.ndarray) -> None:
+        statement = insert(self.table)
+        # rows already stored are replaced, no delete needed before an upsert
+        statement = statement.on_conflict_do_update(
+            index_elements=[self.table.c.episode_id],
+            set_={
+                name: statement.excluded[name]
+                for name in self.table.c.keys()
+                if name != "episode_id"
+            },
+        )
+        with self.engine.begin() as connection:
+            for start in range(0, len(episodes), PGVECTOR_UPSERT_BATCH_SIZE):
+                end = start + PGVECTOR_UPSERT_BATCH_SIZE
+                rows = [
+                    {
+                        "episode_id": episode.id,
+                        **{
+                            field: getattr(episode.metadata, field)
+                            for field in FILTER_FIELDS
+                        },
+                        "embedding": embedding,
+                    }
+                    for episode, embedding in zip(
+                        episodes[start:end], embeddings[start:end]
+                    )
+                ]
+                connection.execute(statement, rows)
+
+    async def _delete_existing(self, ids: list[int]) -> None:
+        """inserts replace stored rows, nothing to delete first"""
+
+    def _nearest(self, query: Query, embedding: np.ndarray, *columns: Any) -> Any:
+        """select of the top_k rows closest to embedding under the query filter"""
+        distance = self.table.c.embedding.op("<->", return_type=Float)(
+            bindparam("embedding", embedding, type_=Vector(self.dim))
+        )
+        clauses = (
+            to_sql_clauses(conditions(query.filter), self.table.c)
+            if query.filter
+            else []
+        )
+        return (
+            sql_select(*columns, distance.label("distance"))
+            .where(*clauses)
+            .order_by(distance)
+            .limit(query.top_k)
+        )
+
+    def _set_search_params(self, connection: Connection, top_k: int) -> None:
+        """search parameters for the current transaction, ef at least top_k"""
+        if self.index == "hnsw":
+            ef_search = max(PGVECTOR_HNSW_EF_SEARCH, top_k)
+            connection.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+        elif self.index == "ivfflat":
+            probes = PGVECTOR_IVFFLAT_PROBES
+            connection.execute(text(f"SET LOCAL ivfflat.probes = {probes}"))
+
+    def _search_many(
+        self, queries: list[Query], embeddings: np.ndarray, include_vectors: bool
+    ) -> list[QueryResult]:
+        """every query of a batch on one connection, in one transaction"""
+        columns = [self.table.c.episode_id, *(self.table.c[f] for f in FILTER_FIELDS)]
+        if include_vectors:
+            columns.append(self.table.c.embedding)
+        query_results: list[QueryResult] = []
+        with self.engine.begin() as connection:
+            # a larger ef than a query needs only improves its recall
+            self._set_search_params(connection, max(query.top_k for query in queries))
+            for query, embedding in zip(queries, embeddings):
+                rows = connection.execute(self._nearest(query, embedding, *columns))
+                results: list[EpisodeWithScore] = []
+                for row in rows:
+                    fields = {
+                        "id": row.episode_id,
+                        "score": row.distance**2,
+                        "metadata": EpisodeMetadata(
+                            **{field: row._mapping[field] for field in FILTER_FIELDS}
+                        ),
+                    }
+                    if include_vectors:
+                        results.append(
+                            EpisodeVectorWithScore(
+                                **fields, embedding=row.embedding.tolist()
+                            )
+                        )
+                    else:
+                        results.append(EpisodeWithScore(**fields))
+                query_results.append(QueryResult(query=query.query, results=results))
+        return query_results
+
+    async def _query(
+        self,
+        queries: list[Query],
+        embeddings: np.ndarray,
+        include_vectors: bool = False,
+    ) -> list[QueryResult]:
+        if not queries:
+            return []
+        return await run_blocking(
+            self._search_many, queries, embeddings, include_vectors
+        )
+
+    async def search_episodes(
+        self, query: Query, hydrate: Hydrate, embedding: np.ndarray | None = None
+    ) -> list[SearchHit]:
+        """nearest episodes of a query with their podcasts, in one SQL query
+
+        Args:
+            query (Query): search query, with optional filters
+            hydrate (Hydrate): unused, the episodes are joined in the search
+            embedding (np.ndarray | None): embedding of the query, if known
+
+        Returns:
+            list[SearchHit]: (episode, podcast, score) by increasing score
+        """
+        if embedding is None:
+            embedding = (await embedding_batcher.embed([query.query]))[0]
+        return await run_blocking(self._search_episodes, query, embedding)
+
+    def _search_episodes(self, query: Query, embedding: np.ndarray) -> list[SearchHit]:
+        nearest = self._nearest(query, embedding, self.table.c.episode_id).subquery()
+        statement = (
+            select(EpisodeTable, PodcastTable, nearest.c.distance)
+            .join(nearest, col(EpisodeTable.episode_id) == nearest.c.episode_id)
+            .join(PodcastTable, col(PodcastTable.podcast_id) == EpisodeTable.podcast_id)
+            .order_by(nearest.c.distance)
+        )
+        with Session(self.engine) as session:
+            self._set_search_params(session.connection(), query.top_k)
+            return [
+                (episode, podcast, distance**2)
+                for episode, podcast, distance in session.exec(statement)
+            ]
+
+    async def delete(
+        self,
+        ids: list[str] | None = None,
+        delete_all: bool | None = None,
+    ) -> bool:
+        await run_blocking(self._delete, ids, delete_all)
+        return True
+
+    def _delete(self, ids: list[str] | None, delete_all: bool | None) -> None:
+        with self.engine.begin() as connection:
+            if delete_all:
+                connection.execute(text(f"TRUNCATE {self.table.name}"))
+            elif ids:
+                connection.execute(
+                    delete(self.table).where(
+                        self.table.c.episode_id.in_([int(id) for id in ids])
+                    )
+                )
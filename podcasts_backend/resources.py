@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any
+
+from .services.executors import run_blocking
+
+
+class ResourceState(str, Enum):
+    PENDING = "pending"
+    STARTING = "starting"
+    WARMING = "warming"
+    READY = "ready"
+    FAILED = "failed"
+    CLOSED = "closed"
+
+
+class ResourceNotReadyError(RuntimeError):
+    pass
+
+
+@dataclass
+class Resource:
+    name: str
+    factory: Callable[[], Any]
+    warm_up: Callable[[Any], Awaitable[None]] | None = None
+    close: Callable[[Any], None] | None = None
+    state: ResourceState = ResourceState.PENDING
+    value: Any = None
+    created: bool = False
+    error: str | None = None
+    startup_seconds: float | None = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ResourceRegistry:
+    """Named, lazily created process resources (database engine, vector store, ...).
+
+    Registering a resource is free; nothing connects at import time. The
+    application lifespan calls `start`, which creates every resource and runs its
+    optional warm-up in the background, so the process answers liveness probes
+    immediately and reports readiness per resource. Outside of the lifespan
+    (scripts, tools) a resource is created synchronously on first `get`.
+    """
+
+    def __init__(self) -> None:
+        self._resources: dict[str, Resource] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        warm_up: Callable[[Any], Awaitable[None]] | None = None,
+        close: Callable[[Any], None] | None = None,
+    ) -> None:
+        self._resources[name] = Resource(
+            name=name, factory=factory, warm_up=warm_up, close=close
+        )
+
+    def get(self, name: str) -> Any:
+        """get a created resource, creating it now if nothing started it yet
+
+        Args:
+            name (str): name of the resource
+
+        Raises:
+            ResourceNotReadyError: resource failed or is still being created
+
+        Returns:
+            Any: the resource
+        """
+        resource = self._resources[name]
+        if resource.created:
+            return resource.value
+        if resource.state == ResourceState.PENDING:
+            return self._create(resource, ResourceState.READY)
+        if resource.state == ResourceState.FAILED:
+            raise ResourceNotReadyError(f"{name} failed to start: {resource.error}")
+        raise ResourceNotReadyError(f"{name} is {resource.state.value}")
+
+    def peek(self, name: str) -> Any:
+        """the resource if it was created already, None otherwise. Never creates."""
+        resource = self._resources[name]
+        return resource.value if resource.created else None
+
+    async def start(self, warm_up: bool = True) -> None:
+        """create all resources in the background, then run their warm-ups"""
+        for resource in self._resources.values():
+            if resource.state == ResourceState.PENDING:
+                self._tasks.append(asyncio.create_task(self._start(resource, warm_up)))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for resource in self._resources.values():
+            if resource.created and resource.close is not None:
+                await run_blocking(resource.close, resource.value)
+            resource.state = ResourceState.CLOSED
+            resource.value = None
+            resource.created = False
+
+    def ready(self) -> bool:
+        return all(
+            resource.state == ResourceState.READY
+            for resource in self._resources.values()
+        )
+
+    def status(self) -> dict[str, dict[str, Any]]:
+        return {
+            resource.name: {
+                "state": resource.state.value,
+                "error": resource.error,
+                "startup_seconds": resource.startup_seconds,
+            }
+            for resource in self._resources.values()
+        }
+
+    def _create(self, resource: Resource, state: ResourceState) -> Any:
+        with resource.lock:
+            if resource.created:
+                return resource.value
+            resource.state = ResourceState.STARTING
+            try:
+                resource.value = resource.factory()
+            except Exception as e:
+                resource.state = ResourceState.FAILED
+                resource.error = repr(e)
+                raise
+            resource.created = True
+            resource.state = state
+            return resource.value
+
+    async def _start(self, resource: Resource, warm_up: bool) -> None:
+        start = time.perf_counter()
+        warming = warm_up and resource.warm_up is not None
+        try:
+            await run_blocking(
+                self._create,
+                resource,
+                ResourceState.WARMING if warming else ResourceState.READY,
+            )
+            if warming:
+                await resource.warm_up(resource.value)  # type: ignore
+                resource.state = ResourceState.READY
+        except Exception as e:
+            resource.state = ResourceState.FAILED
+            resource.error = repr(e)
+            print(f"Failed to start {resource.name}: {e}")
+        resource.startup_seconds = time.perf_counter() - start
+
+
+registry = ResourceRegistry()
@@ -19,7 +19,7 @@ router = APIRouter()
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> Token:
-    user = auth.authenticate_user(form_data.username, form_data.password)
+    user = await auth.authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -42,7 +42,7 @@ async def read_users_me(
 
 @router.post("/create_user/", response_model=UserOutput)
 async def create_user(user: UserInput) -> UserOutput:
-    if auth.create_user(user):
+    if await auth.create_user(user):
         return UserOutput(username=user.username, email=user.email)
     else:
         raise HTTPException(
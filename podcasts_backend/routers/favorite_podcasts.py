@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 
 from podcasts_backend.schemas.schemas import (
-    Query,
+    BatchSemanticSearchQuery,
+    BatchSemanticSearchResults,
     SemanticSearchByEpisodeDescriptionResults,
+    SemanticSearchQuery,
 )
 
 from ..models.models import PodcastTable
@@ -42,6 +45,29 @@ async def delete_podcast_from_favorites(
     response_model=SemanticSearchByEpisodeDescriptionResults,
 )
 async def semantic_search_episode_description(
-    query: Query,
+    query: SemanticSearchQuery,
 ) -> SemanticSearchByEpisodeDescriptionResults:
     return await favorite_podcasts_service.semantic_search_by_episode_description(query)
+
+
+@router.post("/semantic_search_episode_description/stream")
+async def stream_semantic_search_episode_description(
+    query: SemanticSearchQuery,
+) -> StreamingResponse:
+    """the results of /semantic_search_episode_description/ as NDJSON, one podcast
+    per line, sent as soon as it is hydrated"""
+    podcasts, next_cursor = await favorite_podcasts_service.search_podcast_groups(query)
+    return StreamingResponse(
+        favorite_podcasts_service.stream_podcast_groups(podcasts, next_cursor),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post(
+    "/semantic_search_episode_description/batch",
+    response_model=BatchSemanticSearchResults,
+)
+async def batch_semantic_search_episode_description(
+    batch: BatchSemanticSearchQuery,
+) -> BatchSemanticSearchResults:
+    return await favorite_podcasts_service.batch_semantic_search(batch)
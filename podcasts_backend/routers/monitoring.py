@@ -0,0 +1,38 @@
+from typing import Any
+
+from fastapi import APIRouter, Response, status
+
+from ..resources import registry
+from ..services.embeddings import embedding_batcher, embedding_cache
+from ..services.executors import executors
+from ..services.search_cache import search_cache, semantic_cache
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def healthz() -> dict[str, str]:
+    """liveness: the process is up and serving its event loop"""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz(response: Response) -> dict[str, Any]:
+    """readiness: every resource is created and warmed up. 503 until then."""
+    ready = registry.ready()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": ready, "resources": registry.status()}
+
+
+@router.get("/metrics")
+async def metrics() -> dict[str, Any]:
+    vector_db = registry.peek("vector_db")
+    return {
+        "embedding_batcher": embedding_batcher.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "executors": executors.stats(),
+        "search_cache": search_cache.stats(),
+        "semantic_cache": semantic_cache.stats() if semantic_cache else {},
+        "vector_db": vector_db.stats() if vector_db is not None else {},
+    }
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, conlist
 
 from podcasts_backend.models.models import EpisodeModel, Podcast
 
@@ -7,6 +7,8 @@ class EpisodeMetadata(BaseModel):
     podcast_id: int
     category: str | None
     language: str | None
+    datePublished: int | None = None
+    duration: int | None = None
 
 
 # milvus queries
@@ -20,18 +22,41 @@ class EpisodeVector(Episode):
     embedding: list[float]
 
 
-class EpisodeVectorWithScore(EpisodeVector):
+class EpisodeWithScore(BaseModel):
+    id: int
     score: float
+    metadata: EpisodeMetadata
+    text: str | None = None
+
+
+class EpisodeVectorWithScore(EpisodeWithScore):
+    embedding: list[float]
 
 
 class EpisodeModelWithScore(EpisodeModel):
     score: float
 
 
+class NumericRange(BaseModel):
+    gte: int | None = None
+    gt: int | None = None
+    lte: int | None = None
+    lt: int | None = None
+
+
 class EpisodeMetadataFilter(BaseModel):
     podcast_id: int | None
     category: str | None
     language: str | None
+    # any of the values, e.g. the podcasts a user follows
+    podcast_ids: conlist(int, min_items=1) | None = None  # type: ignore
+    categories: conlist(str, min_items=1) | None = None  # type: ignore
+    languages: conlist(str, min_items=1) | None = None  # type: ignore
+    # none of the values, e.g. podcasts already shown
+    exclude_podcast_ids: conlist(int, min_items=1) | None = None  # type: ignore
+    # unix timestamp and seconds
+    datePublished: NumericRange | None = None
+    duration: NumericRange | None = None
 
 
 class Query(BaseModel):
@@ -46,7 +71,39 @@ class QueryWithEmbedding(Query):
 
 class QueryResult(BaseModel):
     query: str
-    results: list[EpisodeVectorWithScore]
+    # EpisodeVectorWithScore items when the stored vectors were requested
+    results: list[EpisodeWithScore]
+
+
+class EpisodeGroup(BaseModel):
+    podcast_id: int
+    # best first
+    results: list[EpisodeWithScore]
+
+
+class GroupedQueryResult(BaseModel):
+    query: str
+    # by best score of the group
+    groups: list[EpisodeGroup]
+
+
+class SemanticSearchQuery(Query):
+    # up to this many episodes for each of the top_k best podcasts, None for the
+    # top_k best episodes whatever their podcast
+    episodes_per_podcast: int | None = Field(default=None, ge=1, le=50)
+    # return a cursor to the next page, top_k is then the page size
+    paginate: bool = False
+    # next_cursor of the previous page, sent with the same query
+    cursor: str | None = None
+
+
+class SearchResultWindow(BaseModel):
+    """results of a paginated search, kept for the pages after the first"""
+
+    # number of groups searched for, more may exist when groups has that many
+    size: int
+    # one group per episode, or per podcast with episodes_per_podcast
+    groups: list[EpisodeGroup]
 
 
 class ResponseQueryResult(BaseModel):
@@ -60,3 +117,15 @@ class SemanticSearchByEpisodeDescriptionResult(BaseModel):
 
 class SemanticSearchByEpisodeDescriptionResults(BaseModel):
     results: list[SemanticSearchByEpisodeDescriptionResult]
+    # set for paginated searches with more results
+    next_cursor: str | None = None
+
+
+class BatchSemanticSearchQuery(BaseModel):
+    # without pagination, e.g. the carousels of a page
+    queries: conlist(SemanticSearchQuery, min_items=1, max_items=64)  # type: ignore
+
+
+class BatchSemanticSearchResults(BaseModel):
+    # in the order of the queries
+    results: list[SemanticSearchByEpisodeDescriptionResults]
@@ -9,9 +9,10 @@ from passlib.context import CryptContext
 
 from ..models.auth import TokenData
 from ..models.models import UserTable
-from ..repository.db.postgres import engine
+from ..repository.db.postgres import get_engine
 from ..repository.users import UserRepository
 from ..schemas.users import User, UserInput, UserOutputWithId
+from .executors import run_blocking
 
 SECRET_KEY = os.getenv("ACCESS_TOKEN_SECRET_KEY") or ""
 ALGORITHM = os.getenv("ACCESS_TOKEN_ALGORITHM") or ""
@@ -23,32 +24,36 @@ assert ALGORITHM != "", "ACCESS_TOKEN_ALGORITHM environment variable must be set
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-repository = UserRepository(engine)
 
+def get_user_repository() -> UserRepository:
+    return UserRepository(get_engine())
 
-def create_user(obj: UserInput) -> bool:
+
+async def create_user(obj: UserInput) -> bool:
     try:
         user = User(
             username=obj.username,
             email=obj.email,
-            password_hash=get_password_hash(obj.password),
+            password_hash=await run_blocking(get_password_hash, obj.password),
         )
-        repository.add_user(user)
+        await run_blocking(get_user_repository().add_user, user)
         return True
     except ValueError:
         raise HTTPException(status_code=400, detail="User already exists")
 
 
-def authenticate_user(username: str, password: str) -> UserTable:
-    user = repository.get_user(username)
+async def authenticate_user(username: str, password: str) -> UserTable:
+    user = await run_blocking(get_user_repository().get_user, username)
     if not user:
         raise HTTPException(status_code=400, detail="User not found")
-    if not verify_password(password, user.password_hash):
+    if not await run_blocking(verify_password, password, user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect password")
     return user
 
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> UserOutputWithId:
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)]
+) -> UserOutputWithId:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -66,7 +71,7 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> UserOutpu
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = repository.get_user(token_data.username)
+    user = await run_blocking(get_user_repository().get_user, token_data.username)
     if user is None:
         raise credentials_exception
     user_output = UserOutputWithId(**user.dict())
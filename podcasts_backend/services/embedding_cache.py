@@ -0,0 +1,276 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from uuid import uuid4
+
+import numpy as np
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE") or 10000)
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR")
+
+KEY_SIZE = hashlib.sha256().digest_size
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """content address of an embedding: hash of the model name and the exact text"""
+    return hashlib.sha256(f"{model_name}\0{text}".encode()).digest()
+
+
+class DiskEmbeddingStore:
+    """Append-only store of float32 embedding rows, memory-mapped from disk.
+
+    The directory holds `vectors.f32` (a row-major float32 matrix), `keys.bin`
+    (one fixed size key per row, in row order) and `meta.json` (model name and
+    dimension). A row is written before its key, so a crash never leaves a key
+    pointing at a half written vector; a key cut short by a crash is truncated
+    before the next append. Processes sharing the directory (e.g. server
+    workers) append under an exclusive lock on `lock`, after indexing the rows
+    the others appended, so no two of them write the same row.
+    """
+
+    def __init__(self, path: str | Path, model_name: str, dim: int) -> None:
+        self.path = Path(path)
+        self.model_name = model_name
+        self.dim = dim
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.index: dict[bytes, int] = {}
+        self.rows = 0
+        self._vectors: np.memmap | None = None
+        self._capacity = 0
+        # stamped in meta.json by every clear, so a store another process
+        # cleared is reindexed from scratch
+        self._store_id: str | None = None
+
+        with self._locked():
+            meta = self._read_meta() or {}
+            if (meta.get("model"), meta.get("dim")) != (model_name, dim):
+                self._clear()
+            else:
+                self._sync()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        row = self.index.get(key)
+        if row is None:
+            return None
+        return np.array(self._vectors[row])  # type: ignore
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        with self._locked():
+            self._sync()
+            new = list(
+                {
+                    key: vector
+                    for key, vector in zip(keys, vectors)
+                    if key not in self.index
+                }.items()
+            )
+            if not new:
+                return
+            if self.rows + len(new) > self._capacity:
+                self._open(max(self._capacity * 2, self.rows + len(new)))
+
+            start = self.rows
+            for offset, (_, vector) in enumerate(new):
+                self._vectors[start + offset] = vector  # type: ignore
+            self._vectors.flush()  # type: ignore
+            with open(self.path / "keys.bin", "ab") as f:
+                f.write(b"".join(key for key, _ in new))
+            for offset, (key, _) in enumerate(new):
+                self.index[key] = start + offset
+            self.rows += len(new)
+
+    def clear(self) -> None:
+        """remove every stored row and stamp the store with the current model"""
+        with self._locked():
+            self._clear()
+
+    def _clear(self) -> None:
+        self._vectors = None
+        self._capacity = 0
+        # removed, not truncated: other processes may still map the old file
+        for name in ("vectors.f32", "keys.bin", "meta.json"):
+            (self.path / name).unlink(missing_ok=True)
+        (self.path / "keys.bin").touch()
+        self._store_id = uuid4().hex
+        (self.path / "meta.json").write_text(
+            json.dumps(
+                {"model": self.model_name, "dim": self.dim, "id": self._store_id}
+            )
+        )
+        self.index = {}
+        self.rows = 0
+        self._open(1024)
+
+    def _sync(self) -> None:
+        """index the rows appended since the last sync, by any process. Holds the
+        lock, so a key cut short can only come from a crashed append."""
+        store_id = (self._read_meta() or {}).get("id")
+        if store_id != self._store_id:
+            # first sync, or another process cleared the store
+            self.index = {}
+            self.rows = 0
+            self._vectors = None
+            self._capacity = 0
+            self._store_id = store_id  # type: ignore
+        keys_path = self.path / "keys.bin"
+        size = keys_path.stat().st_size
+        rows = size // KEY_SIZE
+        if size % KEY_SIZE:
+            # later keys would be misaligned; the vector rows past the last key
+            # are unused and get overwritten by the next append
+            with open(keys_path, "r+b") as f:
+                f.truncate(rows * KEY_SIZE)
+        if rows > self.rows:
+            with open(keys_path, "rb") as f:
+                f.seek(self.rows * KEY_SIZE)
+                keys = f.read((rows - self.rows) * KEY_SIZE)
+            for offset in range(rows - self.rows):
+                key = keys[offset * KEY_SIZE : (offset + 1) * KEY_SIZE]
+                self.index[key] = self.rows + offset
+            self.rows = rows
+        if self._vectors is None or self.rows > self._capacity:
+            self._open(max(self.rows, 2 * self._capacity, 1024))
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(self.path / "lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> dict[str, str | int] | None:
+        try:
+            return json.loads((self.path / "meta.json").read_text())  # type: ignore
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _open(self, capacity: int) -> None:
+        vectors_path = self.path / "vectors.f32"
+        size = capacity * self.dim * np.dtype(np.float32).itemsize
+        with open(vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(
+            vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim)
+        )
+        self._capacity = capacity
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache.
+
+    Lookups go to a bounded in-memory LRU first and then, if configured, to a
+    persistent `DiskEmbeddingStore` that survives restarts, opened on first use
+    so that processes only running the model (the embedding workers import this
+    module too) never open it. Keys hash the model name together with the text,
+    so a model change never serves stale vectors; call `invalidate` to also drop
+    the old rows.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        dim: int,
+        max_size: int = EMBEDDING_CACHE_SIZE,
+        path: str | Path | None = EMBEDDING_CACHE_DIR,
+    ) -> None:
+        self.model_name = model_name
+        self.dim = dim
+        self.max_size = max_size
+        self.path = path
+        self._disk: DiskEmbeddingStore | None = None
+
+        self._memory: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def disk(self) -> DiskEmbeddingStore | None:
+        if self._disk is None and self.path is not None:
+            self._disk = DiskEmbeddingStore(self.path, self.model_name, self.dim)
+        return self._disk
+
+    def get_many(self, texts: list[str]) -> tuple[list[np.ndarray | None], list[bytes]]:
+        """look up cached embeddings
+
+        Args:
+            texts (list[str]): texts to look up
+
+        Returns:
+            tuple[list[np.ndarray | None], list[bytes]]: embedding or None for every
+            text, and the cache keys of the texts
+        """
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found: list[np.ndarray | None] = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                elif (
+                    self.disk is not None and (vector := self.disk.get(key)) is not None
+                ):
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                found.append(vector)
+        return found, keys
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+            if self.disk is not None:
+                self.disk.put_many(keys, vectors)
+
+    def invalidate(self, model_name: str | None = None) -> None:
+        """drop every cached embedding, e.g. after switching the embedding model
+
+        Args:
+            model_name (str | None, optional): new model name to key entries with.
+        """
+        with self._lock:
+            if model_name is not None:
+                self.model_name = model_name
+            self._memory.clear()
+            if self.disk is not None:
+                self.disk.model_name = self.model_name
+                self.disk.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._memory),
+            "disk_size": len(self.disk) if self.disk is not None else 0,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        # a row view would keep the whole batch matrix alive
+        self._memory[key] = vector.copy()
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
@@ -1,19 +1,326 @@
 # mypy: allow-untyped-defs
+import asyncio
+import os
+import threading
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
-# TODO: implement Ray serve
-# TODO: cache folder from config
-model = SentenceTransformer("all-mpnet-base-v2", cache_folder="/podcasts_data")
+from ..resources import registry
+from .embedding_cache import EmbeddingCache
+from .executors import ExecutorPools, executors, run_embedding
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL") or "all-mpnet-base-v2"
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM") or 768)
+EMBEDDING_MAX_BATCH_SIZE = int(os.environ.get("EMBEDDING_MAX_BATCH_SIZE") or 64)
+EMBEDDING_MAX_WAIT_MS = float(os.environ.get("EMBEDDING_MAX_WAIT_MS") or 5)
+EMBEDDING_CHUNK_SIZE = int(os.environ.get("EMBEDDING_CHUNK_SIZE") or 256)
+
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL, EMBEDDING_DIM)
+
+_model: SentenceTransformer | None = None
+_model_lock = threading.Lock()
+
+
+def get_model() -> SentenceTransformer:
+    """load the model on first use, in whichever process runs inference"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            # TODO: implement Ray serve
+            # TODO: cache folder from config
+            _model = SentenceTransformer(EMBEDDING_MODEL, cache_folder="/podcasts_data")
+        return _model
+
+
+def encode(texts: list[str]) -> np.ndarray:
+    """run the model on texts, bypassing the cache. Runs in the embedding pool.
+
+    Args:
+        texts (list[str]): texts to encode
+
+    Returns:
+        np.ndarray: one float32 embedding row per text
+    """
+    embeddings = get_model().encode(texts, convert_to_numpy=True)
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
 
+def _uncached(
+    texts: list[str],
+) -> tuple[list[np.ndarray | None], list[bytes], list[str]]:
+    """look texts up in the cache, returns cached embeddings, cache keys and the
+    distinct texts that still need to be encoded"""
+    embeddings, keys = embedding_cache.get_many(texts)
+    missing = [text for text, embedding in zip(texts, embeddings) if embedding is None]
+    return embeddings, keys, list(dict.fromkeys(missing))
 
-def get_embeddings(descriptions: list[str]) -> list[list[float]]:
-    """get embeddings for a list od episode descriptions
+
+def _fill(
+    texts: list[str],
+    embeddings: list[np.ndarray | None],
+    keys: list[bytes],
+    missing: list[str],
+    encoded: np.ndarray,
+) -> np.ndarray:
+    """complete the cache lookup with freshly encoded vectors and store them"""
+    if missing:
+        row_by_text = {text: row for row, text in enumerate(missing)}
+        new = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        for i in new:
+            embeddings[i] = encoded[row_by_text[texts[i]]]
+        embedding_cache.put_many(
+            [keys[i] for i in new], encoded[[row_by_text[texts[i]] for i in new]]
+        )
+    if not embeddings:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    return np.stack(embeddings).astype(np.float32, copy=False)  # type: ignore
+
+
+def get_embeddings(descriptions: list[str]) -> np.ndarray:
+    """get embeddings for a list od episode descriptions, encoding in the calling
+    thread.
 
     Args:
         descriptions (list[str]): list of episode descriptions
 
     Returns:
-        list[float]: list of descriptions
+        np.ndarray: contiguous float32 matrix, one row per description
     """
-    embeddings = model.encode(descriptions, convert_to_numpy=True)
-    return embeddings.tolist()  # type: ignore
+    embeddings, keys, missing = _uncached(descriptions)
+    encoded = encode(missing) if missing else np.empty(0)
+    return _fill(descriptions, embeddings, keys, missing, encoded)
+
+
+async def embed_texts(descriptions: list[str]) -> np.ndarray:
+    """get embeddings for a list of texts, encoding in the embedding pool
+
+    Args:
+        descriptions (list[str]): list of texts
+
+    Returns:
+        np.ndarray: contiguous float32 matrix, one row per text
+    """
+    embeddings, keys, missing = _uncached(descriptions)
+    encoded = await run_embedding(encode, missing) if missing else np.empty(0)
+    return _fill(descriptions, embeddings, keys, missing, encoded)
+
+
+def token_lengths(texts: list[str]) -> list[int]:
+    """number of tokens the model will see for every text, after truncation
+
+    Args:
+        texts (list[str]): texts to measure
+
+    Returns:
+        list[int]: token count of every text
+    """
+    model = get_model()
+    tokenized = model.tokenizer(
+        texts,
+        add_special_tokens=False,
+        truncation=True,
+        max_length=model.max_seq_length,
+    )
+    return [len(ids) for ids in tokenized["input_ids"]]
+
+
+@dataclass
+class _EmbeddingRequest:
+    texts: list[str]
+    future: asyncio.Future[np.ndarray]
+
+
+@dataclass
+class _BatcherStats:
+    batches: int = 0
+    texts: int = 0
+    requests: int = 0
+    max_batch_size: int = 0
+    batch_size_histogram: dict[int, int] = field(default_factory=dict)
+
+
+class EmbeddingBatcher:
+    """Merges concurrent embedding requests into a single `encode` call.
+
+    Requests are queued and flushed as one batch as soon as `max_batch_size` texts
+    are waiting or the oldest request has waited `max_wait_ms`. While a batch is
+    being encoded new requests keep queueing, so under load batches grow on their
+    own.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[list[str]], Awaitable[np.ndarray]],
+        max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+        max_wait_ms: float = EMBEDDING_MAX_WAIT_MS,
+    ) -> None:
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._pending: list[_EmbeddingRequest] = []
+        self._queued_texts = 0
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task[None] | None = None
+        self._stats = _BatcherStats()
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        """queue texts for the next batch and wait for their embeddings
+
+        Args:
+            texts (list[str]): texts to embed
+
+        Returns:
+            np.ndarray: float32 embeddings, one row per text, in order
+        """
+        if not texts:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        self._ensure_worker()
+        request = _EmbeddingRequest(texts=texts, future=loop.create_future())
+        self._pending.append(request)
+        self._queued_texts += len(texts)
+        self._wakeup.set()  # type: ignore
+        return await request.future
+
+    async def close(self) -> None:
+        """stop the background worker, failing any request still queued."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for request in self._pending:
+            if not request.future.done():
+                request.future.set_exception(RuntimeError("Embedding batcher closed"))
+        self._pending = []
+        self._queued_texts = 0
+
+    def stats(self) -> dict[str, float | int | dict[int, int]]:
+        stats = self._stats
+        return {
+            "queue_depth": self._queued_texts,
+            "queued_requests": len(self._pending),
+            "batches": stats.batches,
+            "requests": stats.requests,
+            "texts": stats.texts,
+            "avg_batch_size": stats.texts / stats.batches if stats.batches else 0.0,
+            "max_batch_size": stats.max_batch_size,
+            "batch_size_histogram": dict(sorted(stats.batch_size_histogram.items())),
+        }
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    def _take_batch(self) -> list[_EmbeddingRequest]:
+        # always take at least one request, even if it alone exceeds the batch size
+        batch: list[_EmbeddingRequest] = []
+        size = 0
+        while self._pending and (
+            not batch or size + len(self._pending[0].texts) <= self.max_batch_size
+        ):
+            request = self._pending.pop(0)
+            batch.append(request)
+            size += len(request.texts)
+        self._queued_texts -= size
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeup
+        assert wakeup is not None
+        while True:
+            await wakeup.wait()
+            deadline = loop.time() + self.max_wait
+            while self._queued_texts < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = self._take_batch()
+            if not self._pending:
+                wakeup.clear()
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: list[_EmbeddingRequest]) -> None:
+        texts = [text for request in batch for text in request.texts]
+        self._record(batch, len(texts))
+        try:
+            embeddings = await self.encode(texts)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            end = offset + len(request.texts)
+            if not request.future.done():
+                request.future.set_result(embeddings[offset:end])
+            offset = end
+
+    def _record(self, batch: list[_EmbeddingRequest], size: int) -> None:
+        stats = self._stats
+        stats.batches += 1
+        stats.requests += len(batch)
+        stats.texts += size
+        stats.max_batch_size = max(stats.max_batch_size, size)
+        # bucket by powers of two so the histogram stays small
+        bucket = 1 << (size - 1).bit_length()
+        stats.batch_size_histogram[bucket] = (
+            stats.batch_size_histogram.get(bucket, 0) + 1
+        )
+
+
+embedding_batcher = EmbeddingBatcher(embed_texts)
+
+
+async def embed_length_sorted(
+    texts: list[str], chunk_size: int = EMBEDDING_CHUNK_SIZE
+) -> np.ndarray:
+    """embed a large list of texts in chunks of similar token length, so every
+    forward pass pads as little as possible.
+
+    Args:
+        texts (list[str]): texts to embed
+        chunk_size (int, optional): number of texts per encode call.
+
+    Returns:
+        np.ndarray: float32 embeddings, one row per text, in input order
+    """
+    lengths = await run_embedding(token_lengths, texts)
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+    embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for start in range(0, len(order), chunk_size):
+        chunk = order[start : start + chunk_size]
+        # scatter the chunk back into input order
+        embeddings[chunk] = await embedding_batcher.embed([texts[i] for i in chunk])
+    return embeddings
+
+
+def start_embedding_pool() -> ExecutorPools:
+    executors.start()
+    return executors
+
+
+async def warm_up_embedding_pool(pool: ExecutorPools) -> None:
+    """load the model in the inference workers with a dummy encode"""
+    await pool.run_embedding(encode, ["warm up"])
+
+
+registry.register("embeddings", start_embedding_pool, warm_up=warm_up_embedding_pool)
@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import importlib
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+# processes running model inference, 0 runs it on a thread of the blocking pool
+EMBEDDING_WORKERS = int(os.environ.get("EMBEDDING_WORKERS") or 1)
+# threads for bcrypt and synchronous database calls
+BLOCKING_WORKERS = int(os.environ.get("BLOCKING_WORKERS") or 16)
+
+
+def _init_embedding_worker(num_threads: int) -> None:
+    """load the model once per worker process and share the cores between them"""
+    import torch
+
+    torch.set_num_threads(num_threads)
+    importlib.import_module("podcasts_backend.services.embeddings").get_model()
+
+
+class ExecutorPools:
+    """Keeps CPU-bound and blocking work off the event loop.
+
+    Embedding inference goes to a process pool, so it neither holds the GIL nor
+    competes with request handling; bcrypt and synchronous database calls go to
+    a bounded thread pool. Pools are started and stopped with the application
+    lifespan, and started lazily if used outside of it (scripts, benchmarks).
+    """
+
+    def __init__(
+        self,
+        embedding_workers: int = EMBEDDING_WORKERS,
+        blocking_workers: int = BLOCKING_WORKERS,
+    ) -> None:
+        self.embedding_workers = embedding_workers
+        self.blocking_workers = blocking_workers
+        self._embedding_pool: Executor | None = None
+        self._blocking_pool: ThreadPoolExecutor | None = None
+        self._in_flight = {"embedding": 0, "blocking": 0}
+
+    def start(self) -> None:
+        if self._blocking_pool is None:
+            self._blocking_pool = ThreadPoolExecutor(
+                max_workers=self.blocking_workers, thread_name_prefix="blocking"
+            )
+        if self._embedding_pool is None:
+            if self.embedding_workers > 0:
+                threads = max(1, (os.cpu_count() or 1) // self.embedding_workers)
+                # torch is not fork safe once its thread pools are running
+                self._embedding_pool = ProcessPoolExecutor(
+                    max_workers=self.embedding_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_embedding_worker,
+                    initargs=(threads,),
+                )
+            else:
+                self._embedding_pool = self._blocking_pool
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._embedding_pool is not None:
+            self._embedding_pool.shutdown(wait=wait, cancel_futures=True)
+        if self._blocking_pool is not None:
+            self._blocking_pool.shutdown(wait=wait, cancel_futures=True)
+        self._embedding_pool = None
+        self._blocking_pool = None
+
+    async def run_embedding(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """run a picklable, module level function in the embedding pool"""
+        self.start()
+        return await self._run(
+            "embedding", self._embedding_pool, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def run_blocking(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """run a blocking function (bcrypt, database session) in the thread pool"""
+        self.start()
+        return await self._run(
+            "blocking", self._blocking_pool, functools.partial(fn, *args, **kwargs)
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "embedding_workers": self.embedding_workers,
+            "blocking_workers": self.blocking_workers,
+            "embedding_in_flight": self._in_flight["embedding"],
+            "blocking_in_flight": self._in_flight["blocking"],
+        }
+
+    async def _run(self, name: str, pool: Executor | None, fn: Callable[[], T]) -> T:
+        self._in_flight[name] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn)
+        finally:
+            self._in_flight[name] -= 1
+
+
+executors = ExecutorPools()
+run_embedding = executors.run_embedding
+run_blocking = executors.run_blocking
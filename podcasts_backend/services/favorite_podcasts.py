@@ -1,20 +1,46 @@
+import asyncio
+import base64
+import json
 import math
+import os
+from collections import deque
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
 
+import numpy as np
 from fastapi import HTTPException
 
-from ..models.models import Podcast, PodcastTable
+from ..models.models import EpisodeTable, Podcast, PodcastTable
 from ..repository.db.postgres import (
-    favorite_podcasts_repository,
-    milvus_db,
-    podcast_repository,
+    get_favorite_podcasts_repository,
+    get_podcast_repository,
+    get_vector_db,
 )
+from ..resources import ResourceNotReadyError
 from ..schemas.schemas import (
+    BatchSemanticSearchQuery,
+    BatchSemanticSearchResults,
+    EpisodeGroup,
     EpisodeModelWithScore,
-    Query,
+    EpisodeWithScore,
+    SearchResultWindow,
     SemanticSearchByEpisodeDescriptionResult,
     SemanticSearchByEpisodeDescriptionResults,
+    SemanticSearchQuery,
 )
 from ..schemas.users import UserOutputWithId
+from .embeddings import embedding_batcher
+from .executors import run_blocking
+from .search_cache import search_cache, search_cache_key, semantic_cache
+
+# pages searched at once by a paginated search, the next ones are only hydrated
+SEMANTIC_SEARCH_WINDOW_PAGES = int(os.environ.get("SEMANTIC_SEARCH_WINDOW_PAGES") or 5)
+# results (episodes, or podcasts with episodes_per_podcast) a cursor can reach
+SEMANTIC_SEARCH_MAX_RESULTS = int(os.environ.get("SEMANTIC_SEARCH_MAX_RESULTS") or 1000)
+# podcasts of a streamed search hydrated per database query, and queries ahead
+# of the lines being sent
+STREAM_HYDRATE_CHUNK = int(os.environ.get("STREAM_HYDRATE_CHUNK") or 10)
+STREAM_HYDRATE_AHEAD = int(os.environ.get("STREAM_HYDRATE_AHEAD") or 2)
 
 
 async def add_podcast_to_favorites(podcast_id: int, user: UserOutputWithId) -> bool:
@@ -32,8 +58,10 @@ async def add_podcast_to_favorites(podcast_id: int, user: UserOutputWithId) -> b
         bool: True if podcast added, false if podcast already in favorites
     """
     try:
-        return favorite_podcasts_repository.add_podcast_to_favorites(
-            user.id, podcast_id
+        return await run_blocking(
+            get_favorite_podcasts_repository().add_podcast_to_favorites,
+            user.id,
+            podcast_id,
         )
     except ValueError:
         raise HTTPException(status_code=404, detail="User or podcast not found")
@@ -41,7 +69,9 @@ async def add_podcast_to_favorites(podcast_id: int, user: UserOutputWithId) -> b
 
 async def list_favorite_podcasts_of_user(user: UserOutputWithId) -> list[PodcastTable]:
     try:
-        return favorite_podcasts_repository.list_favorite_podcasts_of_user(user.id)
+        return await run_blocking(
+            get_favorite_podcasts_repository().list_favorite_podcasts_of_user, user.id
+        )
     except ValueError:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -60,21 +90,147 @@ async def delete_podcast_from_favorites(
         bool: True if podcast deleted, False if podcast not in favorites
     """
     try:
-        return favorite_podcasts_repository.remove_podcast_from_favorites(
-            user.id, podcast_id
+        return await run_blocking(
+            get_favorite_podcasts_repository().remove_podcast_from_favorites,
+            user.id,
+            podcast_id,
         )
     except ValueError:
         raise HTTPException(status_code=404, detail="User or podcast not found")
 
 
+@contextmanager
+def search_errors() -> Iterator[None]:
+    """a failed search as an http 500 with the error message. HTTPExceptions and
+    ResourceNotReadyError (a 503 while starting up) pass through unchanged."""
+    try:
+        yield
+    except (HTTPException, ResourceNotReadyError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def hydrate(
+    results: list[EpisodeWithScore],
+) -> list[tuple[EpisodeTable, PodcastTable, float]]:
+    """the episode and podcast of every vector search hit, in one database query
+
+    Hits whose episode is no longer in the database are dropped.
+    """
+    return (await hydrate_many([results]))[0]
+
+
+async def hydrate_many(
+    results: list[list[EpisodeWithScore]],
+) -> list[list[tuple[EpisodeTable, PodcastTable, float]]]:
+    """the hits of several searches hydrated together, in one database query that
+    fetches every episode once, however many searches found it"""
+    rows = await run_blocking(
+        get_podcast_repository().get_episodes_with_podcasts,
+        list(dict.fromkeys(episode.id for hits in results for episode in hits)),
+    )
+    by_id = {episode.episode_id: (episode, podcast) for episode, podcast in rows}
+    return [
+        [(*by_id[episode.id], episode.score) for episode in hits if episode.id in by_id]
+        for hits in results
+    ]
+
+
+def group_results(
+    hits: list[tuple[EpisodeTable, PodcastTable, float]]
+) -> list[SemanticSearchByEpisodeDescriptionResult]:
+    """hydrated hits grouped by podcast, podcasts and episodes by best score"""
+    podcast_results: dict[int, list[EpisodeModelWithScore]] = {}
+    best_scores_by_podcast: dict[int, float] = {}
+    podcast_model_by_id: dict[int, Podcast] = {}
+    for episode_table, podcast_table, score in hits:
+        # convert tables to models for output
+        podcast_model = Podcast(**podcast_table.__dict__)
+        episode_model = EpisodeModelWithScore(**episode_table.dict(), score=score)
+        # result dictionaries operations
+        if podcast_table.podcast_id not in podcast_results:
+            podcast_results[podcast_table.podcast_id] = []
+            best_scores_by_podcast[podcast_table.podcast_id] = math.inf
+            podcast_model_by_id[podcast_model.podcast_id] = podcast_model
+
+        podcast_results[podcast_table.podcast_id].append(episode_model)
+        best_scores_by_podcast[podcast_table.podcast_id] = min(
+            best_scores_by_podcast[podcast_table.podcast_id], score
+        )
+
+    # sort groups by best score
+    podcast_results_tuples = sorted(
+        podcast_results.items(),
+        key=lambda x: best_scores_by_podcast[x[0]],
+    )
+    # sort episodes by score
+    formatted_podcast_result_tuples = [
+        (podcast_model_by_id[podcast_id], sorted(episodes, key=lambda x: x.score))
+        for (podcast_id, episodes) in podcast_results_tuples
+    ]
+
+    # format output
+    output = []
+    for podcast, episodes in formatted_podcast_result_tuples:
+        output_element = SemanticSearchByEpisodeDescriptionResult(
+            podcast=podcast,
+            relevant_episodes=episodes,
+        )
+
+        output.append(output_element)
+
+    return output
+
+
 async def semantic_search_by_episode_description(
-    query: Query,
+    query: SemanticSearchQuery,
+) -> SemanticSearchByEpisodeDescriptionResults:
+    """semantic search by episode description, returns a list of podcasts with their
+    relevant episodes. Sorted by best score. Served from the search cache when
+    the same query, or one with a nearby embedding, was answered recently and no
+    episode was added since.
+
+    Args:
+        query (SemanticSearchQuery): search query, see `_semantic_search`. With
+            paginate or a cursor, a page of top_k results and the next cursor.
+
+    Returns:
+        SemanticSearchByEpisodeDescriptionResults: list of podcasts with relevant
+        episodes, sorted by best scores.
+    """
+    if query.paginate or query.cursor:
+        return await _search_paginated(query)
+    return await search_cache.get_or_search(
+        query,
+        lambda: _search_near_duplicates(query),
+        SemanticSearchByEpisodeDescriptionResults,
+    )
+
+
+async def _search_near_duplicates(
+    query: SemanticSearchQuery,
+) -> SemanticSearchByEpisodeDescriptionResults:
+    """the results of a cached rephrasing of the query, or a search"""
+    if semantic_cache is None:
+        return await _semantic_search(query)
+    embedding = (await embedding_batcher.embed([query.query]))[0]
+    return await semantic_cache.get_or_search(
+        query, embedding, lambda: _semantic_search(query, embedding)
+    )
+
+
+async def _semantic_search(
+    query: SemanticSearchQuery, embedding: np.ndarray | None = None
 ) -> SemanticSearchByEpisodeDescriptionResults:
     """semantic search by episode description, returns a list of podcasts with their
     relevant episodes. Sorted by best score.
 
     Args:
-        query (Query): search query, with optional filters
+        query (SemanticSearchQuery): search query, with optional filters. With
+            episodes_per_podcast, the top_k best podcasts with up to that many
+            episodes each, otherwise the top_k best episodes.
+        embedding (np.ndarray | None): embedding of the query, if already known
 
     Raises:
         HTTPException: http 500, if query failed.
@@ -83,54 +239,249 @@ async def semantic_search_by_episode_description(
         SemanticSearchByEpisodeDescriptionResults: list of podcasts with relevant
         episodes, sorted by best scores.
     """
-    try:
-        query_result = (await milvus_db.query([query]))[0]
-
-        podcast_results: dict[int, list[EpisodeModelWithScore]] = {}
-        best_scores_by_podcast: dict[int, float] = {}
-        podcast_model_by_id: dict[int, Podcast] = {}
-        for episode in query_result.results:
-            # get podcast and episode from db
-            podcast_table = podcast_repository.get_podcast_from_episode_id(episode.id)
-            episode_table = podcast_repository.get_episode(episode.id)
-            # convert tables to models for output
-            podcast_model = Podcast(**podcast_table.__dict__)
-            episode_model = EpisodeModelWithScore(
-                **episode_table.dict(), score=episode.score
+    with search_errors():
+        vector_db = get_vector_db()
+        if query.episodes_per_podcast:
+            # grouped in the vector search, a prolific podcast takes one slot
+            grouped = await vector_db.query_grouped(
+                query, query.episodes_per_podcast, embedding
             )
-            # result dictionaries operations
-            if podcast_table.podcast_id not in podcast_results:
-                podcast_results[podcast_table.podcast_id] = []
-                best_scores_by_podcast[podcast_table.podcast_id] = math.inf
-                podcast_model_by_id[podcast_model.podcast_id] = podcast_model
-
-            podcast_results[podcast_table.podcast_id].append(episode_model)
-            best_scores_by_podcast[podcast_table.podcast_id] = min(
-                best_scores_by_podcast[podcast_table.podcast_id], episode.score
+            hits = await hydrate(
+                [episode for group in grouped.groups for episode in group.results]
             )
+        else:
+            hits = await vector_db.search_episodes(query, hydrate, embedding)
+
+        return SemanticSearchByEpisodeDescriptionResults(results=group_results(hits))
+
+
+def encode_cursor(window: str, offset: int) -> str:
+    cursor = json.dumps({"window": window, "offset": offset}).encode()
+    return base64.urlsafe_b64encode(cursor).decode()
+
 
-        # sort groups by best score
-        podcast_results_tuples = sorted(
-            podcast_results.items(),
-            key=lambda x: best_scores_by_podcast[x[0]],
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """window key and offset of a cursor, HTTPException 400 if it is malformed"""
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        window, offset = str(decoded["window"]), int(decoded["offset"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return window, offset
+
+
+async def search_window(query: SemanticSearchQuery, size: int) -> SearchResultWindow:
+    """the first size results of a query, as groups: one per podcast with
+    episodes_per_podcast, one per episode otherwise"""
+    vector_db = get_vector_db()
+    window_query = query.copy(update={"top_k": size})
+    if query.episodes_per_podcast:
+        grouped = await vector_db.query_grouped(
+            window_query, query.episodes_per_podcast
         )
-        # sort episodes by score
-        formatted_podcast_result_tuples = [
-            (podcast_model_by_id[podcast_id], sorted(episodes, key=lambda x: x.score))
-            for (podcast_id, episodes) in podcast_results_tuples
+        return SearchResultWindow(size=size, groups=grouped.groups)
+    result = (await vector_db.query([window_query]))[0]
+    return SearchResultWindow(
+        size=size,
+        groups=[
+            EpisodeGroup(podcast_id=episode.metadata.podcast_id, results=[episode])
+            for episode in result.results
+        ],
+    )
+
+
+async def search_page(
+    query: SemanticSearchQuery,
+) -> tuple[list[EpisodeGroup], str | None]:
+    """the groups of the page at the query's cursor, and the next page's cursor
+
+    The first page searches SEMANTIC_SEARCH_WINDOW_PAGES pages at once and keeps
+    them in the search cache, the cursor names that window, so the next pages
+    are sliced from it without a vector search. Past the window, or once it
+    expired or was invalidated by an ingest, the search runs again up to the
+    end of the requested page. The window is always the one of the query, a
+    cursor only gives the offset and must come from the same query.
+
+    Args:
+        query (SemanticSearchQuery): search query, top_k is the page size
+
+    Raises:
+        HTTPException: http 400, if the cursor is malformed or from another query
+
+    Returns:
+        tuple[list[EpisodeGroup], str | None]: groups of the page, cursor of the
+        next page if there may be one
+    """
+    # every field but the page size and position
+    first_page = query.copy(update={"top_k": 0, "paginate": False, "cursor": None})
+    key, offset = "window:" + search_cache_key(first_page), 0
+    if query.cursor:
+        window_key, offset = decode_cursor(query.cursor)
+        if window_key != key:
+            raise HTTPException(status_code=400, detail="Cursor of another query")
+    end = min(offset + query.top_k, SEMANTIC_SEARCH_MAX_RESULTS)
+
+    generation, window = await search_cache.get(key, SearchResultWindow)
+    if window is None or (len(window.groups) < end and window.size < end):
+        size = max(end, offset + query.top_k * SEMANTIC_SEARCH_WINDOW_PAGES)
+        if window is not None:
+            # a client paging this far likely goes on, double the window
+            size = max(size, 2 * window.size)
+        size = min(size, SEMANTIC_SEARCH_MAX_RESULTS)
+        window = await search_window(query, size)
+        await search_cache.put(key, window, generation)
+
+    # a full window may be followed by more results
+    more = end < len(window.groups) or (
+        len(window.groups) == window.size and end < SEMANTIC_SEARCH_MAX_RESULTS
+    )
+    return window.groups[offset:end], encode_cursor(key, end) if more else None
+
+
+async def _search_paginated(
+    query: SemanticSearchQuery,
+) -> SemanticSearchByEpisodeDescriptionResults:
+    """a page of a semantic search, hydrated, with the cursor of the next one"""
+    with search_errors():
+        groups, next_cursor = await search_page(query)
+        hits = await hydrate([episode for group in groups for episode in group.results])
+        return SemanticSearchByEpisodeDescriptionResults(
+            results=group_results(hits), next_cursor=next_cursor
+        )
+
+
+def group_by_podcast(groups: list[EpisodeGroup]) -> list[list[EpisodeWithScore]]:
+    """the episodes of groups merged by podcast, by best score"""
+    by_podcast: dict[int, list[EpisodeWithScore]] = {}
+    for group in groups:
+        by_podcast.setdefault(group.podcast_id, []).extend(group.results)
+    return list(by_podcast.values())
+
+
+async def search_podcast_groups(
+    query: SemanticSearchQuery,
+) -> tuple[list[list[EpisodeWithScore]], str | None]:
+    """vector search of a streamed semantic search, the hits of every podcast by
+    best score and the next page's cursor when paginated. Nothing is hydrated.
+
+    Raises:
+        HTTPException: http 400 if the cursor is malformed, 500 if the search
+            failed
+    """
+    with search_errors():
+        if query.paginate or query.cursor:
+            groups, next_cursor = await search_page(query)
+        else:
+            groups, next_cursor = (await search_window(query, query.top_k)).groups, None
+        return group_by_podcast(groups), next_cursor
+
+
+async def stream_podcast_groups(
+    podcasts: list[list[EpisodeWithScore]], next_cursor: str | None
+) -> AsyncIterator[str]:
+    """NDJSON lines of a semantic search, one podcast with its episodes per line
+    in score order, then {"next_cursor": ...} when there is a next page
+
+    Podcasts are hydrated in order, STREAM_HYDRATE_CHUNK per query with up to
+    STREAM_HYDRATE_AHEAD queries in flight; the lines of a chunk are sent as
+    soon as it is hydrated.
+    """
+    chunks = iter(
+        [
+            podcasts[start : start + STREAM_HYDRATE_CHUNK]
+            for start in range(0, len(podcasts), STREAM_HYDRATE_CHUNK)
         ]
+    )
+    pending: deque[asyncio.Task] = deque()
 
-        # format output
-        output = []
-        for podcast, episodes in formatted_podcast_result_tuples:
-            output_element = SemanticSearchByEpisodeDescriptionResult(
-                podcast=podcast,
-                relevant_episodes=episodes,
-            )
+    def hydrate_ahead() -> None:
+        while len(pending) < STREAM_HYDRATE_AHEAD:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            pending.append(asyncio.create_task(hydrate_many(chunk)))
 
-            output.append(output_element)
+    try:
+        hydrate_ahead()
+        while pending:
+            hydrated = await pending.popleft()
+            hydrate_ahead()
+            for hits in hydrated:
+                for result in group_results(hits):
+                    yield result.json() + "\n"
+        if next_cursor is not None:
+            yield json.dumps({"next_cursor": next_cursor}) + "\n"
+    finally:
+        # the client went away, stop the remaining lookups
+        for task in pending:
+            task.cancel()
 
-        return SemanticSearchByEpisodeDescriptionResults(results=output)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=e)
+async def batch_semantic_search(
+    batch: BatchSemanticSearchQuery,
+) -> BatchSemanticSearchResults:
+    """semantic searches of several queries at once, e.g. the carousels of a page.
+    Queries answered recently come from the search cache; the others share one
+    forward pass of the model, as few vector searches as their filters allow and
+    one hydration query.
+
+    Args:
+        batch (BatchSemanticSearchQuery): queries, each with its own filters,
+            top_k and episodes_per_podcast
+
+    Raises:
+        HTTPException: http 400 if a query is paginated, 500 if a search failed.
+
+    Returns:
+        BatchSemanticSearchResults: results of every query, in order
+    """
+    if any(query.paginate or query.cursor for query in batch.queries):
+        raise HTTPException(status_code=400, detail="Batch searches can't be paginated")
+    results = await search_cache.get_or_search_many(
+        batch.queries, _batch_search, SemanticSearchByEpisodeDescriptionResults
+    )
+    return BatchSemanticSearchResults(results=results)
+
+
+async def _batch_search(
+    queries: list[SemanticSearchQuery],
+) -> list[SemanticSearchByEpisodeDescriptionResults]:
+    with search_errors():
+        vector_db = get_vector_db()
+        embeddings = await embedding_batcher.embed([query.query for query in queries])
+        plain = [i for i, query in enumerate(queries) if not query.episodes_per_podcast]
+        grouped = [i for i, query in enumerate(queries) if query.episodes_per_podcast]
+
+        # one call for the plain queries, the provider batches equal filters
+        searches = []
+        if plain:
+            searches.append(
+                vector_db.query(
+                    [queries[i] for i in plain], embeddings=embeddings[plain]
+                )
+            )
+        searches.extend(
+            vector_db.query_grouped(
+                queries[i],
+                queries[i].episodes_per_podcast,  # type: ignore
+                embedding=embeddings[i],
+            )
+            for i in grouped
+        )
+        searched = await asyncio.gather(*searches)
+
+        hits: list[list[EpisodeWithScore]] = [[] for _ in queries]
+        if plain:
+            for i, result in zip(plain, searched[0]):
+                hits[i] = result.results
+        for i, grouped_result in zip(grouped, searched[1 if plain else 0 :]):
+            hits[i] = [
+                episode for group in grouped_result.groups for episode in group.results
+            ]
+
+        return [
+            SemanticSearchByEpisodeDescriptionResults(results=group_results(rows))
+            for rows in await hydrate_many(hits)
+        ]
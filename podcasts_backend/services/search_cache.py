@@ -0,0 +1,522 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any, Protocol, TypeVar
+
+import numpy as np
+from pydantic import BaseModel
+
+from .embeddings import EMBEDDING_DIM
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # optional, only needed for SEARCH_CACHE_URL
+    redis = None
+
+# responses kept in memory, 0 disables the cache
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE") or 1000)
+# bound on how long another process may serve results from before an ingest
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL") or 300)
+# redis://host:port/db to share the cache between processes (needs redis)
+SEARCH_CACHE_URL = os.environ.get("SEARCH_CACHE_URL")
+# recent query embeddings matched by distance, kept per process even with
+# SEARCH_CACHE_URL; off (0) until a distance is chosen for the deployment
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE") or 0)
+# squared L2 distance under which two queries share results, for normalized
+# embeddings 0.1 is a cosine similarity of 0.95. Tune with
+# benchmarks.semantic_cache
+SEMANTIC_CACHE_MAX_DISTANCE = float(
+    os.environ.get("SEMANTIC_CACHE_MAX_DISTANCE") or 0.1
+)
+
+Response = TypeVar("Response", bound=BaseModel)
+QueryModel = TypeVar("QueryModel", bound=BaseModel)
+
+
+def normalize_text(text: str) -> str:
+    """query text as compared by the cache: NFKC, case folded, single spaces"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def search_cache_key(query: BaseModel) -> str:
+    """cache key of a search query: its normalized text and every other field
+
+    Args:
+        query (BaseModel): search query, e.g. SemanticSearchQuery
+
+    Returns:
+        str: hex digest, equal for queries that only differ in case, spacing,
+        the order of filter values or unset filter fields
+    """
+
+    def canonical(value: Any) -> Any:
+        if isinstance(value, dict):
+            # an empty filter matches like no filter
+            fields = {k: canonical(v) for k, v in value.items() if v is not None}
+            return {k: v for k, v in fields.items() if v != {}}
+        if isinstance(value, list):
+            return sorted(canonical(v) for v in value)
+        return value
+
+    fields = canonical(query.dict(exclude_none=True))
+    fields["query"] = normalize_text(fields.get("query", ""))
+    encoded = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class SearchCacheBackend(Protocol):
+    """Storage of cached responses.
+
+    Entries are tagged with the generation they were computed in. `invalidate`
+    starts a new generation and `get` never returns an entry of an older one, so
+    a response computed while episodes were being added is never served.
+    """
+
+    async def get(self, key: str) -> tuple[int, bytes | None]:
+        """current generation, and the entry of key if stored in that generation"""
+        ...
+
+    async def set(self, key: str, value: bytes, generation: int, ttl: float) -> None:
+        ...
+
+    async def invalidate(self) -> None:
+        ...
+
+    def size(self) -> int | None:
+        ...
+
+
+class MemorySearchCacheBackend:
+    """Bounded LRU in this process, entries expire after their TTL."""
+
+    def __init__(
+        self, max_size: int, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.max_size = max_size
+        self.clock = clock
+        self.generation = 0
+        self.evictions = 0
+        # key -> (expires at, value)
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> tuple[int, bytes | None]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return self.generation, None
+            expires, value = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                return self.generation, None
+            self._entries.move_to_end(key)
+            return self.generation, value
+
+    async def set(self, key: str, value: bytes, generation: int, ttl: float) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def invalidate(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def size(self) -> int | None:
+        return len(self._entries)
+
+
+class RedisSearchCacheBackend:
+    """Entries in Redis, shared by every process using the same url.
+
+    The generation is a counter in Redis, so an ingest in one process
+    invalidates the cache of all of them. Every entry is stored as
+    `<generation>:<value>` and read in the same round trip as the counter.
+    Entries of old generations are left to expire.
+    """
+
+    def __init__(self, url: str, prefix: str = "search_cache") -> None:
+        if redis is None:
+            raise ValueError("SEARCH_CACHE_URL requires redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> tuple[int, bytes | None]:
+        counter, stored = await self.client.mget(
+            f"{self.prefix}:generation", f"{self.prefix}:{key}"
+        )
+        generation = int(counter or 0)
+        if stored is None:
+            return generation, None
+        tag, _, value = stored.partition(b":")
+        return generation, value if int(tag) == generation else None
+
+    async def set(self, key: str, value: bytes, generation: int, ttl: float) -> None:
+        await self.client.set(
+            f"{self.prefix}:{key}", b"%d:%s" % (generation, value), px=int(ttl * 1000)
+        )
+
+    async def invalidate(self) -> None:
+        await self.client.incr(f"{self.prefix}:generation")
+
+    def size(self) -> int | None:
+        return None
+
+
+class SearchCache:
+    """TTL cache of search responses, keyed by `search_cache_key`.
+
+    Serves a response until its TTL runs out or `invalidate` is called, which
+    the repository does after adding episodes. Lookups and stores that fail (e.g.
+    Redis down) count as errors and fall through to the search.
+    """
+
+    def __init__(
+        self,
+        backend: SearchCacheBackend | None,
+        ttl: float = SEARCH_CACHE_TTL,
+    ) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+        # search time the hits would have cost, minus the time of the lookups
+        self.saved_seconds = 0.0
+
+    async def get_or_search(
+        self,
+        query: BaseModel,
+        search: Callable[[], Awaitable[Response]],
+        response_type: type[Response],
+    ) -> Response:
+        """the cached response of query, or the result of search, then cached
+
+        Args:
+            query (BaseModel): search query, the cache key is computed from it
+            search (Callable[[], Awaitable[Response]]): computes the response
+            response_type (type[Response]): model to parse cached responses with
+
+        Returns:
+            Response: response of the query
+        """
+        if self.backend is None:
+            return await search()
+        key = search_cache_key(query)
+        start = time.perf_counter()
+        generation, stored = await self._lookup(key)
+        if stored is not None:
+            # stored as "<seconds the search took> <response json>"
+            seconds, _, body = stored.partition(b" ")
+            response = response_type.parse_raw(body)
+            self.hits += 1
+            self.saved_seconds += float(seconds) - (time.perf_counter() - start)
+            return response
+
+        self.misses += 1
+        search_start = time.perf_counter()
+        response = await search()
+        seconds = time.perf_counter() - search_start
+        value = b"%.6f %s" % (seconds, response.json().encode())
+        await self._store(key, value, generation)
+        return response
+
+    async def get_or_search_many(
+        self,
+        queries: list[QueryModel],
+        search: Callable[[list[QueryModel]], Awaitable[list[Response]]],
+        response_type: type[Response],
+    ) -> list[Response]:
+        """the cached responses of queries, the others from one call of search
+
+        Args:
+            queries (list[QueryModel]): search queries
+            search (Callable[[list[QueryModel]], Awaitable[list[Response]]]): computes
+                the responses of the queries it is given, in order
+            response_type (type[Response]): model to parse cached responses with
+
+        Returns:
+            list[Response]: responses in the order of queries
+        """
+        if self.backend is None:
+            return await search(queries)
+        keys = [search_cache_key(query) for query in queries]
+        start = time.perf_counter()
+        found = await asyncio.gather(*(self._lookup(key) for key in keys))
+        responses: list[Response | None] = [None] * len(queries)
+        saved = 0.0
+        for i, (_, stored) in enumerate(found):
+            if stored is not None:
+                seconds, _, body = stored.partition(b" ")
+                responses[i] = response_type.parse_raw(body)
+                self.hits += 1
+                saved += float(seconds)
+        if saved:
+            self.saved_seconds += saved - (time.perf_counter() - start)
+
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if not missing:
+            return responses  # type: ignore
+        self.misses += len(missing)
+        search_start = time.perf_counter()
+        searched = await search([queries[i] for i in missing])
+        # the batch shares its search time evenly
+        seconds = (time.perf_counter() - search_start) / len(missing)
+        for i, response in zip(missing, searched):
+            responses[i] = response
+            value = b"%.6f %s" % (seconds, response.json().encode())
+            await self._store(keys[i], value, found[i][0])
+        return responses  # type: ignore
+
+    async def get(
+        self, key: str, response_type: type[Response]
+    ) -> tuple[int | None, Response | None]:
+        """a model stored with `put`, outside of the hit rate metrics
+
+        Args:
+            key (str): key of the entry
+            response_type (type[Response]): model to parse the entry with
+
+        Returns:
+            tuple[int | None, Response | None]: generation to pass to `put`, and
+            the entry if it is cached
+        """
+        if self.backend is None:
+            return None, None
+        generation, stored = await self._lookup(key)
+        if stored is None:
+            return generation, None
+        return generation, response_type.parse_raw(stored)
+
+    async def put(self, key: str, response: BaseModel, generation: int | None) -> None:
+        if self.backend is not None:
+            await self._store(key, response.json().encode(), generation)
+
+    async def _lookup(self, key: str) -> tuple[int | None, bytes | None]:
+        try:
+            return await self.backend.get(key)  # type: ignore
+        except Exception as e:
+            self.errors += 1
+            print(f"Search cache lookup failed: {e}")
+            return None, None
+
+    async def _store(self, key: str, value: bytes, generation: int | None) -> None:
+        # no generation when the lookup failed, the entry could be stale
+        if generation is None:
+            return
+        try:
+            await self.backend.set(key, value, generation, self.ttl)  # type: ignore
+        except Exception as e:
+            self.errors += 1
+            print(f"Search cache store failed: {e}")
+
+    async def invalidate(self) -> None:
+        """drop every cached response, e.g. after episodes were added"""
+        if self.backend is None:
+            return
+        self.invalidations += 1
+        try:
+            await self.backend.invalidate()
+        except Exception as e:
+            self.errors += 1
+            print(f"Search cache invalidation failed: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "size": self.backend.size() if self.backend else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
+
+
+class SemanticSearchCache:
+    """Responses of recent queries, found by the distance of query embeddings.
+
+    Catches rephrasings the exact cache misses ("true crime podcasts",
+    "podcasts about true crime"). The last `max_size` responses are kept in a
+    ring buffer with their query embedding; a lookup is a brute force distance
+    scan over the entries computed for the same filters and top_k (every query
+    field but the text), returning the closest one within `max_distance`.
+    Entries expire after the TTL and `invalidate` drops them all.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        max_size: int = SEMANTIC_CACHE_SIZE,
+        max_distance: float = SEMANTIC_CACHE_MAX_DISTANCE,
+        ttl: float = SEARCH_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.clock = clock
+        self._embeddings = np.zeros((max_size, dim), dtype=np.float32)
+        self._norms = np.zeros(max_size, dtype=np.float32)
+        # context of every slot, a hash of the query without its text
+        self._contexts = np.zeros(max_size, dtype=np.int64)
+        # expiry of every slot, -inf for empty slots
+        self._expires = np.full(max_size, -np.inf)
+        self._responses: list[BaseModel | None] = [None] * max_size
+        self._next = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.hit_distance = 0.0
+        self.saved_seconds = 0.0
+        self._seconds = np.zeros(max_size)
+
+    @staticmethod
+    def context(query: BaseModel) -> int:
+        """hash of every query field but the text, entries only match within one"""
+        key = search_cache_key(query.copy(update={"query": ""}))
+        return int(key[:15], 16)
+
+    def get(self, query: BaseModel, embedding: np.ndarray) -> BaseModel | None:
+        """the cached response of the closest query within max_distance, if any
+
+        Args:
+            query (BaseModel): search query
+            embedding (np.ndarray): embedding of the query text
+
+        Returns:
+            BaseModel | None: cached response or None
+        """
+        start = time.perf_counter()
+        with self._lock:
+            candidates = np.flatnonzero(
+                (self._contexts == self.context(query)) & (self._expires > self.clock())
+            )
+            if len(candidates) == 0:
+                self.misses += 1
+                return None
+            distances = (
+                self._norms[candidates]
+                - 2 * self._embeddings[candidates] @ embedding
+                + embedding @ embedding
+            )
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                self.misses += 1
+                return None
+            slot = candidates[best]
+            self.hits += 1
+            self.hit_distance += float(distances[best])
+            self.saved_seconds += self._seconds[slot] - (time.perf_counter() - start)
+            return self._responses[slot]
+
+    def put(
+        self,
+        query: BaseModel,
+        embedding: np.ndarray,
+        response: BaseModel,
+        seconds: float,
+        generation: int,
+    ) -> None:
+        """remember the response of a query, replacing the oldest entry
+
+        Args:
+            query (BaseModel): search query
+            embedding (np.ndarray): embedding of the query text
+            response (BaseModel): response of the query
+            seconds (float): time the search took, for the saved time metric
+            generation (int): generation when the search started, the response
+                is dropped if the cache was invalidated since
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            slot = self._next
+            self._next = (self._next + 1) % self.max_size
+            self._embeddings[slot] = embedding
+            self._norms[slot] = embedding @ embedding
+            self._contexts[slot] = self.context(query)
+            self._expires[slot] = self.clock() + self.ttl
+            self._responses[slot] = response
+            self._seconds[slot] = seconds
+
+    async def get_or_search(
+        self,
+        query: BaseModel,
+        embedding: np.ndarray,
+        search: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        """the cached response of a near duplicate query, or the result of search
+
+        Args:
+            query (BaseModel): search query
+            embedding (np.ndarray): embedding of the query text
+            search (Callable[[], Awaitable[Response]]): computes the response
+
+        Returns:
+            Response: response of the query
+        """
+        cached = self.get(query, embedding)
+        if cached is not None:
+            return cached  # type: ignore
+        generation = self.generation
+        start = time.perf_counter()
+        response = await search()
+        self.put(query, embedding, response, time.perf_counter() - start, generation)
+        return response
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._expires[:] = -np.inf
+            self._responses = [None] * self.max_size
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": int(np.count_nonzero(self._expires > self.clock())),
+            "max_distance": self.max_distance,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_hit_distance": self.hit_distance / self.hits if self.hits else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
+
+
+def create_search_cache() -> SearchCache:
+    if SEARCH_CACHE_URL:
+        return SearchCache(RedisSearchCacheBackend(SEARCH_CACHE_URL))
+    if SEARCH_CACHE_SIZE > 0:
+        return SearchCache(MemorySearchCacheBackend(SEARCH_CACHE_SIZE))
+    return SearchCache(None)
+
+
+search_cache = create_search_cache()
+semantic_cache = SemanticSearchCache(EMBEDDING_DIM) if SEMANTIC_CACHE_SIZE > 0 else None
+
+
+async def invalidate_search_caches() -> None:
+    """drop the responses of both tiers, e.g. after episodes were added"""
+    if semantic_cache is not None:
+        semantic_cache.invalidate()
+    await search_cache.invalidate()
@@ -0,0 +1,173 @@
+# mypy: allow-untyped-defs
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from ..repository.vector_database.providers import local  # noqa: E402
+from ..repository.vector_database.providers.local import LocalDataStore  # noqa: E402
+from ..schemas.schemas import (  # noqa: E402
+    Episode,
+    EpisodeMetadata,
+    EpisodeMetadataFilter,
+    Query,
+)
+
+DIM = 4
+
+
+class RecordingDataStore(LocalDataStore):
+    """local store remembering which ids upserts asked to replace"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.replaced: list[list[int]] = []
+
+    async def _delete_existing(self, ids: list[int]) -> None:
+        self.replaced.append(ids)
+
+
+def episodes(ids: range, podcasts: int = 1) -> list[Episode]:
+    return [
+        Episode(id=i, metadata=EpisodeMetadata(podcast_id=i % podcasts), text="text")
+        for i in ids
+    ]
+
+
+def embeddings(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def test_upsert_replaces_existing_ids(tmp_path):
+    datastore = RecordingDataStore(tmp_path, dim=DIM)
+    asyncio.run(datastore.upsert(episodes(range(1, 4)), embeddings=embeddings(3)))
+    assert datastore.replaced == [[1, 2, 3]]
+
+    vectors = embeddings(3, seed=1)
+    asyncio.run(datastore.upsert(episodes(range(1, 4)), embeddings=vectors))
+    result = asyncio.run(datastore._query([Query(query="q", top_k=10)], vectors[:1]))
+    assert sorted(hit.id for hit in result[0].results) == [1, 2, 3]
+    assert result[0].results[0].id == 1
+
+
+def test_upsert_of_new_ids_deletes_nothing(tmp_path):
+    datastore = RecordingDataStore(tmp_path, dim=DIM)
+    ids = asyncio.run(
+        datastore.upsert(episodes(range(1, 4)), embeddings=embeddings(3), replace=False)
+    )
+    assert sorted(ids) == [1, 2, 3]
+    assert datastore.replaced == []
+
+
+@pytest.mark.parametrize("index", ["flat", "hnsw"])
+def test_local_search_filters_and_top_k(tmp_path, monkeypatch, index):
+    if index == "hnsw":
+        pytest.importorskip("hnswlib")
+    # the graph path even for small filtered searches
+    monkeypatch.setattr(local, "EXACT_SEARCH_THRESHOLD", 5)
+    datastore = LocalDataStore(tmp_path, dim=DIM, index=index)
+    vectors = embeddings(300)
+    asyncio.run(datastore.upsert(episodes(range(300), podcasts=6), embeddings=vectors))
+
+    queries = [
+        Query(query="nothing", top_k=0),
+        Query(query="podcast 2", top_k=5, filter=EpisodeMetadataFilter(podcast_id=2)),
+        Query(query="podcast 3", top_k=5, filter=EpisodeMetadataFilter(podcast_id=3)),
+    ]
+    results = asyncio.run(datastore._query(queries, vectors[:3]))
+    assert results[0].results == []
+    for podcast_id, result in zip((2, 3), results[1:]):
+        assert len(result.results) == 5
+        assert {hit.metadata.podcast_id for hit in result.results} == {podcast_id}
+
+
+class SearchRecordingDataStore(LocalDataStore):
+    """local store recording its searches; a lossy one stands for an approximate
+    index filtering after the search, large searches come back with half of
+    their hits"""
+
+    def __init__(self, *args, lossy: bool = False, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.lossy = lossy
+        self.exhaustive_search = not lossy
+        self.searches: list[Query] = []
+
+    async def _query(self, queries, embeddings, include_vectors=False):
+        self.searches += queries
+        results = await super()._query(queries, embeddings, include_vectors)
+        for query, result in zip(queries, results):
+            if self.lossy and query.top_k > 3:
+                result.results = result.results[: query.top_k // 2]
+        return results
+
+
+def grouped_store(tmp_path, n: int, podcasts: int, lossy: bool = False):
+    datastore = SearchRecordingDataStore(tmp_path, dim=DIM, lossy=lossy)
+    vectors = embeddings(n)
+    asyncio.run(
+        datastore.upsert(episodes(range(n), podcasts=podcasts), embeddings=vectors)
+    )
+    return datastore, vectors
+
+
+@pytest.mark.parametrize("lossy", [False, True])
+def test_grouped_search_returns_the_best_full_groups(tmp_path, lossy):
+    datastore, vectors = grouped_store(tmp_path, 60, podcasts=6, lossy=lossy)
+    grouped = asyncio.run(
+        datastore.query_grouped(Query(query="q", top_k=4), 3, embedding=vectors[0])
+    )
+
+    # exact search, grouped by podcast
+    groups: dict[int, list[int]] = {}
+    for i in np.argsort(((vectors - vectors[0]) ** 2).sum(axis=1)):
+        groups.setdefault(int(i) % 6, []).append(int(i))
+    assert [
+        (group.podcast_id, [hit.id for hit in group.results])
+        for group in grouped.groups
+    ] == [(podcast_id, ids[:3]) for podcast_id, ids in list(groups.items())[:4]]
+
+
+def test_grouped_search_over_fetches_without_full_groups(tmp_path):
+    datastore = SearchRecordingDataStore(tmp_path, dim=DIM, lossy=True)
+    vectors = embeddings(60)
+    # one prolific podcast, and five with a single episode
+    prolific = [
+        Episode(
+            id=i,
+            metadata=EpisodeMetadata(podcast_id=i // 10 if i % 10 == 0 else 0),
+            text="",
+        )
+        for i in range(60)
+    ]
+    asyncio.run(datastore.upsert(prolific, embeddings=vectors))
+    asyncio.run(
+        datastore.query_grouped(Query(query="q", top_k=4), 3, embedding=vectors[0])
+    )
+
+    rounds = [q for q in datastore.searches if q.filter.podcast_id is None]
+    fills = [q for q in datastore.searches if q.filter.podcast_id is not None]
+    assert len(rounds) > 1
+    assert [query.top_k for query in rounds] == [
+        12 * 2**i for i in range(len(rounds))
+    ]
+    excluded: set[int] = set()
+    for query in rounds:
+        # podcasts whose group is full are not fetched again
+        assert excluded <= set(query.filter.exclude_podcast_ids or [])
+        excluded = set(query.filter.exclude_podcast_ids or [])
+    assert 0 in excluded
+    assert all(query.top_k == 3 for query in fills)
+    assert not {query.filter.podcast_id for query in fills} & excluded
+
+
+def test_grouped_search_stops_when_exhausted(tmp_path):
+    # five podcasts of two episodes each
+    datastore, vectors = grouped_store(tmp_path, 10, podcasts=5)
+    grouped = asyncio.run(
+        datastore.query_grouped(Query(query="q", top_k=10), 3, embedding=vectors[0])
+    )
+    assert sorted(len(group.results) for group in grouped.groups) == [2] * 5
+    # one search came back short, so it returned every episode
+    assert len(datastore.searches) == 1
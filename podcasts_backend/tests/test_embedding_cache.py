@@ -0,0 +1,115 @@
+# mypy: allow-untyped-defs
+import numpy as np
+
+from ..services.embedding_cache import (
+    KEY_SIZE,
+    DiskEmbeddingStore,
+    EmbeddingCache,
+    cache_key,
+)
+
+
+def vectors(n: int, dim: int = 4) -> np.ndarray:
+    return np.arange(n * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_cache_key_depends_on_model_and_text():
+    assert cache_key("model", "text") == cache_key("model", "text")
+    assert cache_key("model", "text") != cache_key("other model", "text")
+    assert cache_key("model", "text") != cache_key("model", "text ")
+    assert len(cache_key("model", "text")) == KEY_SIZE
+
+
+def test_disk_store_survives_reopen(tmp_path):
+    keys = [cache_key("model", str(i)) for i in range(3)]
+    DiskEmbeddingStore(tmp_path, "model", 4).put_many(keys, vectors(3))
+
+    store = DiskEmbeddingStore(tmp_path, "model", 4)
+    assert len(store) == 3
+    np.testing.assert_array_equal(store.get(keys[2]), vectors(3)[2])
+
+
+def test_disk_store_is_cleared_for_another_model(tmp_path):
+    DiskEmbeddingStore(tmp_path, "model", 4).put_many(
+        [cache_key("model", "text")], vectors(1)
+    )
+    assert len(DiskEmbeddingStore(tmp_path, "other model", 4)) == 0
+
+
+def test_disk_store_drops_partial_key(tmp_path):
+    keys = [cache_key("model", str(i)) for i in range(3)]
+    DiskEmbeddingStore(tmp_path, "model", 4).put_many(keys[:2], vectors(2))
+    # a crash in the middle of appending a key
+    with open(tmp_path / "keys.bin", "ab") as f:
+        f.write(keys[2][:10])
+
+    store = DiskEmbeddingStore(tmp_path, "model", 4)
+    assert len(store) == 2
+    assert (tmp_path / "keys.bin").stat().st_size == 2 * KEY_SIZE
+    store.put_many(keys[2:], vectors(3)[2:])
+    reopened = DiskEmbeddingStore(tmp_path, "model", 4)
+    np.testing.assert_array_equal(reopened.get(keys[2]), vectors(3)[2])
+
+
+def test_disk_stores_sharing_a_directory_do_not_overwrite_rows(tmp_path):
+    first = DiskEmbeddingStore(tmp_path, "model", 4)
+    second = DiskEmbeddingStore(tmp_path, "model", 4)
+    keys = [cache_key("model", str(i)) for i in range(2000)]
+    first.put_many(keys[:2], vectors(2))
+    # grows past the capacity the first store mapped
+    second.put_many(keys[1:], vectors(2000)[1:])
+    first.put_many([cache_key("model", "last")], vectors(1))
+
+    store = DiskEmbeddingStore(tmp_path, "model", 4)
+    assert len(store) == 2001
+    for i in (0, 1, 1999):
+        np.testing.assert_array_equal(store.get(keys[i]), vectors(2000)[i])
+
+
+def test_disk_store_cleared_by_another_process(tmp_path):
+    first = DiskEmbeddingStore(tmp_path, "model", 4)
+    second = DiskEmbeddingStore(tmp_path, "model", 4)
+    key = cache_key("model", "text")
+    first.put_many([key], vectors(1))
+    second.clear()
+    first.put_many([key], vectors(1) + 1)
+
+    assert len(first) == 1
+    store = DiskEmbeddingStore(tmp_path, "model", 4)
+    np.testing.assert_array_equal(store.get(key), vectors(1)[0] + 1)
+
+
+def test_cache_opens_the_disk_tier_on_first_use(tmp_path):
+    cache = EmbeddingCache("model", 4, max_size=10, path=tmp_path / "cache")
+    assert not (tmp_path / "cache").exists()
+
+    _, keys = cache.get_many(["a", "b"])
+    cache.put_many(keys, vectors(2))
+    assert (tmp_path / "cache" / "keys.bin").stat().st_size == 2 * KEY_SIZE
+
+
+def test_cache_memory_tier_is_lru(tmp_path):
+    cache = EmbeddingCache("model", 4, max_size=2, path=None)
+    _, keys = cache.get_many(["a", "b", "c"])
+    cache.put_many(keys[:2], vectors(2))
+    cache.get_many(["a"])
+    cache.put_many(keys[2:], vectors(1))
+
+    found, _ = cache.get_many(["a", "b", "c"])
+    assert [vector is not None for vector in found] == [True, False, True]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_falls_back_to_disk_and_invalidates(tmp_path):
+    _, keys = EmbeddingCache("model", 4, path=tmp_path).get_many(["a"])
+    EmbeddingCache("model", 4, path=tmp_path).put_many(keys, vectors(1))
+
+    cache = EmbeddingCache("model", 4, path=tmp_path)
+    found, _ = cache.get_many(["a"])
+    np.testing.assert_array_equal(found[0], vectors(1)[0])
+    assert cache.stats()["disk_hits"] == 1
+
+    cache.invalidate("new model")
+    found, _ = cache.get_many(["a"])
+    assert found == [None]
+    assert len(DiskEmbeddingStore(tmp_path, "new model", 4)) == 0
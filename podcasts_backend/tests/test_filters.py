@@ -0,0 +1,118 @@
+# mypy: allow-untyped-defs
+import pytest
+from sqlalchemy import column, table
+from sqlalchemy.dialects import postgresql
+
+from ..repository.vector_database.filters import (
+    FILTER_FIELDS,
+    Eq,
+    In,
+    NotIn,
+    Range,
+    allowed_values,
+    conditions,
+    literal,
+    to_milvus_expression,
+    to_sql_clauses,
+)
+from ..schemas.schemas import EpisodeMetadataFilter, NumericRange
+
+episodes = table("episodes", *(column(field) for field in FILTER_FIELDS))
+
+
+def sql(filter: EpisodeMetadataFilter) -> list[str]:
+    return [
+        str(
+            clause.compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+        for clause in to_sql_clauses(conditions(filter), episodes.c)
+    ]
+
+
+def test_conditions_dedupe_values_in_order():
+    filter = EpisodeMetadataFilter(
+        language="en",
+        categories=["News", "Comedy", "News"],
+        exclude_podcast_ids=[3, 3, 4],
+        duration=NumericRange(gte=60, lt=600),
+    )
+    assert conditions(filter) == [
+        In("category", ("News", "Comedy")),
+        Eq("language", "en"),
+        NotIn("podcast_id", (3, 4)),
+        Range("duration", gte=60, lt=600),
+    ]
+    assert conditions(EpisodeMetadataFilter()) == []
+
+
+def test_allowed_values_intersects_eq_and_in():
+    filter = EpisodeMetadataFilter(language="en", languages=["en", "de"])
+    assert allowed_values(conditions(filter), "language") == {"en"}
+    assert allowed_values(conditions(filter), "category") is None
+
+
+def test_literal_escapes_strings():
+    assert literal("category", "News") == '"News"'
+    assert literal("category", 'say "hi"') == r'"say \"hi\""'
+    assert literal("category", "back\\slash") == r'"back\\slash"'
+    assert literal("language", "français") == '"français"'
+    assert literal("podcast_id", 42) == "42"
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [("podcast_id", "42"), ("podcast_id", True), ("duration", 1.5), ("language", 1)],
+)
+def test_literal_rejects_values_of_another_type(field, value):
+    with pytest.raises(ValueError):
+        literal(field, value)
+
+
+def test_milvus_expression():
+    filter = EpisodeMetadataFilter(
+        podcast_id=7,
+        categories=['a" or podcast_id > 0 or "'],
+        exclude_podcast_ids=[3, 4],
+        datePublished=NumericRange(gt=100, lte=200),
+    )
+    assert to_milvus_expression(conditions(filter)) == (
+        "(podcast_id == 7)"
+        ' and (category in ["a\\" or podcast_id > 0 or \\""])'
+        " and (podcast_id not in [3, 4])"
+        " and (datePublished > 0)"
+        " and (datePublished > 100)"
+        " and (datePublished <= 200)"
+    )
+    assert to_milvus_expression([]) is None
+
+
+def test_milvus_expression_rejects_missing_fields():
+    filter = EpisodeMetadataFilter(duration=NumericRange(gte=60))
+    with pytest.raises(ValueError):
+        to_milvus_expression(conditions(filter), fields={"podcast_id", "language"})
+    assert (
+        to_milvus_expression(
+            conditions(EpisodeMetadataFilter(language="en")), fields={"language"}
+        )
+        == '(language == "en")'
+    )
+
+
+def test_sql_clauses_bind_values():
+    filter = EpisodeMetadataFilter(
+        language="it's",
+        podcast_ids=[1, 2],
+        exclude_podcast_ids=[3],
+        duration=NumericRange(gte=60, lt=600),
+    )
+    assert sql(filter) == [
+        "episodes.podcast_id IN (1, 2)",
+        "episodes.language = 'it''s'",
+        "(episodes.podcast_id NOT IN (3))",
+        "episodes.duration >= 60",
+        "episodes.duration < 600",
+    ]
+    clause = to_sql_clauses(conditions(filter), episodes.c)[1]
+    assert clause.right.value == "it's"
@@ -0,0 +1,79 @@
+# mypy: allow-untyped-defs
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymilvus")
+pytest.importorskip("sentence_transformers")
+
+from ..repository.vector_database.providers import milvus  # noqa: E402
+from ..repository.vector_database.providers.milvus import MilvusDataStore  # noqa: E402
+
+
+def store(**attributes) -> MilvusDataStore:
+    """a store without a connection, with the attributes a test needs"""
+    datastore = object.__new__(MilvusDataStore)
+    for name, value in attributes.items():
+        setattr(datastore, name, value)
+    return datastore
+
+
+@pytest.mark.parametrize(
+    "version, native",
+    [("v2.3.1", True), ("2.4.0", True), ("v2.2.14", False), ("master", False)],
+)
+def test_native_upsert_from_server_version(monkeypatch, version, native):
+    monkeypatch.setattr(milvus, "MILVUS_NATIVE_UPSERT", None)
+    monkeypatch.setattr(milvus.utility, "get_server_version", lambda using: version)
+    assert milvus.supports_native_upsert("default") is native
+
+
+def test_native_upsert_setting_overrides_server_version(monkeypatch):
+    monkeypatch.setattr(milvus, "MILVUS_NATIVE_UPSERT", "0")
+    monkeypatch.setattr(milvus.utility, "get_server_version", lambda using: "v2.3.0")
+    assert milvus.supports_native_upsert("default") is False
+
+
+def test_pk_expressions_are_bounded(monkeypatch):
+    monkeypatch.setattr(milvus, "PK_EXPR_BYTES", 12)
+    expressions = store()._pk_expressions([1, 22, 333, 4444, 55555])
+    assert expressions == ["pk in [1,22,333]", "pk in [4444,55555]"]
+    assert store()._pk_expressions([]) == []
+
+
+def delete_recorder(datastore: MilvusDataStore, stored: set[int]) -> list[list[int]]:
+    deleted: list[list[int]] = []
+
+    async def existing_ids(ids):
+        return [id for id in ids if id in stored]
+
+    async def delete(ids=None, delete_all=None):
+        deleted.append(ids)
+
+    datastore.existing_ids = existing_ids  # type: ignore
+    datastore.delete = delete  # type: ignore
+    return deleted
+
+
+def test_delete_existing_only_deletes_stored_ids():
+    datastore = store(native_upsert=False, partition_by_language=False)
+    deleted = delete_recorder(datastore, stored={2, 3})
+    asyncio.run(datastore._delete_existing([1, 2, 3, 4]))
+    assert deleted == [[2, 3]]
+
+    # a first-time ingest deletes nothing
+    deleted.clear()
+    asyncio.run(datastore._delete_existing([5, 6]))
+    assert deleted == []
+
+
+def test_delete_existing_with_native_upsert():
+    datastore = store(native_upsert=True, partition_by_language=False)
+    deleted = delete_recorder(datastore, stored={1})
+    asyncio.run(datastore._delete_existing([1]))
+    assert deleted == []
+
+    # upserts don't move rows to the partition of another language
+    datastore.partition_by_language = True
+    asyncio.run(datastore._delete_existing([1]))
+    assert deleted == [[1]]
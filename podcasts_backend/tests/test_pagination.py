@@ -0,0 +1,134 @@
+# mypy: allow-untyped-defs
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+pytest.importorskip("sentence_transformers")
+
+from ..schemas.schemas import (  # noqa: E402
+    EpisodeGroup,
+    EpisodeMetadata,
+    EpisodeWithScore,
+    GroupedQueryResult,
+    QueryResult,
+    SemanticSearchQuery,
+)
+from ..services import favorite_podcasts  # noqa: E402
+from ..services.favorite_podcasts import (  # noqa: E402
+    decode_cursor,
+    encode_cursor,
+    search_page,
+)
+from ..services.search_cache import MemorySearchCacheBackend, SearchCache  # noqa: E402
+
+EPISODES = 50
+
+
+class FakeVectorDB:
+    """ranks episode i at i, episodes of podcast i % 7"""
+
+    def __init__(self) -> None:
+        self.searches: list[int] = []
+
+    def hit(self, i: int) -> EpisodeWithScore:
+        return EpisodeWithScore(
+            id=i, score=float(i), metadata=EpisodeMetadata(podcast_id=i % 7)
+        )
+
+    async def query(self, queries):
+        self.searches.append(queries[0].top_k)
+        hits = [self.hit(i) for i in range(min(queries[0].top_k, EPISODES))]
+        return [QueryResult(query=queries[0].query, results=hits)]
+
+    async def query_grouped(self, query, group_size):
+        self.searches.append(query.top_k)
+        groups = [
+            EpisodeGroup(
+                podcast_id=podcast_id,
+                results=[self.hit(i) for i in range(podcast_id, EPISODES, 7)][
+                    :group_size
+                ],
+            )
+            for podcast_id in range(min(query.top_k, 7))
+        ]
+        return GroupedQueryResult(query=query.query, groups=groups)
+
+
+@pytest.fixture
+def vector_db(monkeypatch) -> FakeVectorDB:
+    vector_db = FakeVectorDB()
+    monkeypatch.setattr(favorite_podcasts, "get_vector_db", lambda: vector_db)
+    monkeypatch.setattr(
+        favorite_podcasts,
+        "search_cache",
+        SearchCache(MemorySearchCacheBackend(100)),
+    )
+    monkeypatch.setattr(favorite_podcasts, "SEMANTIC_SEARCH_WINDOW_PAGES", 2)
+    return vector_db
+
+
+def pages(query: SemanticSearchQuery) -> list[list[EpisodeGroup]]:
+    async def main() -> list[list[EpisodeGroup]]:
+        result, cursor = [], None
+        while True:
+            page_query = query.copy(update={"cursor": cursor})
+            groups, cursor = await search_page(page_query)
+            result.append(groups)
+            if cursor is None:
+                return result
+
+    return asyncio.run(main())
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("window:abc", 40)) == ("window:abc", 40)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["", "!!!", "bm90IGpzb24=", encode_cursor("window:abc", -1), "eyJhIjogMX0="],
+)
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_pages_cover_every_result_once(vector_db):
+    result = pages(SemanticSearchQuery(query="q", top_k=8, paginate=True))
+    ids = [hit.id for page in result for group in page for hit in group.results]
+    assert ids == list(range(EPISODES))
+    assert [len(page) for page in result] == [8] * 6 + [2]
+    # two pages per window, the window doubles past its end
+    assert vector_db.searches == [16, 32, 64]
+
+
+def test_grouped_pages(vector_db):
+    query = SemanticSearchQuery(
+        query="q", top_k=3, paginate=True, episodes_per_podcast=2
+    )
+    result = pages(query)
+    assert [[group.podcast_id for group in page] for page in result] == [
+        [0, 1, 2],
+        [3, 4, 5],
+        [6],
+    ]
+    assert all(len(group.results) == 2 for page in result for group in page)
+
+
+def test_cursor_of_another_query_is_rejected(vector_db):
+    async def main() -> None:
+        query = SemanticSearchQuery(query="q", top_k=8, paginate=True)
+        _, cursor = await search_page(query)
+        # the same query with another page size may go on from the cursor
+        await search_page(query.copy(update={"cursor": cursor, "top_k": 4}))
+        for other in (
+            query.copy(update={"query": "other"}),
+            query.copy(update={"episodes_per_podcast": 2}),
+        ):
+            with pytest.raises(HTTPException) as error:
+                await search_page(other.copy(update={"cursor": cursor}))
+            assert error.value.status_code == 400
+
+    asyncio.run(main())
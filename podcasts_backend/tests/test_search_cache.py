@@ -0,0 +1,209 @@
+# mypy: allow-untyped-defs
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from ..schemas.schemas import (  # noqa: E402
+    EpisodeMetadataFilter,
+    QueryResult,
+    SemanticSearchQuery,
+)
+from ..services.search_cache import (  # noqa: E402
+    MemorySearchCacheBackend,
+    SearchCache,
+    SemanticSearchCache,
+    normalize_text,
+    search_cache_key,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def query(text: str = "true crime", **fields) -> SemanticSearchQuery:
+    return SemanticSearchQuery(query=text, **fields)
+
+
+def test_normalize_text():
+    assert normalize_text("  True\tCRIME\n podcasts ") == "true crime podcasts"
+    # NFKC: full width letters and ligatures
+    assert normalize_text("ｔｒｕｅ ﬁction") == "true fiction"
+    assert normalize_text("Straße") == normalize_text("STRASSE")
+
+
+def test_cache_key_ignores_case_spacing_and_value_order():
+    key = search_cache_key(
+        query(filter=EpisodeMetadataFilter(categories=["News", "Comedy"]))
+    )
+    assert key == search_cache_key(
+        query(
+            " TRUE  crime ",
+            filter=EpisodeMetadataFilter(categories=["Comedy", "News"]),
+        )
+    )
+
+
+def test_cache_key_of_unset_and_none_fields():
+    assert search_cache_key(query()) == search_cache_key(
+        query(filter=EpisodeMetadataFilter(language=None))
+    )
+    assert search_cache_key(query()) == search_cache_key(query(cursor=None))
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        query("true crimes"),
+        query(top_k=10),
+        query(episodes_per_podcast=2),
+        query(filter=EpisodeMetadataFilter(language="en")),
+        query(filter=EpisodeMetadataFilter(podcast_ids=[1])),
+        query(filter=EpisodeMetadataFilter(exclude_podcast_ids=[1])),
+    ],
+)
+def test_cache_key_of_different_queries(other):
+    assert search_cache_key(other) != search_cache_key(query())
+
+
+def cache(clock: Clock, ttl: float = 60) -> SearchCache:
+    return SearchCache(MemorySearchCacheBackend(10, clock=clock), ttl=ttl)
+
+
+def searcher(responses: list[str]):
+    async def search() -> QueryResult:
+        responses.append("searched")
+        return QueryResult(query=str(len(responses)), results=[])
+
+    return search
+
+
+def test_cache_serves_until_the_ttl():
+    clock, searches = Clock(), []
+    search_cache = cache(clock)
+
+    async def get(text: str) -> QueryResult:
+        return await search_cache.get_or_search(
+            query(text), searcher(searches), QueryResult
+        )
+
+    assert asyncio.run(get("a")).query == "1"
+    clock.now = 59
+    assert asyncio.run(get(" A ")).query == "1"
+    clock.now = 60
+    assert asyncio.run(get("a")).query == "2"
+    assert search_cache.stats()["hits"] == 1
+    assert search_cache.stats()["misses"] == 2
+
+
+def test_invalidate_drops_entries():
+    clock, searches = Clock(), []
+    search_cache = cache(clock)
+
+    async def get() -> QueryResult:
+        return await search_cache.get_or_search(
+            query(), searcher(searches), QueryResult
+        )
+
+    asyncio.run(get())
+    asyncio.run(search_cache.invalidate())
+    assert asyncio.run(get()).query == "2"
+    assert asyncio.run(get()).query == "2"
+
+
+def test_search_started_before_an_invalidation_is_not_stored():
+    clock, searches = Clock(), []
+    search_cache = cache(clock)
+
+    async def invalidated_search() -> QueryResult:
+        # episodes were added while the search ran
+        await search_cache.invalidate()
+        return await searcher(searches)()
+
+    async def main() -> None:
+        await search_cache.get_or_search(query(), invalidated_search, QueryResult)
+        result = await search_cache.get_or_search(
+            query(), searcher(searches), QueryResult
+        )
+        assert result.query == "2"
+
+    asyncio.run(main())
+
+
+def test_memory_backend_is_bounded_lru():
+    backend = MemorySearchCacheBackend(2, clock=Clock())
+
+    async def main() -> None:
+        for key in ("a", "b"):
+            await backend.set(key, key.encode(), 0, ttl=60)
+        await backend.get("a")
+        await backend.set("c", b"c", 0, ttl=60)
+        assert [(await backend.get(key))[1] for key in "abc"] == [b"a", None, b"c"]
+
+    asyncio.run(main())
+    assert backend.evictions == 1
+
+
+def semantic_cache(clock: Clock, max_size: int = 4) -> SemanticSearchCache:
+    return SemanticSearchCache(
+        dim=2, max_size=max_size, max_distance=0.1, ttl=60, clock=clock
+    )
+
+
+def test_semantic_cache_matches_close_embeddings():
+    cache = semantic_cache(Clock())
+    response = QueryResult(query="true crime", results=[])
+    cache.put(query(), np.array([1.0, 0.0]), response, seconds=0.1, generation=0)
+
+    assert cache.get(query("crime podcasts"), np.array([0.9, 0.1])) is response
+    assert cache.get(query("comedy"), np.array([0.0, 1.0])) is None
+    # only within the same filters and top_k
+    assert cache.get(query(top_k=5), np.array([1.0, 0.0])) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_semantic_cache_returns_the_closest_entry():
+    cache = semantic_cache(Clock())
+    far = QueryResult(query="far", results=[])
+    near = QueryResult(query="near", results=[])
+    cache.put(query(), np.array([1.0, 0.2]), far, seconds=0.1, generation=0)
+    cache.put(query(), np.array([1.0, 0.05]), near, seconds=0.1, generation=0)
+    assert cache.get(query(), np.array([1.0, 0.0])) is near
+
+
+def test_semantic_cache_ttl_and_ring_buffer():
+    clock = Clock()
+    cache = semantic_cache(clock, max_size=2)
+    for i in range(3):
+        clock.now = i
+        response = QueryResult(query=str(i), results=[])
+        cache.put(query(), np.array([float(i), 0.0]), response, 0.1, generation=0)
+
+    # the oldest entry was replaced
+    assert cache.get(query(), np.array([0.0, 0.0])) is None
+    assert cache.get(query(), np.array([1.0, 0.0])).query == "1"
+    clock.now = 61
+    assert cache.get(query(), np.array([1.0, 0.0])) is None
+    assert cache.get(query(), np.array([2.0, 0.0])).query == "2"
+
+
+def test_semantic_cache_generations():
+    cache = semantic_cache(Clock())
+    embedding = np.array([1.0, 0.0])
+    response = QueryResult(query="a", results=[])
+    cache.put(query(), embedding, response, 0.1, generation=cache.generation)
+    cache.invalidate()
+    assert cache.get(query(), embedding) is None
+
+    # computed before the invalidation
+    cache.put(query(), embedding, response, 0.1, generation=0)
+    assert cache.get(query(), embedding) is None
+    cache.put(query(), embedding, response, 0.1, generation=cache.generation)
+    assert cache.get(query(), embedding) is response
@@ -0,0 +1,64 @@
+# mypy: allow-untyped-defs
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")
+pytest.importorskip("sentence_transformers")
+
+from ..repository.vector_database.providers.milvus import (  # noqa: E402
+    load_index_profile,
+    search_params_for,
+)
+from ..tools.tune_index import candidates, exact_top_k  # noqa: E402
+
+
+def test_exact_top_k_matches_a_full_sort():
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((500, 8)).astype(np.float32)
+    # more queries than one chunk of the scan
+    queries = rng.standard_normal((300, 8)).astype(np.float32)
+    distances = ((queries[:, None, :] - corpus[None, :, :]) ** 2).sum(axis=2)
+    np.testing.assert_array_equal(
+        exact_top_k(corpus, queries, 10), np.argsort(distances, axis=1)[:, :10]
+    )
+
+
+def test_candidates_fit_the_corpus():
+    sweeps = list(candidates(n=10_000, dim=768, k=20))
+    assert {index["index_type"] for index, _ in sweeps} == {
+        "HNSW",
+        "IVF_FLAT",
+        "IVF_SQ8",
+        "IVF_PQ",
+    }
+    for index, search in sweeps:
+        assert search
+        for params in search:
+            if index["index_type"] == "HNSW":
+                assert params["params"]["ef"] >= 20
+            else:
+                assert params["params"]["nprobe"] <= index["params"]["nlist"]
+        if index["index_type"] == "IVF_PQ":
+            assert 768 % index["params"]["m"] == 0
+
+
+def test_search_params_raise_ef_to_top_k():
+    hnsw = {"metric_type": "L2", "params": {"ef": 32}}
+    assert search_params_for(hnsw, 20) is hnsw
+    assert search_params_for(hnsw, 100)["params"] == {"ef": 100}
+    assert hnsw["params"] == {"ef": 32}
+    ivf = {"metric_type": "L2", "params": {"nprobe": 16}}
+    assert search_params_for(ivf, 1000) is ivf
+
+
+def test_load_index_profile(tmp_path):
+    profile = {
+        "index_params": {"index_type": "HNSW", "params": {"M": 16}},
+        "search_params": {"metric_type": "L2", "params": {"ef": 64}},
+        "recall": 0.97,
+    }
+    path = tmp_path / "index_profile.json"
+    path.write_text(json.dumps(profile))
+    assert load_index_profile(str(path)) == profile
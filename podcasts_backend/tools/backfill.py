@@ -0,0 +1,230 @@
+"""Rebuild the episode collection from Postgres behind an alias, without downtime.
+
+Episodes are read from Postgres in pages ordered by episode id (keyset paging,
+no OFFSET), embedded and inserted into a new shadow collection while the service
+keeps searching the live one. Progress is checkpointed after every page, so
+running the command again resumes after the last inserted page. Once every
+episode is in, the shadow collection is loaded and the alias is pointed at it;
+a service with MILVUS_COLLECTION=<alias> searches it from the next request on
+(restart it if the index type changed). The previous collection is kept to roll
+back to, drop it once the new one is fine.
+
+Episodes ingested while the backfill runs go to the live collection, and their
+ids may be below the backfill's cursor. Before the swap, a catch-up pass
+compares the episode ids in Postgres with the new collection and inserts the
+missing ones; after the swap, writes reach the new collection and a second
+pass inserts what was ingested between the two. Episodes are never changed
+once ingested, so missing ids are all there is to catch up.
+
+The alias (MILVUS_ALIAS, episodes_live by default) must not be the name of a
+collection. A service searching the episodes collection directly moves over
+with one backfill: run it, set MILVUS_COLLECTION=episodes_live, restart, and
+drop episodes once the new collection is fine.
+
+    python -m podcasts_backend.tools.backfill --alias episodes_live --batch 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from pymilvus import connections
+
+from ..repository.db.postgres import get_engine
+from ..repository.podcast_repository import Repository
+from ..repository.vector_database.providers.milvus import (
+    MILVUS_ALIAS,
+    MILVUS_HOST,
+    MILVUS_PASSWORD,
+    MILVUS_PORT,
+    MILVUS_USE_SECURITY,
+    MILVUS_USER,
+    MilvusDataStore,
+    aliased_collection,
+    swap_alias,
+)
+from ..services.embeddings import EMBEDDING_CHUNK_SIZE, embed_length_sorted
+from ..services.executors import executors, run_blocking
+
+ALIAS = "backfill"
+
+
+def read_checkpoint(path: Path) -> dict[str, Any] | None:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def write_checkpoint(path: Path, checkpoint: dict[str, Any]) -> None:
+    # a crash mid-write leaves the previous checkpoint intact
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(json.dumps(checkpoint, indent=2))
+    os.replace(temporary, path)
+
+
+async def backfill(
+    repository: Repository,
+    store: MilvusDataStore,
+    checkpoint: dict[str, Any],
+    checkpoint_path: Path,
+    batch: int,
+) -> None:
+    """embed and insert every episode after the checkpoint, page by page
+
+    Args:
+        repository (Repository): episodes source
+        store (MilvusDataStore): shadow collection
+        checkpoint (dict[str, Any]): last inserted episode id and count so far
+        checkpoint_path (Path): where the checkpoint is written after every page
+        batch (int): episodes per page
+    """
+    after = checkpoint["after"]
+    remaining = await run_blocking(repository.get_episodes_count, after)
+    total = checkpoint["done"] + remaining
+    print(f"{checkpoint['done']} episodes done, {remaining} to go")
+
+    first_page = True
+    inserted = 0
+    start = time.perf_counter()
+    next_page = asyncio.create_task(
+        run_blocking(repository.list_episode_vectors, after, batch)
+    )
+    while episodes := await next_page:
+        after = episodes[-1].id
+        # read the next page while this one is embedded and inserted
+        next_page = asyncio.create_task(
+            run_blocking(repository.list_episode_vectors, after, batch)
+        )
+        embeddings = await embed_length_sorted(
+            [episode.text for episode in episodes], EMBEDDING_CHUNK_SIZE
+        )
+        # after a crash, the page after the checkpoint may be inserted in part
+        await store.upsert(episodes, embeddings=embeddings, replace=first_page)
+        first_page = False
+
+        checkpoint["after"] = after
+        checkpoint["done"] += len(episodes)
+        write_checkpoint(checkpoint_path, checkpoint)
+
+        inserted += len(episodes)
+        rate = inserted / (time.perf_counter() - start)
+        # new episodes may arrive while the backfill runs
+        total = max(total, checkpoint["done"])
+        eta = timedelta(seconds=round((total - checkpoint["done"]) / rate))
+        print(
+            f"{checkpoint['done']}/{total} episodes "
+            f"({100 * checkpoint['done'] / total:.1f}%), "
+            f"{rate:.0f} episodes/s, ETA {eta}"
+        )
+
+
+async def catch_up(repository: Repository, store: MilvusDataStore, batch: int) -> int:
+    """insert the episodes in Postgres that the collection misses, page by page
+
+    Args:
+        repository (Repository): episodes source
+        store (MilvusDataStore): collection to complete
+        batch (int): episodes per page
+
+    Returns:
+        int: episodes inserted
+    """
+    after, inserted = -1, 0
+    while episodes := await run_blocking(repository.list_episode_vectors, after, batch):
+        after = episodes[-1].id
+        stored = set(await store.existing_ids([episode.id for episode in episodes]))
+        missing = [episode for episode in episodes if episode.id not in stored]
+        if not missing:
+            continue
+        embeddings = await embed_length_sorted(
+            [episode.text for episode in missing], EMBEDDING_CHUNK_SIZE
+        )
+        await store.upsert(missing, embeddings=embeddings, replace=False)
+        inserted += len(missing)
+    return inserted
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--alias", default=MILVUS_ALIAS)
+    parser.add_argument(
+        "--target", help="shadow collection, by default <alias>_<timestamp>"
+    )
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--checkpoint", help="by default backfill_<alias>.json")
+    parser.add_argument(
+        "--no-swap", action="store_true", help="build the collection only"
+    )
+    args = parser.parse_args()
+
+    # MilvusDataStore reuses this connection, it has the same address
+    connections.connect(
+        ALIAS,
+        user=MILVUS_USER,
+        password=MILVUS_PASSWORD,
+        host=MILVUS_HOST,
+        port=MILVUS_PORT,
+        secure=MILVUS_USE_SECURITY,
+    )
+    if not args.no_swap:
+        try:
+            # fail before the backfill rather than when swapping at its end
+            aliased_collection(args.alias, using=ALIAS)
+        except ValueError as e:
+            print(e)
+            return
+
+    checkpoint_path = Path(args.checkpoint or f"backfill_{args.alias}.json")
+    checkpoint = read_checkpoint(checkpoint_path)
+    if checkpoint is not None:
+        if args.target and args.target != checkpoint["target"]:
+            print(f"{checkpoint_path} is for {checkpoint['target']}, not {args.target}")
+            return
+        print(f"Resuming into {checkpoint['target']} after {checkpoint['after']}")
+        store = MilvusDataStore(collection=checkpoint["target"], load=False)
+    else:
+        started = datetime.now(timezone.utc)
+        target = args.target or f"{args.alias}_{started:%Y%m%d%H%M%S}"
+        store = MilvusDataStore(collection=target, load=False)
+        if store.col.num_entities:
+            print(f"{target} is not empty and has no checkpoint, pick a new target")
+            store.close()
+            return
+        checkpoint = {
+            "alias": args.alias,
+            "target": target,
+            "after": -1,
+            "done": 0,
+            "started": started.isoformat(),
+        }
+        write_checkpoint(checkpoint_path, checkpoint)
+        print(f"Backfilling {target}")
+
+    repository = Repository(db_session=get_engine(), vector_db_session=store)
+    try:
+        await backfill(repository, store, checkpoint, checkpoint_path, args.batch)
+        await asyncio.to_thread(store.col.flush)
+        print(f"{checkpoint['done']} episodes in {checkpoint['target']}")
+        # searches through the alias must not hit a collection still loading
+        await asyncio.to_thread(store.load)
+        caught_up = await catch_up(repository, store, args.batch)
+        print(f"{caught_up} episodes ingested during the backfill inserted")
+        if not args.no_swap:
+            swap_alias(args.alias, checkpoint["target"], using=store.alias)
+            print(f"{args.alias} now points at {checkpoint['target']}")
+            caught_up = await catch_up(repository, store, args.batch)
+            print(f"{caught_up} episodes ingested before the swap inserted")
+            checkpoint_path.unlink()
+    finally:
+        store.close()
+        executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""Copy an episode collection into a new one without the text column.
+
+Vectors and metadata are copied as stored, nothing is re-embedded. Episode ids
+are paged from Postgres in primary key order and fetched from the source
+collection by pk. The target gets the source's vector index. With --alias the
+alias is pointed at the target once the copy is complete, so a service using
+MILVUS_COLLECTION=<alias> switches without a restart; otherwise set
+MILVUS_COLLECTION to the target and drop the source when done.
+
+    python -m podcasts_backend.tools.migrate_collection \\
+        --source episodes --target episodes_slim --alias episodes_live
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from pymilvus import Collection, connections
+from sqlmodel import Session, select
+
+from ..models.models import EpisodeTable
+from ..repository.db.postgres import get_engine
+from ..repository.vector_database.providers.milvus import (
+    MILVUS_COLLECTION,
+    MILVUS_HOST,
+    MILVUS_PASSWORD,
+    MILVUS_PORT,
+    MILVUS_USE_SECURITY,
+    MILVUS_USER,
+    MilvusDataStore,
+    swap_alias,
+)
+from ..schemas.schemas import Episode, EpisodeMetadata
+from ..services.executors import executors
+
+ALIAS = "migrate_collection"
+
+
+def episode_ids(after: int, limit: int) -> list[int]:
+    with Session(get_engine()) as session:
+        return list(
+            session.exec(
+                select(EpisodeTable.episode_id)
+                .where(EpisodeTable.episode_id > after)
+                .order_by(EpisodeTable.episode_id)
+                .limit(limit)
+            )
+        )
+
+
+async def copy(
+    source: Collection, target: MilvusDataStore, batch: int
+) -> tuple[int, int]:
+    fields = [
+        field
+        for field in target.fields
+        if field in {f.name for f in source.schema.fields}
+    ]
+    after, scanned, copied = 0, 0, 0
+    start = time.perf_counter()
+    while ids := await asyncio.to_thread(episode_ids, after, batch):
+        after = ids[-1]
+        scanned += len(ids)
+        rows = await asyncio.to_thread(
+            source.query, f"pk in [{','.join(map(str, ids))}]", output_fields=fields
+        )
+        if rows:
+            episodes = [
+                Episode(
+                    id=row["pk"],
+                    metadata=EpisodeMetadata(
+                        **{
+                            field: row[field]
+                            for field in EpisodeMetadata.__fields__
+                            if field in row
+                        }
+                    ),
+                    text="",
+                )
+                for row in rows
+            ]
+            embeddings = np.array([row["embedding"] for row in rows], np.float32)
+            # the target is new and empty, nothing to replace
+            await target.upsert(episodes, embeddings=embeddings, replace=False)
+            copied += len(rows)
+        print(
+            f"{scanned} episodes scanned, {copied} vectors copied, "
+            f"{copied / (time.perf_counter() - start):.0f} vectors/s"
+        )
+    return scanned, copied
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--source", default=MILVUS_COLLECTION)
+    parser.add_argument("--target", required=True)
+    parser.add_argument("--alias", help="alias to point at the target when done")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    # MilvusDataStore reuses this connection, it has the same address
+    connections.connect(
+        ALIAS,
+        user=MILVUS_USER,
+        password=MILVUS_PASSWORD,
+        host=MILVUS_HOST,
+        port=MILVUS_PORT,
+        secure=MILVUS_USE_SECURITY,
+    )
+    source = Collection(args.source, using=ALIAS)
+    if "text" not in {field.name for field in source.schema.fields}:
+        print(f"{args.source} has no text column, nothing to migrate")
+        return
+    # the target gets the same vector index as the source
+    index = next(i for i in source.indexes if i.field_name == "embedding")
+    target = MilvusDataStore(
+        collection=args.target,
+        index_params=index.params,
+        store_text=False,
+        load=False,
+    )
+    if target.col.num_entities:
+        print(f"{args.target} is not empty, start from a new collection")
+        return
+    await asyncio.to_thread(source.load)
+
+    scanned, copied = await copy(source, target, args.batch)
+    await asyncio.to_thread(target.col.flush)
+    print(f"Copied {copied} of {scanned} episodes into {args.target}")
+
+    if args.alias:
+        swap_alias(args.alias, args.target, using=ALIAS)
+        print(f"{args.alias} now points at {args.target}")
+    target.close()
+    executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,222 @@
+"""Sweep Milvus index and search parameters, measure recall@k against latency.
+
+Embeds a corpus and a sample of real query texts (one text per line), computes
+exact ground truth with numpy, then builds every candidate index in a scratch
+collection, runs the queries and reports recall@k, p50/p99 latency and loaded
+memory per setting. The fastest setting reaching --min-recall is written as a
+profile for MilvusDataStore (MILVUS_INDEX_PROFILE=<path>).
+
+    python -m podcasts_backend.tools.tune_index \\
+        --corpus episodes.txt --queries queries.txt --top-k 20 \\
+        --min-recall 0.95 --output index_profile.json
+"""
+import argparse
+import json
+import math
+import time
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import Any
+from uuid import uuid4
+
+import numpy as np
+from pymilvus import (
+    Collection,
+    CollectionSchema,
+    DataType,
+    FieldSchema,
+    connections,
+    utility,
+)
+
+from ..repository.vector_database.providers.milvus import (
+    MILVUS_HOST,
+    MILVUS_PASSWORD,
+    MILVUS_PORT,
+    MILVUS_USE_SECURITY,
+    MILVUS_USER,
+    schema_fields,
+    search_params_for,
+)
+from ..services.embeddings import EMBEDDING_DIM, get_embeddings
+
+ALIAS = "tune_index"
+INSERT_BATCH_SIZE = 1000
+
+
+def read_texts(path: str, limit: int | None) -> list[str]:
+    with open(path) as f:
+        texts = [line.strip() for line in f if line.strip()]
+    return texts[:limit] if limit else texts
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """ids of the k nearest corpus rows (squared L2) of every query"""
+    norms = np.einsum("ij,ij->i", corpus, corpus)
+    truth = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), 256):
+        chunk = queries[start : start + 256]
+        distances = norms[None, :] - 2 * chunk @ corpus.T
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+        truth[start : start + len(chunk)] = np.take_along_axis(top, order, axis=1)
+    return truth
+
+
+def candidates(n: int, dim: int, k: int) -> Iterator[tuple[dict[str, Any], list]]:
+    """(index params, search params to sweep on that index) for every candidate"""
+    efs = [k, 2 * k, 4 * k, 8 * k]
+    for m in (8, 16, 32):
+        yield {
+            "metric_type": "L2",
+            "index_type": "HNSW",
+            "params": {"M": m, "efConstruction": 200},
+        }, [{"metric_type": "L2", "params": {"ef": ef}} for ef in efs]
+
+    nlist = max(16, min(65536, 4 * round(math.sqrt(n))))
+    nprobes = [p for p in (8, 16, 32, 64, 128) if p <= nlist]
+    ivf = [{"metric_type": "L2", "params": {"nprobe": p}} for p in nprobes]
+    yield {
+        "metric_type": "L2",
+        "index_type": "IVF_FLAT",
+        "params": {"nlist": nlist},
+    }, ivf
+    yield {
+        "metric_type": "L2",
+        "index_type": "IVF_SQ8",
+        "params": {"nlist": nlist},
+    }, ivf
+    for m in (dim // 8, dim // 16):
+        yield {
+            "metric_type": "L2",
+            "index_type": "IVF_PQ",
+            "params": {"nlist": nlist, "m": m, "nbits": 8},
+        }, ivf
+
+
+def column(field: FieldSchema, rows: range, corpus: np.ndarray) -> list[Any]:
+    """values of one field for corpus rows, metadata left empty"""
+    if field.name == "pk":
+        return list(rows)
+    if field.name == "embedding":
+        return list(corpus[rows.start : rows.stop])
+    return [0 if field.dtype == DataType.INT64 else "" for _ in rows]
+
+
+def build(name: str, corpus: np.ndarray, index_params: dict[str, Any]) -> Collection:
+    fields = schema_fields(store_text=False)
+    col = Collection(name, schema=CollectionSchema(fields), using=ALIAS)
+    for start in range(0, len(corpus), INSERT_BATCH_SIZE):
+        rows = range(start, min(start + INSERT_BATCH_SIZE, len(corpus)))
+        col.insert([column(field, rows, corpus) for field in fields])
+    col.flush()
+    col.create_index("embedding", index_params=index_params)
+    col.load()
+    return col
+
+
+def measure(
+    col: Collection,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    search_params: dict[str, Any],
+    k: int,
+) -> dict[str, float]:
+    for query in queries[:5]:  # warm up
+        col.search([query], "embedding", search_params, k)
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = col.search([query], "embedding", search_params, k)[0]
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(hits.ids) & set(expected.tolist())) / k)
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def loaded_memory(name: str) -> int:
+    segments = utility.get_query_segment_info(name, using=ALIAS)
+    return sum(segment.mem_size for segment in segments)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--corpus", required=True, help="episode texts, one per line")
+    parser.add_argument("--queries", required=True, help="query texts, one per line")
+    parser.add_argument("--corpus-limit", type=int)
+    parser.add_argument("--query-limit", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--output", default="index_profile.json")
+    args = parser.parse_args()
+    k = args.top_k
+
+    corpus = get_embeddings(read_texts(args.corpus, args.corpus_limit))
+    queries = get_embeddings(read_texts(args.queries, args.query_limit))
+    print(f"{len(corpus)} corpus vectors, {len(queries)} queries, k={k}")
+    truth = exact_top_k(corpus, queries, k)
+
+    connections.connect(
+        ALIAS,
+        user=MILVUS_USER,
+        password=MILVUS_PASSWORD,
+        host=MILVUS_HOST,
+        port=MILVUS_PORT,
+        secure=MILVUS_USE_SECURITY,
+    )
+    results = []
+    for index_params, sweep in candidates(len(corpus), EMBEDDING_DIM, k):
+        name = "tune_" + uuid4().hex
+        try:
+            start = time.perf_counter()
+            col = build(name, corpus, index_params)
+            build_seconds = time.perf_counter() - start
+            memory = loaded_memory(name)
+            for search_params in sweep:
+                # the same adjustment MilvusDataStore applies, e.g. ef >= k
+                search_params = search_params_for(search_params, k)
+                result = {
+                    "index_params": index_params,
+                    "search_params": search_params,
+                    "build_seconds": build_seconds,
+                    "memory_bytes": memory,
+                    **measure(col, queries, truth, search_params, k),
+                }
+                results.append(result)
+                print(
+                    f"{index_params['index_type']:<9} "
+                    f"{json.dumps(index_params['params']):<38} "
+                    f"{json.dumps(search_params['params']):<18} "
+                    f"recall@{k}={result['recall']:.3f} "
+                    f"p50={result['p50_ms']:7.2f}ms p99={result['p99_ms']:7.2f}ms "
+                    f"mem={memory / 2**20:8.1f}MiB"
+                )
+        finally:
+            if utility.has_collection(name, using=ALIAS):
+                utility.drop_collection(name, using=ALIAS)
+
+    good = [result for result in results if result["recall"] >= args.min_recall]
+    if good:
+        chosen = min(good, key=lambda result: result["p99_ms"])
+    else:
+        print(f"No setting reached recall {args.min_recall}, taking the best recall")
+        chosen = max(results, key=lambda result: result["recall"])
+    profile = {
+        **chosen,
+        "top_k": k,
+        "corpus_size": len(corpus),
+        "queries": len(queries),
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(args.output, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Wrote {args.output}: {json.dumps(chosen)}")
+
+
+if __name__ == "__main__":
+    main()